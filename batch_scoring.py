@@ -0,0 +1,272 @@
+"""
+Sharded batch execution of the scoring models for very large universes.
+
+The symbol universe is split into contiguous shards, and each shard is processed by a worker of a process pool:
+the worker loads the statements of its symbols, runs all the requested models and sends the results back (the
+workers write nothing). The results are merged in shard order and sorted, so the output is the same whatever the
+number of workers and whatever the order in which the shards finish. The merged results are written to the
+partitioned Parquet store of the results, as one run with a manifest (see result_store.py), and to CSV files only if
+requested. If plots are requested, the chart of each symbol and of each sector is rendered from the merged results by
+the same number of workers (see plot_pipeline.py).
+
+To keep the serialization overhead low, the workers receive only the list of symbols of their shard, and send back
+compact NumPy arrays (int32 symbol codes, dates as int64 and the numeric values of the results) instead of pickled DataFrames.
+
+Each run saves a JSON report next to its manifest (see run_report.py). The workers time their own stages and send their
+report back with the results of their shard, so the report of the run adds up the time spent by all the workers in each
+stage and the hits and misses of their statement caches. With --profile-stage, the stage runs under cProfile in the
+process that runs it, and each worker saves its own statistics next to the report.
+
+Example:
+    python batch_scoring.py --symbols-file universe.txt --models altman,piotroski --workers 32
+    python batch_scoring.py --symbols-file universe.txt --workers 4 --profile-stage load
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fmp_fetcher import MARKET_CAP_ENDPOINT, period_dir
+from macro_series import countries_from_profiles
+from market_cap import MarketCapSeries
+from peer_cube import PeerCube, results_panel
+from result_store import new_run_id, report_path, sectors_from_profiles, symbols_hash, write_csv, write_results
+from run_report import STAGES, RunReport
+from scoring_engine import MODELS, columns_for_models, score_universe
+from statement_loader import load_statements
+
+
+def split_shards(symbols, n_shards):
+    # Split the symbols into contiguous shards of (almost) the same size
+    return [list(shard) for shard in np.array_split(np.asarray(symbols, dtype=object), n_shards) if len(shard)]
+
+
+def encode_results(results, symbols):
+    # Convert the result DataFrames to compact arrays: the symbols are sent as codes into the shard's symbol list
+    encoded = {}
+    for model, df in results.items():
+        arrays = {
+            'Symbol': pd.Categorical(df['Symbol'], categories=symbols).codes.astype(np.int32),
+            'Date/Period': df['Date/Period'].values.astype('datetime64[ns]').view(np.int64),
+        }
+        for column in df.columns.drop(['Symbol', 'Date/Period']):
+            arrays[column] = df[column].to_numpy()
+        encoded[model] = arrays
+    return encoded
+
+
+def decode_results(encoded, symbols):
+    # Rebuild the result DataFrames from the compact arrays
+    results = {}
+    for model, arrays in encoded.items():
+        df = pd.DataFrame({
+            'Symbol': np.asarray(symbols, dtype=object)[arrays['Symbol']],
+            'Date/Period': arrays['Date/Period'].view('datetime64[ns]'),
+        })
+        for column, values in arrays.items():
+            if column not in ('Symbol', 'Date/Period'):
+                df[column] = values
+        results[model] = df
+    return results
+
+
+def score_shard(shard_index, symbols, models, options):
+    # Score one shard of the universe, and return its results with the report of the worker (if it runs in a worker
+    # process, otherwise the stages are recorded in the report of the run)
+    if not options.get('worker_report'):
+        return shard_index, score_shard_results(symbols, models, options), None
+
+    with RunReport('shard', f'{options["run_id"]}_shard_{shard_index:04d}', options['profile_stage'],
+                   options['report_dir']) as report:
+        encoded = score_shard_results(symbols, models, options)
+    return shard_index, encoded, report.to_dict()
+
+
+def score_shard_results(symbols, models, options):
+    # Load and score one shard of the universe, and encode its results
+    columns = columns_for_models(models)
+    statement_data = load_statements(symbols, list(columns), columns=columns, store_dir=options['store_dir'],
+                                     pickle_dir=options['pickle_dir'])
+
+    # The Ohlson O-Score looks up the GNP of the country of each symbol, which is in the profile data
+    countries = None
+    if 'ohlson' in models:
+        profile_data = load_statements(symbols, ['profile'], columns=['country'], store_dir=options['store_dir'],
+                                       pickle_dir=options['pickle_dir'])['profile']
+        countries = countries_from_profiles(profile_data)
+
+    # The market value variant of the Altman Z-Score needs the daily market cap
+    market_cap = None
+    if 'altman' in models and options['market_value']:
+        market_cap = MarketCapSeries.from_frames(load_statements(
+            symbols, [MARKET_CAP_ENDPOINT], columns=['marketCap'], store_dir=options['store_dir'],
+            pickle_dir=options['pickle_dir'])[MARKET_CAP_ENDPOINT])
+
+    results = score_universe(statement_data, symbols, models, options['period'], industry=options['industry'],
+                             countries=countries, market_cap=market_cap)
+
+    return encode_results(results, symbols)
+
+
+def merge_results(shard_results, shards):
+    # Merge the results of the shards in shard order, then sort them deterministically
+    merged = {}
+    for shard_index in sorted(shard_results):
+        for model, df in decode_results(shard_results[shard_index], shards[shard_index]).items():
+            merged.setdefault(model, []).append(df)
+
+    return {model: pd.concat(frames, ignore_index=True).sort_values(['Date/Period', 'Symbol'], kind='stable',
+                                                                       ignore_index=True)
+            for model, frames in merged.items()}
+
+
+def run_batch(symbols, models=tuple(MODELS), workers=1, shards_per_worker=4, industry='non_manufacturer',
+              pickle_dir='financial_data_pickle', store_dir='financial_data_parquet', output_dir='deliverables',
+              plots=False, market_value=False, peer_cube_dir=None, period='annual', csv=False, run_id=None,
+              report_filename=None, profile_stage=None):
+    # Score the universe and save the report of the run (the timings, the memory and the counters)
+    run_id = run_id or new_run_id()
+    report_filename = report_filename or report_path(run_id, os.path.join(output_dir, 'results'))
+    with RunReport('batch', run_id, profile_stage, os.path.dirname(report_filename)) as report:
+        results = score_batch(symbols, models, workers, shards_per_worker, industry, pickle_dir, store_dir, output_dir,
+                              plots, market_value, peer_cube_dir, period, csv, run_id, report)
+    report.save(report_filename)
+    print(f'Saved the report of the run to {report_filename}')
+    return results
+
+
+def score_batch(symbols, models, workers, shards_per_worker, industry, pickle_dir, store_dir, output_dir, plots,
+                market_value, peer_cube_dir, period, csv, run_id, report):
+    # Score the universe with a pool of worker processes, one shard at a time per worker
+    options = {'industry': industry, 'pickle_dir': pickle_dir, 'store_dir': store_dir, 'market_value': market_value,
+               'period': period, 'worker_report': workers > 1, 'run_id': run_id, 'profile_stage': report.profile_stage,
+               'report_dir': report.profile_dir}
+    models = list(models)
+
+    # Use a few shards per worker, so the workers that finish early can take another shard
+    shards = split_shards(symbols, max(1, workers * shards_per_worker if workers > 1 else 1))
+    shard_results = {}
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(score_shard, i, shard, models, options) for i, shard in enumerate(shards)]
+            for future in futures:
+                shard_index, encoded, worker_report = future.result()
+                shard_results[shard_index] = encoded
+                report.merge_worker(worker_report)
+                if 'profile' in worker_report:
+                    report.details.setdefault('worker_profiles', []).append(worker_report['profile']['path'])
+    else:
+        for i, shard in enumerate(shards):
+            shard_index, encoded, _ = score_shard(i, shard, models, options)
+            shard_results[shard_index] = encoded
+
+    results = merge_results(shard_results, shards)
+
+    # Save the merged results as one run of the results store, with the sector of each symbol
+    profile_data = load_statements(symbols, ['profile'], columns=['sector'], store_dir=store_dir,
+                                   pickle_dir=pickle_dir)['profile']
+    sectors = sectors_from_profiles(profile_data)
+    results_dir = os.path.join(output_dir, 'results')
+    manifest = write_results(results, results_dir, run_id, sectors, metadata={
+        'command': 'batch', 'symbols': len(symbols), 'symbols_hash': symbols_hash(symbols), 'industry': industry,
+        'period': period, 'market_value': market_value, 'workers': workers})
+    for model, entry in manifest['models'].items():
+        print(f'Saved {entry["rows"]} {model} results to {os.path.join(results_dir, entry["path"])}')
+    print(f'Run ID: {manifest["run_id"]}')
+
+    if csv:
+        for model, df in results.items():
+            filename = write_csv(df, os.path.join(output_dir, f'{model}_results.csv'))
+            print(f'Saved {len(df)} {model} results to {filename}')
+
+    if plots:
+        render_plots(results, os.path.join(output_dir, 'charts'), sectors, workers, industry)
+
+    if peer_cube_dir:
+        update_peer_cube(results, symbols, peer_cube_dir, pickle_dir, store_dir)
+
+    return results
+
+
+def render_plots(results, charts_dir, sectors=None, workers=1, industry='non_manufacturer'):
+    # Render the chart of each symbol and of each sector with a pool of worker processes
+    # (the plotting libraries are imported only when plots are requested)
+    from plot_pipeline import render_charts
+
+    counts = render_charts(results, charts_dir, sectors, workers, industry=industry)
+    print(f'Saved the charts of {counts["symbols"]} symbols and {counts["sectors"]} sectors to {charts_dir}')
+
+
+def update_peer_cube(results, symbols, peer_cube_dir, pickle_dir='financial_data_pickle',
+                     store_dir='financial_data_parquet'):
+    # Add the results to the sector-relative cube, recomputing only the groups of peers of the scored symbols
+    profile_data = load_statements(symbols, ['profile'], columns=['sector', 'industry'], store_dir=store_dir,
+                                   pickle_dir=pickle_dir)['profile']
+    panel = results_panel(results, profile_data)
+
+    if PeerCube.exists(peer_cube_dir):
+        cube = PeerCube.load(peer_cube_dir)
+        affected = cube.update(panel)
+        print(f'Updated {len(affected)} groups of peers in {peer_cube_dir}')
+    else:
+        cube = PeerCube.build(panel)
+        print(f'Built {len(cube.cube)} groups of peers in {peer_cube_dir}')
+
+    cube.save(peer_cube_dir)
+    return cube
+
+
+def read_symbols(symbols=None, symbols_file=None):
+    # Read the symbols from a comma-separated string or from a file with one symbol per line (or comma-separated)
+    if symbols_file:
+        with open(symbols_file) as f:
+            symbols = f.read().replace(',', '\n')
+    return [symbol.strip() for symbol in (symbols or '').split('\n' if symbols_file else ',') if symbol.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Score a universe of symbols with a pool of worker processes')
+    parser.add_argument('--symbols', help='comma-separated list of symbols, e.g. CRM,ORCL,GOOGL,MSFT')
+    parser.add_argument('--symbols-file', help='file with one symbol per line')
+    parser.add_argument('--models', default=','.join(MODELS), help=f'comma-separated list of models ({",".join(MODELS)})')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--industry', default='non_manufacturer', help='industry for the Altman Z-Score')
+    parser.add_argument('--market-value', action='store_true',
+                        help='use the market value of equity (daily market cap) in the manufacturers Altman Z-Score')
+    parser.add_argument('--period', default='annual', choices=['annual', 'quarter'],
+                        help='period of the financial statements (quarter uses trailing-twelve-month flows)')
+    parser.add_argument('--pickle-dir', help='default: financial_data_pickle (financial_data_pickle_quarter)')
+    parser.add_argument('--store-dir', help='default: financial_data_parquet (financial_data_parquet_quarter)')
+    parser.add_argument('--output-dir', default='deliverables')
+    parser.add_argument('--csv', action='store_true', help='also save the results of each model to a CSV file')
+    parser.add_argument('--run-id', help='ID of the run in the results store (default: the start time)')
+    parser.add_argument('--plots', action='store_true', help='save a chart of each symbol and of each sector')
+    parser.add_argument('--peer-cube', help='directory of the sector-relative cube to build or update with the results')
+    parser.add_argument('--report', help='JSON file of the report of the run (default: results/reports/<run ID>.json)')
+    parser.add_argument('--profile-stage', choices=STAGES, help='run this stage under cProfile')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.symbols_file)
+    if not symbols:
+        parser.error('specify the symbols with --symbols or --symbols-file')
+    models = args.models.split(',')
+    unknown = [model for model in models if model not in MODELS]
+    if unknown:
+        parser.error(f'unknown models: {",".join(unknown)} (choose from {",".join(MODELS)})')
+
+    pickle_dir = args.pickle_dir or period_dir('financial_data_pickle', args.period)
+    store_dir = args.store_dir or period_dir('financial_data_parquet', args.period)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    run_batch(symbols, models, args.workers, industry=args.industry, pickle_dir=pickle_dir,
+              store_dir=store_dir, output_dir=args.output_dir, plots=args.plots, market_value=args.market_value,
+              peer_cube_dir=args.peer_cube, period=args.period, csv=args.csv, run_id=args.run_id,
+              report_filename=args.report, profile_stage=args.profile_stage)
+
+
+if __name__ == '__main__':
+    main()
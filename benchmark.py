@@ -0,0 +1,320 @@
+"""
+Benchmark suite of the loading, the models, the screener and the plots on synthetic universes.
+
+For each size of universe (by default 10, 1,000 and 10,000 symbols), the suite generates the synthetic data once
+(see synthetic_data.py, the data is kept in the work directory and reused by the next runs), then times each stage
+a few times:
+
+- fetch: fetching the statements and the profiles from the local stand-in server of the API (see fmp_server.py),
+  optionally with latency and 429/5xx errors injected, to measure the throughput and the recovery from failures
+- load: loading the statements of all the models from the pickle files (with an empty cache)
+- load_store: the same from the Parquet store (see columnar_store.py)
+- align: building the panel of the statements (see statement_alignment.py)
+- altman, piotroski, beneish, ohlson, dupont: each model on the panel, with its own features
+- screener: joining the screener data into the wide table, screening it and ranking it per sector
+- plot: rendering the chart of each symbol and of each sector (see plot_pipeline.py)
+
+The results are saved to a JSON file with the times of every repeat, their minimum and median, the number of rows
+of each stage and the environment (Python, packages, CPU count and git commit), so two runs can be compared with
+--compare, which reports the stages that got slower than the baseline by more than the tolerance.
+
+Examples:
+    python benchmark.py --sizes 10,1000 --output benchmark_before.json
+    python benchmark.py --sizes 10,1000 --output benchmark_after.json --compare benchmark_before.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import statement_loader
+from columnar_store import migrate_pickles
+from feature_registry import FeatureSet
+from fmp_fetcher import PROFILE_ENDPOINT, STATEMENT_TYPES, fetch_universe
+from fmp_server import Fixtures, StandInServer
+from macro_series import countries_from_profiles
+from result_store import sectors_from_profiles
+from scoring_engine import MODELS, altman_zscore, columns_for_models, ohlson_oscore
+from screener_engine import RANKING_FACTORS, SCREENER_SOURCES, build_wide_table, rank, screen
+from statement_alignment import align_statements
+from statement_loader import load_statements
+from synthetic_data import N_PERIODS, write_universe
+
+# Define the sizes of the universes benchmarked by default
+SIZES = [10, 1000, 10000]
+
+# Define the stages of the benchmark, in the order they run
+STAGES = ['fetch', 'load', 'load_store', 'align'] + list(MODELS) + ['screener', 'plot']
+
+# Define the number of times each stage is timed
+REPEAT = 3
+
+# Define the screen of the screener stage (the same as stock_screener_simplified.py)
+SCREEN_EXPRESSION = 'peRatio < 15 and revenueGrowth > 0.1'
+
+# Define the increase of the median time above which a stage is reported as a regression by the comparison
+TOLERANCE = 0.1
+
+
+def timed(function, repeat=REPEAT, setup=None):
+    # Time a function a few times (calling setup before each run, untimed), and return the times and the last result
+    # The output of the function is discarded, so printing doesn't count in the times
+    times = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            start = time.perf_counter()
+            result = function()
+            times.append(time.perf_counter() - start)
+    return times, result
+
+
+def stage_result(times, rows=None, **details):
+    result = {'seconds': [round(t, 6) for t in times], 'min': round(min(times), 6),
+              'median': round(float(np.median(times)), 6)}
+    if rows is not None:
+        result['rows'] = int(rows)
+    result.update(details)
+    return result
+
+
+def universe_dir(work_dir, n_symbols, n_periods, period='annual'):
+    return os.path.join(work_dir, f'{n_symbols}_symbols_{n_periods}_{period}')
+
+
+def prepare_universe(n_symbols, work_dir, n_periods=N_PERIODS, period='annual', seed=0):
+    # Generate the synthetic data of a universe and its Parquet store, unless they are already in the work directory
+    directory = universe_dir(work_dir, n_symbols, n_periods, period)
+    pickle_dir = os.path.join(directory, 'financial_data_pickle')
+    store_dir = os.path.join(directory, 'financial_data_parquet')
+    symbols_file = os.path.join(directory, 'symbols.txt')
+
+    if not os.path.exists(symbols_file):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            symbols = write_universe(n_symbols, pickle_dir, n_periods, period, seed, market_cap=False)
+            migrate_pickles(pickle_dir, store_dir)
+        # The list of symbols is written last, so an interrupted generation starts again
+        with open(symbols_file, 'w') as f:
+            f.write('\n'.join(symbols) + '\n')
+
+    with open(symbols_file) as f:
+        symbols = f.read().split()
+    return symbols, pickle_dir, store_dir, directory
+
+
+def benchmark_fetch(symbols, directory, n_periods=N_PERIODS, period='annual', repeat=REPEAT, seed=0, workers=8,
+                    server_options=None):
+    # Time the fetch of the statements and the profiles of the symbols from the stand-in server of the API, into an
+    # empty pickle directory each time
+    fixtures = Fixtures.from_synthetic(len(symbols), n_periods, seed)
+    # Prepare the responses before timing, so the server answers as fast as it can
+    for symbol in symbols:
+        for endpoint in STATEMENT_TYPES + [PROFILE_ENDPOINT]:
+            fixtures.get(endpoint, symbol, period)
+
+    fetch_dir = os.path.join(directory, 'fetched')
+    with StandInServer(fixtures, seed=seed, **(server_options or {})) as server:
+        times, statuses = timed(lambda: fetch_universe(symbols, 'benchmark', base_url=server.base_url,
+                                                       pickle_dir=fetch_dir, period=period, profile_limit=1,
+                                                       max_workers=workers),
+                                repeat, lambda: shutil.rmtree(fetch_dir, ignore_errors=True))
+
+    requests_made = sum(server.stats['requests'].values())
+    return stage_result(times, len(statuses), workers=workers, server=server_options or {},
+                        requests=requests_made // repeat, failed=sum(status != 200 for status in statuses.values()),
+                        status_codes={str(code): count // repeat for code, count in server.stats['status_codes'].items()},
+                        requests_per_second=round(requests_made / sum(times), 1))
+
+
+def benchmark_universe(n_symbols, work_dir, n_periods=N_PERIODS, period='annual', repeat=REPEAT, stages=STAGES,
+                       plot_workers=1, seed=0, fetch_workers=8, server_options=None):
+    # Time the stages on a universe of synthetic symbols
+    start = time.perf_counter()
+    symbols, pickle_dir, store_dir, directory = prepare_universe(n_symbols, work_dir, n_periods, period, seed)
+    result = {'symbols': n_symbols, 'periods': n_periods, 'period': period,
+              'prepare_seconds': round(time.perf_counter() - start, 3), 'stages': {}}
+    stage_results = result['stages']
+
+    if 'fetch' in stages:
+        stage_results['fetch'] = benchmark_fetch(symbols, directory, n_periods, period, repeat, seed, fetch_workers,
+                                                 server_options)
+
+    models = list(MODELS)
+    columns = columns_for_models(models)
+    # Each load starts with an empty cache, so the files are parsed every time
+    clear = statement_loader.clear_cache
+    missing_store = os.path.join(directory, 'no_store')
+
+    times, statement_data = timed(lambda: load_statements(symbols, list(columns), columns=columns,
+                                                          store_dir=missing_store, pickle_dir=pickle_dir),
+                                  repeat if 'load' in stages else 1, clear)
+    if 'load' in stages:
+        stage_results['load'] = stage_result(times, sum(len(df) for frames in statement_data.values()
+                                                         for df in frames.values()))
+    if 'load_store' in stages:
+        times, store_data = timed(lambda: load_statements(symbols, list(columns), columns=columns,
+                                                          store_dir=store_dir, pickle_dir=pickle_dir), repeat, clear)
+        stage_results['load_store'] = stage_result(times, sum(len(df) for frames in store_data.values()
+                                                               for df in frames.values()))
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        profile_data = load_statements(symbols, ['profile'], columns=['country', 'sector'], store_dir=missing_store,
+                                       pickle_dir=pickle_dir)['profile']
+    countries = countries_from_profiles(profile_data)
+
+    times, panel = timed(lambda: align_statements(statement_data, symbols, period), repeat if 'align' in stages else 1)
+    if 'align' in stages:
+        stage_results['align'] = stage_result(times, len(panel))
+
+    # Each model computes its own features, as if it ran alone
+    model_functions = {
+        'altman': lambda: altman_zscore(panel, features=FeatureSet(panel)),
+        'ohlson': lambda: ohlson_oscore(panel, countries, features=FeatureSet(panel)),
+    }
+    results = {}
+    for model in models:
+        if model in stages:
+            function = model_functions.get(model, lambda model=model: MODELS[model](panel, features=FeatureSet(panel)))
+            times, results[model] = timed(function, repeat)
+            stage_results[model] = stage_result(times, len(results[model]))
+
+    if 'screener' in stages:
+        source_data = {source: {symbol: pd.read_pickle(os.path.join(pickle_dir, f'{symbol}_{source}.pkl'))
+                                for symbol in symbols} for source in SCREENER_SOURCES}
+        sectors = sectors_from_profiles(profile_data)
+
+        def run_screener():
+            table = build_wide_table(source_data)
+            return table, screen(table, SCREEN_EXPRESSION), rank(table, RANKING_FACTORS, k=5, groups=sectors)
+
+        times, (table, screened, ranking) = timed(run_screener, repeat)
+        stage_results['screener'] = stage_result(times, len(table), screened=len(screened), ranked=len(ranking))
+
+    if 'plot' in stages and results:
+        # The plotting libraries are imported only for this stage
+        from plot_pipeline import render_charts
+
+        charts_dir = os.path.join(directory, 'charts')
+        times, counts = timed(lambda: render_charts(results, charts_dir, sectors_from_profiles(profile_data),
+                                                    plot_workers), repeat)
+        stage_results['plot'] = stage_result(times, counts['symbols'] + counts['sectors'], workers=plot_workers,
+                                             **counts)
+
+    return result
+
+
+def environment():
+    # Describe the machine and the versions, so the results of two runs can be compared knowingly
+    versions = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__}
+    for package in ['pyarrow', 'matplotlib']:
+        try:
+            versions[package] = __import__(package).__version__
+        except ImportError:
+            versions[package] = None
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'platform': platform.platform(), 'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+            'versions': versions, 'git_commit': commit}
+
+
+def run_suite(sizes=SIZES, work_dir='benchmark_data', n_periods=N_PERIODS, period='annual', repeat=REPEAT,
+              stages=STAGES, plot_workers=1, seed=0, fetch_workers=8, server_options=None):
+    # Benchmark each size of universe and return the report
+    report = {'created_at': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+              'config': {'sizes': list(sizes), 'periods': n_periods, 'period': period, 'repeat': repeat,
+                         'stages': list(stages), 'plot_workers': plot_workers, 'seed': seed,
+                         'fetch_workers': fetch_workers, 'server_options': server_options or {}},
+              'results': []}
+
+    for n_symbols in sizes:
+        result = benchmark_universe(n_symbols, work_dir, n_periods, period, repeat, stages, plot_workers, seed,
+                                    fetch_workers, server_options)
+        report['results'].append(result)
+        for stage, stage_times in result['stages'].items():
+            print(f'{n_symbols:>7} symbols  {stage:<11} {stage_times["median"]:10.4f} s  '
+                  f'({stage_times.get("rows", 0)} rows)')
+    return report
+
+
+def compare(baseline, report, tolerance=TOLERANCE):
+    # Compare the median time of each stage with the baseline report, for the universes of the same size
+    # Return a DataFrame with one row per size and stage, and whether the stage got slower than the tolerance
+    baseline_stages = {(result['symbols'], result['periods'], result['period'], stage): times['median']
+                       for result in baseline['results'] for stage, times in result['stages'].items()}
+    rows = []
+    for result in report['results']:
+        for stage, times in result['stages'].items():
+            key = (result['symbols'], result['periods'], result['period'], stage)
+            if key in baseline_stages:
+                ratio = times['median'] / baseline_stages[key] if baseline_stages[key] > 0 else np.nan
+                rows.append({'symbols': result['symbols'], 'stage': stage, 'baseline': baseline_stages[key],
+                             'current': times['median'], 'ratio': ratio, 'regression': bool(ratio > 1 + tolerance)})
+    return pd.DataFrame(rows, columns=['symbols', 'stage', 'baseline', 'current', 'ratio', 'regression'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the loading, the models, the screener and the plots')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in SIZES),
+                        help='comma-separated numbers of symbols')
+    parser.add_argument('--periods', type=int, default=N_PERIODS, help='number of periods of each symbol')
+    parser.add_argument('--period', default='annual', choices=['annual', 'quarter'])
+    parser.add_argument('--repeat', type=int, default=REPEAT, help='number of times each stage is timed')
+    parser.add_argument('--stages', default=','.join(STAGES), help=f'comma-separated stages ({",".join(STAGES)})')
+    parser.add_argument('--plot-workers', type=int, default=1, help='number of processes rendering the charts')
+    parser.add_argument('--fetch-workers', type=int, default=8, help='number of concurrent requests of the fetch')
+    parser.add_argument('--fetch-latency', type=float, default=0.0, help='seconds added to each response of the server')
+    parser.add_argument('--fetch-error-rate-429', type=float, default=0.0,
+                        help='fraction of the requests answered with 429 by the server')
+    parser.add_argument('--fetch-error-rate-5xx', type=float, default=0.0,
+                        help='fraction of the requests answered with 5xx by the server')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default='benchmark_data', help='directory of the synthetic data (reused)')
+    parser.add_argument('--output', help='JSON file of the results (default: benchmark_<time>.json)')
+    parser.add_argument('--compare', help='JSON file of a previous run, to report the stages that got slower')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='increase of the median time reported as a regression (0.1 = 10%%)')
+    args = parser.parse_args(argv)
+
+    stages = args.stages.split(',')
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f'unknown stages: {",".join(unknown)} (choose from {",".join(STAGES)})')
+
+    report = run_suite([int(size) for size in args.sizes.split(',')], args.work_dir, args.periods, args.period,
+                       args.repeat, stages, args.plot_workers, args.seed, args.fetch_workers,
+                       {'latency': args.fetch_latency, 'error_rate_429': args.fetch_error_rate_429,
+                        'error_rate_5xx': args.fetch_error_rate_5xx})
+
+    output = args.output or f'benchmark_{datetime.now():%Y%m%dT%H%M%S}.json'
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Saved the results to {output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            comparison = compare(json.load(f), report, args.tolerance)
+        print(comparison.to_string(index=False, float_format=lambda value: f'{value:.4f}'))
+        regressions = comparison[comparison['regression']]
+        if not regressions.empty:
+            print(f'{len(regressions)} stages are slower than {args.compare} by more than {args.tolerance:.0%}')
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Array kernel for the Beneish M-Score.
+
+The kernel takes the input fields as 2-D float64 matrices (symbols x periods, in ascending date order, see
+statement_alignment.to_matrix) and computes the eight indices and the M-Score in one pass, writing into a preallocated
+output array. The prior period of each cell is the column lag columns before in the same row (the previous column
+on an annual panel, four columns before on a quarterly one), so the first lag periods of each symbol have only the
+total accruals (the other indices and the M-Score are NaN).
+
+If Numba is installed, the kernel is compiled with a fused loop over the cells; otherwise the same formulas are
+evaluated with NumPy operations on whole matrices. A division by zero gives 0 (the infinite values are replaced),
+and the values are not rounded: rounding is done only when the results are presented.
+"""
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Define the input fields of the kernel, in the order expected by the compiled kernel
+BENEISH_FIELDS = ['net_income', 'total_assets', 'cash_flow_from_operating_activities', 'receivables',
+                  'current_assets', 'current_liabilities', 'revenue', 'cost_of_goods_sold', 'depreciation',
+                  'sga_expenses', 'total_liabilities', 'pp_and_e', 'securities']
+
+# Define the outputs of the kernel, in the order of the first axis of the output array
+BENEISH_OUTPUTS = ['dsri', 'gmi', 'aqi', 'sgi', 'depi', 'sgai', 'lvgi', 'tata', 'mscore']
+
+# Define the coefficients of the M-Score: the intercept, then one coefficient per index
+BENEISH_INTERCEPT = -4.84
+BENEISH_COEFFICIENTS = np.array([0.92, 0.528, 0.404, 0.892, 0.115, -0.172, -0.327, 4.679])
+
+
+def _finite(index):
+    # Replace the infinite values (division by zero) with 0
+    return np.where(np.isinf(index), 0.0, index)
+
+
+def _beneish_numpy(inputs, lag, out):
+    (net_income, total_assets, cash_flow_from_operating_activities, receivables, current_assets, current_liabilities,
+     revenue, cost_of_goods_sold, depreciation, sga_expenses, total_liabilities, pp_and_e, securities) = inputs
+
+    # The values of the prior period are lag columns before, the first lag periods have no prior period
+    def previous(matrix):
+        shifted = np.full_like(matrix, np.nan)
+        shifted[:, lag:] = matrix[:, :-lag]
+        return shifted
+
+    previous_receivables = previous(receivables)
+    previous_revenue = previous(revenue)
+    previous_cost_of_goods_sold = previous(cost_of_goods_sold)
+    previous_current_assets = previous(current_assets)
+    previous_pp_and_e = previous(pp_and_e)
+    previous_securities = previous(securities)
+    previous_total_assets = previous(total_assets)
+    previous_depreciation = previous(depreciation)
+    previous_sga_expenses = previous(sga_expenses)
+    previous_current_liabilities = previous(current_liabilities)
+    previous_total_liabilities = previous(total_liabilities)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        out[0] = _finite((receivables / revenue) / (previous_receivables / previous_revenue))
+        out[1] = _finite(((previous_revenue - previous_cost_of_goods_sold) / previous_revenue) /
+                         ((revenue - cost_of_goods_sold) / revenue))
+        out[2] = _finite((1 - (current_assets + pp_and_e + securities) / total_assets) /
+                         (1 - (previous_current_assets + previous_pp_and_e + previous_securities) /
+                          previous_total_assets))
+        out[3] = _finite(revenue / previous_revenue)
+        out[4] = _finite((previous_depreciation / (previous_pp_and_e + previous_depreciation)) /
+                         (depreciation / (pp_and_e + depreciation)))
+        out[5] = _finite((sga_expenses / revenue) / (previous_sga_expenses / previous_revenue))
+        out[6] = _finite(((current_liabilities + total_liabilities) / total_assets) /
+                         ((previous_current_liabilities + previous_total_liabilities) / previous_total_assets))
+        out[7] = _finite((net_income - cash_flow_from_operating_activities) / total_assets)
+
+    out[8] = BENEISH_INTERCEPT + np.tensordot(BENEISH_COEFFICIENTS, out[:8], axes=1)
+    return out
+
+
+def _finite_scalar(index):
+    # Replace an infinite value (division by zero) with 0
+    return 0.0 if np.isinf(index) else index
+
+
+def _beneish_loop(inputs, coefficients, intercept, lag, out):
+    (net_income, total_assets, cash_flow_from_operating_activities, receivables, current_assets, current_liabilities,
+     revenue, cost_of_goods_sold, depreciation, sga_expenses, total_liabilities, pp_and_e, securities) = inputs
+    n_symbols, n_periods = revenue.shape
+    if n_periods == 0:
+        return out
+
+    for i in range(n_symbols):
+        # The first lag periods have no prior period, so only the total accruals can be calculated
+        for j in range(min(lag, n_periods)):
+            for k in range(9):
+                out[k, i, j] = np.nan
+            out[7, i, j] = _finite_scalar((net_income[i, j] - cash_flow_from_operating_activities[i, j]) /
+                                          total_assets[i, j])
+
+        for j in range(lag, n_periods):
+            p = j - lag
+            out[0, i, j] = _finite_scalar((receivables[i, j] / revenue[i, j]) /
+                                          (receivables[i, p] / revenue[i, p]))
+            out[1, i, j] = _finite_scalar(((revenue[i, p] - cost_of_goods_sold[i, p]) / revenue[i, p]) /
+                                          ((revenue[i, j] - cost_of_goods_sold[i, j]) / revenue[i, j]))
+            out[2, i, j] = _finite_scalar((1 - (current_assets[i, j] + pp_and_e[i, j] + securities[i, j]) /
+                                           total_assets[i, j]) /
+                                          (1 - (current_assets[i, p] + pp_and_e[i, p] + securities[i, p]) /
+                                           total_assets[i, p]))
+            out[3, i, j] = _finite_scalar(revenue[i, j] / revenue[i, p])
+            out[4, i, j] = _finite_scalar((depreciation[i, p] / (pp_and_e[i, p] + depreciation[i, p])) /
+                                          (depreciation[i, j] / (pp_and_e[i, j] + depreciation[i, j])))
+            out[5, i, j] = _finite_scalar((sga_expenses[i, j] / revenue[i, j]) /
+                                          (sga_expenses[i, p] / revenue[i, p]))
+            out[6, i, j] = _finite_scalar(((current_liabilities[i, j] + total_liabilities[i, j]) /
+                                           total_assets[i, j]) /
+                                          ((current_liabilities[i, p] + total_liabilities[i, p]) /
+                                           total_assets[i, p]))
+            out[7, i, j] = _finite_scalar((net_income[i, j] - cash_flow_from_operating_activities[i, j]) /
+                                          total_assets[i, j])
+
+            mscore = intercept
+            for k in range(8):
+                mscore += coefficients[k] * out[k, i, j]
+            out[8, i, j] = mscore
+
+    return out
+
+
+if numba is not None:
+    # Compile the loop kernel, with the NumPy semantics for the division by zero (inf or NaN instead of an error)
+    _finite_scalar = numba.njit(cache=True, error_model='numpy')(_finite_scalar)
+    _beneish_loop = numba.njit(cache=True, error_model='numpy')(_beneish_loop)
+
+
+def beneish_kernel(inputs, out=None, lag=1):
+    # Calculate the eight Beneish indices and the M-Score from the input matrices (symbols x periods)
+    # The inputs are a dictionary keyed by the names in BENEISH_FIELDS; the result has one matrix per output
+    # The lag is the number of columns between a period and the same period of the previous year
+    matrices = tuple(np.ascontiguousarray(inputs[name], dtype=np.float64) for name in BENEISH_FIELDS)
+    if out is None:
+        out = np.empty((len(BENEISH_OUTPUTS),) + matrices[0].shape)
+
+    if numba is not None:
+        return _beneish_loop(matrices, BENEISH_COEFFICIENTS, BENEISH_INTERCEPT, lag, out)
+    return _beneish_numpy(matrices, lag, out)
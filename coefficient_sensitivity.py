@@ -0,0 +1,237 @@
+"""
+Monte Carlo sensitivity of the model classifications to their coefficients and thresholds.
+
+The Altman Z-Score, the Beneish M-Score and the Ohlson O-Score are linear in their ratios: the score is an intercept
+plus the sum of each ratio times its coefficient, and the zone of a firm (e.g. safe, grey or distress for the Altman
+Z-Score) is given by comparing the score with one or two thresholds. The published coefficients and thresholds are
+estimates, so this module draws thousands of perturbed sets of coefficients and thresholds and reports, for each
+symbol and period, how often its zone differs from the zone with the published values (the flip rate), the share of
+the draws in each zone and the mean and standard deviation of the score.
+
+The ratios are computed once per model (see scoring_engine.altman_terms, ohlson_terms and the components of
+beneish_mscore). The scores of all the draws are then a matrix product (draws x ratios) @ (ratios x symbol-periods),
+and the zones are compared with broadcasting, with no Python loop over the draws. The draws are processed in chunks,
+so the memory used by the (draws x symbol-periods) matrices stays below max_bytes whatever the number of draws.
+
+Each coefficient is multiplied by (1 + scale * e), with e drawn from a standard normal distribution, so a coefficient
+of 0 stays 0 (e.g. the sales to assets ratio of the non-manufacturer Altman Z-Score); the thresholds are perturbed in
+the same way with threshold_scale. The draws are generated once from the seed, so the results don't depend on the
+chunk size.
+
+Example:
+    python coefficient_sensitivity.py --symbols CRM,ORCL,GOOGL,MSFT --models altman,beneish --draws 10000
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from batch_scoring import read_symbols
+from beneish_kernel import BENEISH_COEFFICIENTS, BENEISH_INTERCEPT
+from feature_registry import FeatureSet
+from fmp_fetcher import period_dir
+from macro_series import countries_from_profiles
+from scoring_engine import (ALTMAN_COEFFICIENTS, ALTMAN_INDUSTRY_COEFFICIENTS, ALTMAN_TERMS, BENEISH_THRESHOLD,
+                            OHLSON_COEFFICIENTS, OHLSON_INTERCEPT, OHLSON_THRESHOLD, altman_terms, beneish_mscore,
+                            columns_for_models, ohlson_terms, tidy)
+from statement_alignment import align_statements
+from statement_loader import load_statements
+
+# Define the zones of each model, from the lowest score to the highest
+MODEL_ZONES = {
+    'altman': ['Distress', 'Grey', 'Safe'],
+    'beneish': ['Unlikely Manipulator', 'Likely Manipulator'],
+    'ohlson': ['Likely to Fail', 'Unlikely to Fail'],
+}
+
+# Define the name of the score of each model
+MODEL_SCORES = {'altman': 'Altman Z-Score', 'beneish': 'Beneish M-Score', 'ohlson': 'Ohlson O-Score'}
+
+# Define the maximum memory used by the matrices of a chunk of draws
+MAX_CHUNK_BYTES = 64 * 1024 ** 2
+
+
+def model_terms(model, panel, features=None, industry='non_manufacturer', market_cap=None, countries=None):
+    # Get the ratios of a model (one row per symbol and period), its intercept, coefficients and thresholds
+    f = FeatureSet(panel) if features is None else features
+
+    if model == 'altman':
+        terms, mask = altman_terms(panel, market_cap, features=f, industry=industry)
+        coefficients = ALTMAN_INDUSTRY_COEFFICIENTS.get(industry, ALTMAN_INDUSTRY_COEFFICIENTS.get('non_manufacturer'))
+        intercept = coefficients['a'] if industry != 'manufacturing' else 0
+        weights = np.array([coefficients[coefficient] for coefficient in ALTMAN_COEFFICIENTS], dtype=np.float64)
+        thresholds = np.array([coefficients['z2'], coefficients['z1']])
+        frame = tidy(panel, {term: terms[term] for term in ALTMAN_TERMS}, mask)
+
+    elif model == 'ohlson':
+        terms, mask = ohlson_terms(panel, countries, features=f)
+        intercept = OHLSON_INTERCEPT
+        weights = np.array(list(OHLSON_COEFFICIENTS.values()), dtype=np.float64)
+        thresholds = np.array([OHLSON_THRESHOLD])
+        frame = tidy(panel, {term: terms[term] for term in OHLSON_COEFFICIENTS}, mask)
+
+    elif model == 'beneish':
+        # The components of the M-Score are in the order of BENEISH_COEFFICIENTS
+        frame = beneish_mscore(panel, features=f).drop(columns='Beneish M-Score')
+        intercept = BENEISH_INTERCEPT
+        weights = np.asarray(BENEISH_COEFFICIENTS, dtype=np.float64)
+        thresholds = np.array([BENEISH_THRESHOLD])
+
+    else:
+        raise ValueError(f'Sensitivity analysis is not available for the {model} model')
+
+    keys = frame[['Symbol', 'Date/Period']]
+    values = frame.drop(columns=['Symbol', 'Date/Period']).to_numpy(dtype=np.float64).T
+    return keys, values, float(intercept), weights, thresholds
+
+
+def draw_parameters(intercept, weights, thresholds, draws, scale=0.1, threshold_scale=None, seed=None):
+    # Draw the perturbed intercepts (draws), coefficients (draws x ratios) and thresholds (draws x thresholds)
+    rng = np.random.default_rng(seed)
+    threshold_scale = scale if threshold_scale is None else threshold_scale
+
+    intercepts = intercept * (1 + scale * rng.standard_normal(draws))
+    coefficients = weights * (1 + scale * rng.standard_normal((draws, len(weights))))
+
+    # The thresholds are kept in ascending order, so the zones stay ordered
+    drawn_thresholds = np.sort(thresholds * (1 + threshold_scale * rng.standard_normal((draws, len(thresholds)))),
+                               axis=1)
+    return intercepts, coefficients, drawn_thresholds
+
+
+def zones_of(scores, thresholds):
+    # Get the zone of each score: the number of thresholds the score is greater than or equal to
+    # The thresholds are broadcast against the scores (one row of thresholds per row of scores)
+    zones = np.zeros(scores.shape, dtype=np.int8)
+    for j in range(thresholds.shape[-1]):
+        zones += scores >= thresholds[..., j, None]
+    return zones
+
+
+def sensitivity(values, intercept, weights, thresholds, draws=10000, scale=0.1, threshold_scale=None, seed=None,
+                max_bytes=MAX_CHUNK_BYTES):
+    # Calculate the flip rate, the share of each zone and the mean and standard deviation of the score of each
+    # column of values (ratios x symbol-periods) over the draws of the coefficients and thresholds
+    n_zones = len(thresholds) + 1
+    n = values.shape[1]
+
+    # The symbol-periods with a missing or infinite ratio have no score
+    valid = np.isfinite(values).all(axis=0)
+    values = np.where(valid, values, 0.0)
+
+    baseline_scores = intercept + weights @ values
+    baseline_zones = zones_of(baseline_scores[None, :], thresholds[None, :])[0]
+
+    intercepts, coefficients, drawn_thresholds = draw_parameters(intercept, weights, thresholds, draws, scale,
+                                                                 threshold_scale, seed)
+
+    flips = np.zeros(n, dtype=np.int64)
+    zone_counts = np.zeros((n_zones, n), dtype=np.int64)
+    score_sum = np.zeros(n)
+    score_squares = np.zeros(n)
+
+    # Each draw of a chunk holds a few rows of float64 values (the scores and the temporary arrays of the matrix
+    # product and of the squares), a row of zones (int8) and a row of comparisons (bool), i.e. about 32 bytes per cell
+    chunk = max(1, int(max_bytes // max(1, n * 32)))
+    for start in range(0, draws, chunk):
+        stop = min(start + chunk, draws)
+        scores = intercepts[start:stop, None] + coefficients[start:stop] @ values
+        zones = zones_of(scores, drawn_thresholds[start:stop])
+
+        flips += (zones != baseline_zones).sum(axis=0)
+        for zone in range(n_zones):
+            zone_counts[zone] += (zones == zone).sum(axis=0)
+        score_sum += scores.sum(axis=0)
+        score_squares += (scores ** 2).sum(axis=0)
+
+    mean = score_sum / draws
+    std = np.sqrt(np.maximum(score_squares / draws - mean ** 2, 0))
+
+    def masked(array):
+        return np.where(valid, array, np.nan)
+
+    return {
+        'score': masked(baseline_scores),
+        'zone': np.where(valid, baseline_zones, -1),
+        'flip_rate': masked(flips / draws),
+        'zone_shares': [masked(counts / draws) for counts in zone_counts],
+        'mean': masked(mean),
+        'std': masked(std),
+    }
+
+
+def model_sensitivity(model, panel, draws=10000, scale=0.1, threshold_scale=None, seed=None,
+                      max_bytes=MAX_CHUNK_BYTES, features=None, **model_options):
+    # Run the sensitivity analysis of a model on the panel and return one row per symbol and period
+    # The options are passed to the model, e.g. industry='manufacturers' for the Altman Z-Score
+    keys, values, intercept, weights, thresholds = model_terms(model, panel, features, **model_options)
+    result = sensitivity(values, intercept, weights, thresholds, draws, scale, threshold_scale, seed, max_bytes)
+
+    zones = MODEL_ZONES[model]
+    score = MODEL_SCORES[model]
+    df = keys.reset_index(drop=True)
+    df[score] = result['score']
+    df['Zone'] = pd.Series(np.asarray(zones + [None], dtype=object)[result['zone']])
+    df['Flip Rate'] = result['flip_rate']
+    for zone, shares in zip(zones, result['zone_shares']):
+        df[f'Share {zone}'] = shares
+    df[f'{score} Mean'] = result['mean']
+    df[f'{score} Std'] = result['std']
+    return df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monte Carlo sensitivity of the model zones to their coefficients')
+    parser.add_argument('--symbols', help='comma-separated list of symbols, e.g. CRM,ORCL,GOOGL,MSFT')
+    parser.add_argument('--symbols-file', help='file with one symbol per line')
+    parser.add_argument('--models', default=','.join(MODEL_ZONES),
+                        help=f'comma-separated list of models ({",".join(MODEL_ZONES)})')
+    parser.add_argument('--draws', type=int, default=10000, help='number of draws of the coefficients')
+    parser.add_argument('--scale', type=float, default=0.1, help='relative standard deviation of the coefficients')
+    parser.add_argument('--threshold-scale', type=float, help='relative standard deviation of the thresholds '
+                                                              '(default: the same as the coefficients)')
+    parser.add_argument('--seed', type=int, help='seed of the random draws')
+    parser.add_argument('--industry', default='non_manufacturer', help='industry for the Altman Z-Score')
+    parser.add_argument('--period', default='annual', choices=['annual', 'quarter'])
+    parser.add_argument('--pickle-dir', help='default: financial_data_pickle (financial_data_pickle_quarter)')
+    parser.add_argument('--store-dir', help='default: financial_data_parquet (financial_data_parquet_quarter)')
+    parser.add_argument('--output-dir', default='deliverables')
+    args = parser.parse_args(argv)
+
+    symbols = read_symbols(args.symbols, args.symbols_file)
+    if not symbols:
+        parser.error('specify the symbols with --symbols or --symbols-file')
+    models = args.models.split(',')
+
+    pickle_dir = args.pickle_dir or period_dir('financial_data_pickle', args.period)
+    store_dir = args.store_dir or period_dir('financial_data_parquet', args.period)
+
+    # Load the statements once and share the panel and the features between the models
+    columns = columns_for_models(models)
+    statement_data = load_statements(symbols, list(columns), columns=columns, store_dir=store_dir,
+                                     pickle_dir=pickle_dir)
+    countries = None
+    if 'ohlson' in models:
+        countries = countries_from_profiles(load_statements(symbols, ['profile'], columns=['country'],
+                                                            store_dir=store_dir, pickle_dir=pickle_dir)['profile'])
+
+    panel = align_statements(statement_data, symbols, args.period)
+    features = FeatureSet(panel)
+
+    # Define the options of each model
+    model_options = {'altman': {'industry': args.industry}, 'ohlson': {'countries': countries}}
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for model in models:
+        df = model_sensitivity(model, panel, args.draws, args.scale, args.threshold_scale, args.seed,
+                               features=features, **model_options.get(model, {}))
+        filename = os.path.join(args.output_dir, f'{model}_sensitivity.csv')
+        df.to_csv(filename, index=False)
+        print(f'{model}: {int((df["Flip Rate"] > 0).sum())} of {int(df["Flip Rate"].notna().sum())} periods change '
+              f'zone in at least one of {args.draws} draws. Saved to {filename}')
+
+
+if __name__ == '__main__':
+    main()
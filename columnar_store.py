@@ -0,0 +1,104 @@
+"""
+Columnar Parquet store for the financial data downloaded from the Financial Modeling Prep API.
+
+Instead of one pickle file per symbol and endpoint, the data is stored as one Parquet dataset per statement type
+(financial_data_parquet/statement_type=income-statement/...), optionally partitioned by year, with a 'symbol' column.
+The rows are sorted by symbol before being written, so the row group statistics let the reader skip the symbols that
+are not requested (predicate pushdown), and only the requested columns are read from disk (column projection).
+
+The store is built from the existing pickle files with migrate_pickles_to_parquet.py. The scoring scripts read it
+through statement_loader.py, which falls back to the pickle files if the store doesn't exist.
+"""
+
+import glob
+import os
+import shutil
+
+import pandas as pd
+
+from fmp_fetcher import MARKET_CAP_ENDPOINT, PROFILE_ENDPOINT, STATEMENT_TYPES, pickle_filename
+
+# Define the directory of the Parquet store
+STORE_DIR = 'financial_data_parquet'
+
+# Define the endpoints that can be saved in the store
+ENDPOINTS = STATEMENT_TYPES + [PROFILE_ENDPOINT, MARKET_CAP_ENDPOINT]
+
+
+def dataset_path(statement_type, store_dir=STORE_DIR):
+    # Each statement type is a separate dataset, since their columns are different
+    return os.path.join(store_dir, f'statement_type={statement_type}')
+
+
+def store_exists(statement_type, store_dir=STORE_DIR):
+    return os.path.isdir(dataset_path(statement_type, store_dir))
+
+
+def write_statements(df, statement_type, store_dir=STORE_DIR, partition_by_year=False, row_group_size=100_000):
+    # Write all the symbols of a statement type to the store, replacing the dataset if it already exists
+    path = dataset_path(statement_type, store_dir)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+    # Sort by symbol and most recent period first, so the row groups can be skipped when filtering by symbol
+    df = df.sort_values(['symbol', 'date'], ascending=[True, False], ignore_index=True)
+
+    if partition_by_year:
+        df = df.assign(year=pd.to_datetime(df['date']).dt.year)
+        df.to_parquet(path, engine='pyarrow', index=False, partition_cols=['year'], row_group_size=row_group_size)
+    else:
+        os.makedirs(path)
+        df.to_parquet(os.path.join(path, 'part-0.parquet'), engine='pyarrow', index=False, row_group_size=row_group_size)
+
+
+def read_statements(statement_type, symbols=None, columns=None, filters=None, store_dir=STORE_DIR):
+    # Read a statement type from the store, reading only the requested columns and symbols
+    # Additional filters can be passed in the pyarrow format, e.g. [('year', '>=', 2020)]
+    all_filters = list(filters or [])
+    if symbols is not None:
+        all_filters.append(('symbol', 'in', list(symbols)))
+
+    # The symbol and date are always needed to split and sort the data
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(['symbol', 'date'] + list(columns)))
+
+    df = pd.read_parquet(dataset_path(statement_type, store_dir), engine='pyarrow', columns=read_columns,
+                         filters=all_filters or None)
+
+    # Drop the partition column unless it was requested
+    if 'year' in df.columns and (columns is None or 'year' not in columns):
+        df = df.drop(columns='year')
+
+    return df.sort_values(['symbol', 'date'], ascending=[True, False], ignore_index=True)
+
+
+def migrate_pickles(pickle_dir='financial_data_pickle', store_dir=STORE_DIR, partition_by_year=False):
+    # Convert the existing pickle files to the Parquet store, one dataset per statement type
+    for statement_type in ENDPOINTS:
+        pattern = pickle_filename(pickle_dir, '*', statement_type)
+        suffix = pattern.split('*', 1)[1]
+
+        frames = []
+        for filename in sorted(glob.glob(pattern)):
+            df = pd.read_pickle(filename)
+            if df.empty:
+                continue
+
+            # Make sure the symbol column is there, taking it from the file name if needed
+            symbol = os.path.basename(filename)[:-len(suffix)]
+            if 'symbol' not in df.columns:
+                df = df.assign(symbol=symbol)
+            frames.append(df)
+
+        if not frames:
+            print(f'No pickle files found for {statement_type}')
+            continue
+
+        df = pd.concat(frames, ignore_index=True)
+        if 'date' not in df.columns:
+            # The profile has no period, use an empty date to keep the same layout for every dataset
+            df = df.assign(date='')
+
+        write_statements(df, statement_type, store_dir, partition_by_year and statement_type != PROFILE_ENDPOINT)
+        print(f'Migrated {len(frames)} {statement_type} pickle files ({len(df)} rows) to {dataset_path(statement_type, store_dir)}')
@@ -0,0 +1,127 @@
+"""
+Registry of the derived features shared by the scoring models.
+
+Several models use the same intermediate quantities, e.g. the working capital (Altman and Ohlson), the total assets
+and net income of the previous period (Piotroski, Ohlson and Beneish), the book value of equity, the funds from
+operations or the securities. Each derived feature is defined once here with the @feature decorator, and computed
+lazily on the panel the first time a model asks for it. A FeatureSet memoizes the computed features, so running all
+the models together with the same FeatureSet computes each feature only once.
+
+Besides the registered features and the columns of the panel, a FeatureSet understands these prefixes, which can
+be combined:
+    'filled:<name>'   - the feature with the missing values replaced by 0
+    'previous:<name>' - the feature of the prior period of the same symbol (NaN if the prior period is missing)
+    'diff:<name>'     - the change of the feature from the prior period of the same symbol
+    'average:<name>'  - the average of the feature over the last year of the same symbol
+For example, features['previous:filled:totalAssets'] is the total assets of the previous period, with 0 if missing.
+
+On a quarterly panel (see statement_alignment.py), the prior period is the same quarter of the previous year, i.e.
+four rows back, since the flows are trailing-twelve-month values, and the average is taken over the four quarters
+of the year. On an annual panel, the prior period is the previous row and the average is the value itself. The prior
+period is used only if no period is missing in between (see statement_alignment.consecutive), so a missing fiscal
+year doesn't compare two periods that are not adjacent.
+"""
+
+import pandas as pd
+
+from statement_alignment import PERIODS_PER_YEAR, consecutive, rolling
+
+# The registered features, keyed by name
+FEATURES = {}
+
+
+def feature(name):
+    # Register a function computing a derived feature from a FeatureSet
+    def register(function):
+        FEATURES[name] = function
+        return function
+    return register
+
+
+class FeatureSet:
+    # Lazily compute and memoize the features of a panel indexed by (symbol, date)
+
+    def __init__(self, panel):
+        self.panel = panel
+        self.cache = {}
+        self.period = panel.attrs.get('period', 'annual')
+
+        # Number of rows between a period and the same period of the previous year
+        self.lag = PERIODS_PER_YEAR[self.period]
+        self._has_previous = None
+
+    def __getitem__(self, name):
+        if name not in self.cache:
+            self.cache[name] = self._compute(name)
+        return self.cache[name]
+
+    def _compute(self, name):
+        prefix, _, base = name.partition(':')
+
+        if base and prefix == 'filled':
+            return self[base].fillna(0)
+        if base and prefix == 'previous':
+            # The rows whose prior period is missing have no previous value
+            if self._has_previous is None:
+                self._has_previous = consecutive(self.panel, self.lag, self.period)
+            return self[base].groupby(level='symbol', sort=False).shift(self.lag).where(self._has_previous)
+        if base and prefix == 'diff':
+            return self[base] - self[f'previous:{base}']
+        if base and prefix == 'average':
+            if self.lag == 1:
+                return self[base]
+            return pd.Series(rolling(self.panel, self[base], self.lag, 'mean', self.period), index=self.panel.index)
+
+        if name in FEATURES:
+            return FEATURES[name](self)
+        if name in self.panel.columns:
+            return self.panel[name]
+
+        raise KeyError(f'Unknown feature: {name}')
+
+
+@feature('working_capital')
+def working_capital(f):
+    return f['totalCurrentAssets'] - f['totalCurrentLiabilities']
+
+
+@feature('book_equity')
+def book_equity(f):
+    # Book value of equity, used by the Altman Z-Score when the market value is not available
+    return f['totalAssets'] - f['totalLiabilities']
+
+
+@feature('ebit')
+def ebit(f):
+    # EBIT as the operating income (Altman Z-Score)
+    return f['operatingIncome']
+
+
+@feature('ebit_from_ebt')
+def ebit_from_ebt(f):
+    # EBIT as the earnings before taxes plus the interest expense (DuPont analysis)
+    # An alternative is ebitda - depreciationAndAmortization, which gives the same results
+    return f['filled:incomeBeforeTax'] + f['filled:interestExpense']
+
+
+@feature('funds_from_operations')
+def funds_from_operations(f):
+    #FFO=Net Income+Depreciation+Amortization−Gains (or) + Losses
+    return f['netIncome'] + f['depreciationAndAmortization'] - f['totalOtherIncomeExpensesNet']
+
+
+@feature('securities')
+def securities(f):
+    return f['filled:shortTermInvestments'] + f['filled:longTermInvestments']
+
+
+@feature('roa')
+def roa(f):
+    # Return on assets, on the total assets at the beginning of the period
+    return f['netIncome'] / f['previous:totalAssets']
+
+
+@feature('total_share_outstanding')
+def total_share_outstanding(f):
+    # Sum the preferredStock and commonStock to get totalShareOutstanding
+    return (f['preferredStock'] + f['commonStock']).fillna(0)
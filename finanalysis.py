@@ -0,0 +1,203 @@
+"""
+Command line entry point of the financial analysis tools.
+
+The scripts score a fixed list of symbols and always plot. This command takes the symbols from the command line or
+from a file, loads the statements once, builds one panel and runs all the requested models on it (see
+scoring_engine.score_universe), then writes the results as one run of the partitioned Parquet store of the results
+(see result_store.py), and one CSV file per model only with --csv. The plotting libraries are imported only when
+plots are requested, and the other tools are imported only by the command that runs them, so the command starts
+quickly and runs on a headless machine.
+
+Each run saves a JSON report next to its manifest (see run_report.py), with the time and the peak memory of each stage,
+the number of rows of each model and the hits and misses of the statement cache. With --profile-stage, one stage runs
+under cProfile and its statistics are saved next to the report.
+
+Examples:
+    python finanalysis.py score --models altman,piotroski --symbols-file universe.txt --no-plots
+    python finanalysis.py score --symbols CRM,ORCL,GOOGL,MSFT --period quarter
+    python finanalysis.py score --symbols-file universe.txt --no-plots --profile-stage score
+    python finanalysis.py sensitivity --symbols CRM,ORCL --models altman --draws 10000
+    python finanalysis.py batch --symbols-file universe.txt --workers 32
+"""
+
+import argparse
+import os
+import sys
+
+from run_report import STAGES, RunReport, span
+
+# Define the models that can be scored (the same as scoring_engine.MODELS, which is imported only when scoring)
+MODEL_NAMES = ['altman', 'piotroski', 'beneish', 'ohlson', 'dupont']
+
+
+def plot_results(results, symbols, name, industry='non_manufacturer', output_dir='deliverables', show=False):
+    # Plot the results of each model, with the same charts as the scripts
+    import model_plots
+    from scoring_engine import PIOTROSKI_COMPONENTS
+
+    plot_filenames = []
+    for model, df in results.items():
+        if model == 'altman':
+            plot_filenames.append(model_plots.plot_altman_zscore(df, symbols, name, industry, output_dir, show))
+        elif model == 'beneish':
+            plot_filenames.append(model_plots.plot_beneish_mscore(df, symbols, name, output_dir, show))
+        elif model == 'ohlson':
+            plot_filenames.append(model_plots.plot_ohlson_oscore(df, symbols, name, output_dir, show))
+        elif model == 'piotroski':
+            plot_filenames += model_plots.plot_piotroski_fscore(
+                df[['Symbol', 'Date/Period', 'Piotroski F-Score']], df[['Symbol', 'Date/Period'] + PIOTROSKI_COMPONENTS],
+                symbols, name, output_dir, show)
+        elif model == 'dupont':
+            plot_filenames += model_plots.plot_dupont(df.rename(columns={'Date/Period': 'Date'}), symbols, name,
+                                                      output_dir, show)
+    return plot_filenames
+
+
+def score(args):
+    # Score the symbols and save the report of the run (the timings, the memory and the counters)
+    from result_store import new_run_id, report_path
+
+    run_id = args.run_id or new_run_id()
+    report_filename = args.report or report_path(run_id, os.path.join(args.output_dir, 'results'))
+    with RunReport('score', run_id, args.profile_stage, os.path.dirname(report_filename)) as report:
+        results = score_symbols(args, run_id)
+    report.save(report_filename)
+    print(f'Saved the report of the run to {report_filename}')
+    return results
+
+
+def score_symbols(args, run_id):
+    # Load the statements once and run all the requested models on the same panel
+    from batch_scoring import read_symbols
+    from fmp_fetcher import MARKET_CAP_ENDPOINT, period_dir
+    from macro_series import countries_from_profiles
+    from market_cap import MarketCapSeries
+    from scoring_engine import columns_for_models, score_universe
+    from result_store import deliverable_name, sectors_from_profiles, symbols_hash, write_csv, write_results
+    from statement_loader import load_statements
+
+    symbols = read_symbols(args.symbols, args.symbols_file)
+    if not symbols:
+        sys.exit('Specify the symbols with --symbols or --symbols-file')
+    models = args.models.split(',')
+    unknown = [model for model in models if model not in MODEL_NAMES]
+    if unknown:
+        sys.exit(f'Unknown models: {",".join(unknown)} (choose from {",".join(MODEL_NAMES)})')
+
+    pickle_dir = args.pickle_dir or period_dir('financial_data_pickle', args.period)
+    store_dir = args.store_dir or period_dir('financial_data_parquet', args.period)
+
+    columns = columns_for_models(models)
+    statement_data = load_statements(symbols, list(columns), columns=columns, store_dir=store_dir,
+                                     pickle_dir=pickle_dir)
+
+    # The Ohlson O-Score looks up the GNP of the country of each symbol, which is in the profile data
+    countries = None
+    if 'ohlson' in models:
+        countries = countries_from_profiles(load_statements(symbols, ['profile'], columns=['country'],
+                                                            store_dir=store_dir, pickle_dir=pickle_dir)['profile'])
+
+    # The market value variant of the Altman Z-Score needs the daily market cap
+    market_cap = None
+    if 'altman' in models and args.market_value:
+        market_cap = MarketCapSeries.from_frames(load_statements(
+            symbols, [MARKET_CAP_ENDPOINT], columns=['marketCap'], store_dir=store_dir,
+            pickle_dir=pickle_dir)[MARKET_CAP_ENDPOINT])
+
+    results = score_universe(statement_data, symbols, models, args.period, industry=args.industry,
+                             countries=countries, market_cap=market_cap)
+
+    # Sort the results of each model by Date/Period in chronological order
+    for model, df in results.items():
+        results[model] = df.sort_values(['Date/Period', 'Symbol'], kind='stable', ignore_index=True)
+
+    # Save the results as one run of the results store, with the sector of each symbol
+    sectors = sectors_from_profiles(load_statements(symbols, ['profile'], columns=['sector'], store_dir=store_dir,
+                                                    pickle_dir=pickle_dir)['profile'])
+    results_dir = os.path.join(args.output_dir, 'results')
+    manifest = write_results(results, results_dir, run_id, sectors, metadata={
+        'command': 'score', 'symbols': len(symbols), 'symbols_hash': symbols_hash(symbols),
+        'industry': args.industry, 'period': args.period, 'market_value': args.market_value})
+    for model, entry in manifest['models'].items():
+        print(f'Saved {entry["rows"]} {model} results to {os.path.join(results_dir, entry["path"])}')
+    print(f'Run ID: {manifest["run_id"]}')
+
+    if args.csv:
+        for model, df in results.items():
+            filename = write_csv(df, os.path.join(args.output_dir, f'{model}_results.csv'))
+            print(f'Saved {len(df)} {model} results to {filename}')
+
+    if args.plots:
+        # Name the charts after the symbols file, or after the symbols if they are on the command line
+        name = args.name or (os.path.splitext(os.path.basename(args.symbols_file))[0] if args.symbols_file
+                             else deliverable_name(symbols))
+        with span('render'):
+            plot_filenames = plot_results(results, symbols, name, args.industry, args.output_dir, args.show)
+        for plot_filename in plot_filenames:
+            print(f'Saved plot to {plot_filename}')
+
+    if args.charts:
+        # Render the chart of each symbol and of each sector, headless and with a pool of worker processes
+        from batch_scoring import render_plots
+        render_plots(results, os.path.join(args.output_dir, 'charts'), sectors, args.workers, args.industry)
+
+    return results
+
+
+def sensitivity(args):
+    # Run the Monte Carlo sensitivity analysis of the model zones (see coefficient_sensitivity.py)
+    from coefficient_sensitivity import main
+    main(args.arguments)
+
+
+def batch(args):
+    # Score a large universe with a pool of worker processes (see batch_scoring.py)
+    from batch_scoring import main
+    main(args.arguments)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='finanalysis', description='Financial analysis of a universe of symbols')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    score_parser = commands.add_parser('score', help='score the symbols with the models, in one process')
+    score_parser.add_argument('--symbols', help='comma-separated list of symbols, e.g. CRM,ORCL,GOOGL,MSFT')
+    score_parser.add_argument('--symbols-file', help='file with one symbol per line')
+    score_parser.add_argument('--models', default=','.join(MODEL_NAMES),
+                              help=f'comma-separated list of models ({",".join(MODEL_NAMES)})')
+    score_parser.add_argument('--industry', default='non_manufacturer', help='industry for the Altman Z-Score')
+    score_parser.add_argument('--market-value', action='store_true',
+                              help='use the market value of equity (daily market cap) in the manufacturers Altman Z-Score')
+    score_parser.add_argument('--period', default='annual', choices=['annual', 'quarter'],
+                              help='period of the financial statements (quarter uses trailing-twelve-month flows)')
+    score_parser.add_argument('--pickle-dir', help='default: financial_data_pickle (financial_data_pickle_quarter)')
+    score_parser.add_argument('--store-dir', help='default: financial_data_parquet (financial_data_parquet_quarter)')
+    score_parser.add_argument('--output-dir', default='deliverables')
+    score_parser.add_argument('--csv', action='store_true', help='also save the results of each model to a CSV file')
+    score_parser.add_argument('--run-id', help='ID of the run in the results store (default: the start time)')
+    score_parser.add_argument('--no-plots', dest='plots', action='store_false',
+                              help="don't plot (matplotlib and seaborn are not imported)")
+    score_parser.add_argument('--show', action='store_true', help='show the plots after saving them')
+    score_parser.add_argument('--charts', action='store_true',
+                              help='save a chart of each symbol and of each sector (see plot_pipeline.py)')
+    score_parser.add_argument('--workers', type=int, default=1, help='number of processes rendering the charts')
+    score_parser.add_argument('--name', help='name of the plot files (default: the symbols file or the symbols)')
+    score_parser.add_argument('--report', help='JSON file of the report of the run (default: results/reports/<run ID>.json)')
+    score_parser.add_argument('--profile-stage', choices=STAGES, help='run this stage under cProfile')
+    score_parser.set_defaults(function=score)
+
+    for name, function, description in [('sensitivity', sensitivity, 'Monte Carlo sensitivity of the model zones'),
+                                        ('batch', batch, 'score a large universe with a pool of worker processes')]:
+        # The options of these commands are parsed by the tools that run them
+        command_parser = commands.add_parser(name, help=description, add_help=False)
+        command_parser.set_defaults(function=function, passthrough=True)
+
+    args, arguments = parser.parse_known_args(argv)
+    if arguments and not getattr(args, 'passthrough', False):
+        parser.error(f'unrecognized arguments: {" ".join(arguments)}')
+    args.arguments = arguments
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""
+Concurrent fetch engine for the Financial Modeling Prep API.
+
+The engine downloads the company profile, the three financial statements and the historical market capitalization
+for a universe of symbols, using a bounded pool of worker threads that share a single keep-alive session.
+Reusing the session means that the TCP/TLS connections are opened once per worker and then recycled, instead of
+being opened again for every request.
+
+Every request goes through the shared request layer in fmp_request.py, which applies the rate limits of the API plan
+and retries the responses with status code 429/5xx with exponential backoff.
+
+The data is saved to the same '{symbol}_{statement_type}_data.pkl' pickle files used by the scoring scripts, so
+nothing else needs to change. The base URL can be pointed to any server (for example a local stand-in server),
+which makes the engine testable without a network connection.
+
+In refresh mode the cached statements are not used forever: the engine reads the latest period saved for each symbol
+and statement, requests only the periods filed since then (using 'limit') and merges them into the stored history.
+Symbols whose next filing is not due yet are skipped without making any request.
+
+Before any request is made, the engine plans the full set of unique (endpoint, symbol, params) jobs and prints how
+many API calls the run will cost (set dry_run=True to stop there). Each job is then run exactly once through a
+single-flight cache, so the same request is never sent twice even if it is planned by more than one caller.
+
+Data provided by Financial Modeling Prep (https://financialmodelingprep.com/developer/docs/).
+"""
+
+import os
+import math
+import threading
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from fmp_request import DailyQuotaExceeded, request_with_retry
+from run_report import register_counters, stage
+
+# Define the base URL for Financial Modeling Prep API
+# Set the FMP_BASE_URL environment variable to use another server, e.g. the local stand-in server of fmp_server.py
+DEFAULT_BASE_URL = os.environ.get('FMP_BASE_URL', 'https://financialmodelingprep.com/api/v3/').rstrip('/') + '/'
+
+# Define the type of financial statement (balance sheet, income statement, cash flow statement)
+STATEMENT_TYPES = ['balance-sheet-statement', 'income-statement', 'cash-flow-statement']
+
+# Define the endpoints for the company data that are not financial statements
+PROFILE_ENDPOINT = 'profile'
+MARKET_CAP_ENDPOINT = 'historical-market-capitalization'
+
+# Define the number of days between two periods, and the days allowed to file the statements after the period end
+PERIOD_DAYS = {'annual': 365, 'quarter': 91, 'daily': 1}
+FILING_LAG_DAYS = {'annual': 90, 'quarter': 45, 'daily': 1}
+
+# Count the API calls made, and the calls avoided because the data is in the pickle files (or not due yet)
+api_stats = {'calls': 0, 'avoided': 0}
+register_counters('api', api_stats)
+_api_stats_lock = threading.Lock()
+
+
+def create_session(pool_size=8):
+    # Create a session that keeps the connections alive, with one pooled connection per worker
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def pickle_filename(pickle_dir, symbol, endpoint):
+    # Keep the same file names used by get_financial_data_from_fmp.py and by the scoring scripts
+    if endpoint == PROFILE_ENDPOINT:
+        return f'{pickle_dir}/{symbol}_profile_data.pkl'
+    elif endpoint == MARKET_CAP_ENDPOINT:
+        return f'{pickle_dir}/{symbol}_historical_market_cap_data.pkl'
+    else:
+        return f'{pickle_dir}/{symbol}_{endpoint}_data.pkl'
+
+
+def period_dir(directory, period='annual'):
+    # The quarterly data is kept in its own directory (e.g. financial_data_pickle_quarter), since the file names are
+    # the same for both periods
+    return directory if period == 'annual' else f'{directory}_{period}'
+
+
+def build_url(base_url, endpoint, symbol, api_key, params=None):
+    # Build the endpoint URL, e.g. {base_url}income-statement/AAPL?period=annual&apikey=...
+    query = ''.join(f'{key}={value}&' for key, value in (params or {}).items())
+    return f'{base_url}{endpoint}/{symbol}?{query}apikey={api_key}'
+
+
+def latest_cached_date(df):
+    # Get the filing date of the latest period in the cache (or the period end plus the filing lag if it is missing)
+    if df.empty or 'date' not in df.columns:
+        return None, None
+
+    dates = pd.to_datetime(df['date'])
+    latest = dates.idxmax()
+    filling_date = df['fillingDate'].loc[latest] if 'fillingDate' in df.columns else None
+    filling_date = pd.to_datetime(filling_date) if pd.notna(filling_date) else None
+
+    return dates.loc[latest], filling_date
+
+
+def periods_due(df, period='annual', today=None):
+    # Count the new periods that should have been filed since the latest period in the cache
+    # Return None if the cache is empty, in which case the full history is needed
+    latest_date, filling_date = latest_cached_date(df)
+    if latest_date is None:
+        return None
+
+    today = pd.Timestamp.today().normalize() if today is None else pd.Timestamp(today)
+
+    # The next filing is due one period after the last one
+    last_filing = filling_date if filling_date is not None else latest_date + pd.Timedelta(days=FILING_LAG_DAYS[period])
+    return max(math.floor((today - last_filing).days / PERIOD_DAYS[period]), 0)
+
+
+def job_key(job):
+    # Identify a request by its endpoint, symbol and parameters
+    return job['endpoint'], job['symbol'], tuple(sorted(job['params'].items()))
+
+
+def build_jobs(symbols, pickle_dir, period='annual', profile_limit=0, market_cap_limit=0, refresh=False, today=None):
+    # Build the list of unique requests needed to fill the missing pickle files
+    # The profile and the market cap are requested only if their limit is greater than 0 to avoid unnecessary API requests
+    # In refresh mode, the statements and the market cap already saved are updated with the newer periods only
+    jobs = []
+
+    # Plan each symbol once, even if it is repeated in the list
+    for symbol in dict.fromkeys(symbols):
+        endpoints = []
+        if profile_limit > 0:
+            endpoints.append((PROFILE_ENDPOINT, {'limit': profile_limit}))
+        for statement_type in STATEMENT_TYPES:
+            endpoints.append((statement_type, {'period': period}))
+        if market_cap_limit > 0:
+            endpoints.append((MARKET_CAP_ENDPOINT, {'limit': market_cap_limit}))
+
+        for endpoint, params in endpoints:
+            filename = pickle_filename(pickle_dir, symbol, endpoint)
+
+            # Skip the request if the data has already been saved
+            if os.path.exists(filename):
+                if not refresh or endpoint == PROFILE_ENDPOINT:
+                    print(f'Loaded {endpoint} data for {symbol} from {filename}')
+                    api_stats['avoided'] += 1
+                    continue
+
+                # Request only the periods that have been filed since the latest one in the cache
+                due = periods_due(pd.read_pickle(filename), 'daily' if endpoint == MARKET_CAP_ENDPOINT else period, today)
+                if due == 0:
+                    print(f'{endpoint} data for {symbol} is up to date, the next filing is not due yet')
+                    api_stats['avoided'] += 1
+                    continue
+
+                if due is not None:
+                    # Request one more period, so a restatement of the latest period also replaces the cached one
+                    limit = due + 1 if endpoint != MARKET_CAP_ENDPOINT else min(due + 1, params['limit'])
+                    jobs.append({'symbol': symbol, 'endpoint': endpoint, 'params': {**params, 'limit': limit},
+                                 'filename': filename, 'merge': True})
+                    continue
+
+            jobs.append({'symbol': symbol, 'endpoint': endpoint, 'params': params, 'filename': filename})
+
+    return jobs
+
+
+def summarize_plan(jobs, limiter=None):
+    # Print how many API calls the run will cost, by endpoint, before any of them is made
+    calls_by_endpoint = Counter(job['endpoint'] for job in jobs)
+
+    print(f'Planned {len(jobs)} API calls for {len({job["symbol"] for job in jobs})} symbols')
+    for endpoint, calls in calls_by_endpoint.items():
+        print(f'  {endpoint}: {calls}')
+
+    if limiter is not None and limiter.remaining_today() is not None:
+        print(f'API calls left for today: {limiter.remaining_today()}')
+
+    return dict(calls_by_endpoint)
+
+
+class SingleFlight:
+    # Run each job at most once: callers asking for a job that is running or done get the same result
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def run(self, key, function, *args):
+        with self.lock:
+            future = self.calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self.calls[key] = future
+
+        if owner:
+            try:
+                future.set_result(function(*args))
+            except BaseException as error:
+                # Forget the failed job, so it can be tried again
+                with self.lock:
+                    del self.calls[key]
+                future.set_exception(error)
+
+        return future.result()
+
+
+def merge_history(cached_df, new_df):
+    # Merge the newer periods into the stored history, keeping the fetched row when a period is in both
+    if new_df.empty:
+        return cached_df
+
+    merged = pd.concat([new_df, cached_df], ignore_index=True)
+    merged = merged.drop_duplicates(subset=['date'], keep='first')
+
+    # Keep the most recent period first, as returned by the API
+    merged = merged.sort_values('date', key=pd.to_datetime, ascending=False, ignore_index=True)
+    return merged
+
+
+def fetch_job(session, base_url, api_key, job, limiter=None, timeout=30):
+    # Make the API request for a single job and save the DataFrame to a pickle file
+    url = build_url(base_url, job['endpoint'], job['symbol'], api_key, job['params'])
+    response = request_with_retry(session, url, limiter, timeout=timeout)
+
+    # Count the call once it has been made (the limiter raises DailyQuotaExceeded before any request)
+    with _api_stats_lock:
+        api_stats['calls'] += 1
+
+    # Check if the request was successful (status code 200)
+    if response.status_code == 200:
+        # Create a DataFrame from the response data and save it to a pickle file
+        df = pd.DataFrame(response.json())
+        if job.get('merge'):
+            df = merge_history(pd.read_pickle(job['filename']), df)
+        df.to_pickle(job['filename'])
+        print(f"Saved {job['endpoint']} data for {job['symbol']} to {job['filename']}")
+
+    else:
+        # Print an error message if the request was not successful
+        print(f"Error fetching {job['endpoint']} data for {job['symbol']}. Status code: {response.status_code}")
+
+    return response.status_code
+
+
+@stage('fetch')
+def fetch_universe(symbols, api_key, base_url=DEFAULT_BASE_URL, pickle_dir='financial_data_pickle', period='annual',
+                   profile_limit=0, market_cap_limit=0, max_workers=8, session=None, limiter=None, refresh=False,
+                   dry_run=False, single_flight=None):
+    # Fetch all the missing data for the symbols with a bounded pool of concurrent requests
+    os.makedirs(pickle_dir, exist_ok=True)
+    jobs = build_jobs(symbols, pickle_dir, period, profile_limit, market_cap_limit, refresh)
+
+    # Print the cost of the run before making any request
+    summarize_plan(jobs, limiter)
+    if dry_run:
+        return {}
+
+    # Run each job exactly once, also across calls sharing the same single-flight cache
+    if single_flight is None:
+        single_flight = SingleFlight()
+
+    # Share one keep-alive session across the workers, so connections are reused between requests
+    owns_session = session is None
+    if owns_session:
+        session = create_session(max_workers)
+
+    # Store the status code of each request, keyed by (symbol, endpoint)
+    results = {}
+    quota_exceeded = False
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(single_flight.run, job_key(job), fetch_job, session, base_url, api_key, job, limiter): job
+                       for job in jobs}
+
+            for future in as_completed(futures):
+                job = futures[future]
+                if future.cancelled():
+                    continue
+
+                try:
+                    results[(job['symbol'], job['endpoint'])] = future.result()
+                except DailyQuotaExceeded as error:
+                    # Stop sending requests, the missing files will be fetched in the next run
+                    results[(job['symbol'], job['endpoint'])] = None
+                    if not quota_exceeded:
+                        print(f'{error}, the remaining requests are postponed to the next run')
+                        quota_exceeded = True
+                        for pending in futures:
+                            pending.cancel()
+                except requests.RequestException as error:
+                    print(f"Error fetching {job['endpoint']} data for {job['symbol']}. {error}")
+                    results[(job['symbol'], job['endpoint'])] = None
+    finally:
+        if owns_session:
+            session.close()
+
+    # Mark the cancelled requests as failed, so no symbol is dropped silently
+    for job in jobs:
+        results.setdefault((job['symbol'], job['endpoint']), None)
+
+    # Report how much of the daily budget is left
+    if limiter is not None and limiter.remaining_today() is not None:
+        print(f'API calls left for today: {limiter.remaining_today()}')
+
+    return results
@@ -0,0 +1,180 @@
+"""
+Shared request layer for the Financial Modeling Prep API.
+
+Every call to the API goes through a rate limiter configured with the limits of the API plan: a token bucket
+for the calls per minute and a counter for the calls per day. The bucket lets the requests run at the maximum
+throughput allowed by the plan, and blocks just long enough to avoid being throttled when the limit is reached.
+
+Responses with status code 429 (too many requests) or 5xx (server errors) are retried with exponential backoff
+and jitter, so a burst of errors doesn't leave holes in the pickle cache. If the server sends a 'Retry-After'
+header, it is respected.
+
+Data provided by Financial Modeling Prep (https://financialmodelingprep.com/developer/docs/).
+"""
+
+import datetime
+import json
+import os
+import random
+import threading
+import time
+
+from run_report import register_counters
+
+# Define the limits of the Financial Modeling Prep API plans (None means that there is no limit)
+# Check the limits of your plan on https://site.financialmodelingprep.com/developer/docs/pricing
+API_PLANS = {
+    'free': {'calls_per_minute': None, 'calls_per_day': 250},
+    'starter': {'calls_per_minute': 300, 'calls_per_day': None},
+    'premium': {'calls_per_minute': 750, 'calls_per_day': None},
+    'ultimate': {'calls_per_minute': 3000, 'calls_per_day': None},
+}
+
+# Define the file of the calls made today with the API key, shared by all the scripts and by both periods (the daily
+# budget is per key, so the quarterly fetches and the screener must count in the same file)
+USAGE_FILE = os.path.join('financial_data_pickle', 'api_usage.json')
+
+# Define the status codes that are worth retrying (too many requests and server errors)
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Count the HTTP requests sent (with the retries) and the retries
+request_stats = {'requests': 0, 'retries': 0}
+register_counters('http', request_stats)
+_request_stats_lock = threading.Lock()
+
+
+class DailyQuotaExceeded(Exception):
+    # Raised when the daily budget of API calls has been spent
+    pass
+
+
+class TokenBucket:
+    # Token bucket that refills 'rate' tokens per second, up to 'capacity' tokens
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def acquire(self):
+        # Take one token, waiting for the bucket to refill if it is empty
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+
+            # Sleep outside the lock, so the other threads can check the bucket in the meantime
+            time.sleep(wait)
+
+
+class RateLimiter:
+    # Rate limiter for the calls per minute and the calls per day of an API plan
+
+    def __init__(self, calls_per_minute=None, calls_per_day=None, usage_file=None):
+        self.calls_per_day = calls_per_day
+        self.usage_file = usage_file
+        self.lock = threading.Lock()
+
+        # Use a bucket as big as one minute of calls, so a burst can use the whole minute budget at once
+        self.bucket = TokenBucket(calls_per_minute / 60, calls_per_minute) if calls_per_minute else None
+
+        # Load the calls already made today, so the daily budget is shared between runs
+        self.day = datetime.date.today().isoformat()
+        self.calls_today = 0
+        if usage_file and os.path.exists(usage_file):
+            with open(usage_file) as f:
+                usage = json.load(f)
+            self.calls_today = usage.get(self.day, 0)
+
+    @classmethod
+    def from_plan(cls, plan='free', usage_file=None):
+        # Create a rate limiter with the limits of the specified API plan
+        limits = API_PLANS[plan]
+        return cls(limits['calls_per_minute'], limits['calls_per_day'], usage_file)
+
+    def remaining_today(self):
+        # Return how many calls are left in the daily budget (None if there is no daily limit)
+        with self.lock:
+            self._roll_day()
+            if self.calls_per_day is None:
+                return None
+            return max(self.calls_per_day - self.calls_today, 0)
+
+    def _roll_day(self):
+        # Reset the daily counter when the date changes
+        today = datetime.date.today().isoformat()
+        if today != self.day:
+            self.day = today
+            self.calls_today = 0
+
+    def _save_usage(self):
+        if self.usage_file:
+            os.makedirs(os.path.dirname(self.usage_file) or '.', exist_ok=True)
+            with open(self.usage_file, 'w') as f:
+                json.dump({self.day: self.calls_today}, f)
+
+    def acquire(self):
+        # Reserve one call from the daily budget, then wait for a token from the minute bucket
+        with self.lock:
+            self._roll_day()
+            if self.calls_per_day is not None and self.calls_today >= self.calls_per_day:
+                raise DailyQuotaExceeded(f'Daily limit of {self.calls_per_day} API calls reached')
+            self.calls_today += 1
+            self._save_usage()
+
+        if self.bucket is not None:
+            self.bucket.acquire()
+
+
+def backoff_delay(attempt, base=1.0, maximum=60.0):
+    # Exponential backoff with full jitter: a random delay between 0 and base * 2^attempt
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+def request_with_retry(session, url, limiter=None, max_retries=5, backoff_base=1.0, timeout=30):
+    # Make a GET request through the rate limiter, retrying on 429/5xx responses and on connection errors
+    # Return the last response, so the caller can still check its status code
+    attempt = 0
+
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+
+        with _request_stats_lock:
+            request_stats['requests'] += 1
+            request_stats['retries'] += attempt > 0
+
+        try:
+            response = session.get(url, timeout=timeout)
+        except (ConnectionError, TimeoutError, OSError):
+            if attempt >= max_retries:
+                raise
+            time.sleep(backoff_delay(attempt, backoff_base))
+            attempt += 1
+            continue
+
+        if response.status_code not in RETRY_STATUS_CODES or attempt >= max_retries:
+            return response
+
+        # Respect the 'Retry-After' header if the server sends it, otherwise back off exponentially
+        # The header is capped at the longest backoff of the retries, so a bad value can't stall the download, and an
+        # HTTP-date or any other non-numeric value is treated as missing
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None and retry_after.isascii() and retry_after.isdigit():
+            delay = min(int(retry_after), backoff_base * 2 ** max_retries)
+        else:
+            delay = backoff_delay(attempt, backoff_base)
+
+        print(f'Status code {response.status_code}, retrying in {delay:.1f} seconds (attempt {attempt + 1} of {max_retries})')
+        time.sleep(delay)
+        attempt += 1
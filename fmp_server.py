@@ -0,0 +1,299 @@
+"""
+Local stand-in server for the Financial Modeling Prep API, to run the fetchers without a network connection.
+
+The server answers the endpoints used by get_financial_data_from_fmp.py (the three financial statements, the profile
+and the historical market capitalization) and by stock_screener_simplified.py (the DCF, the rating, the key metrics
+and the financial growth), with the URLs of the API:
+
+    http://127.0.0.1:8765/api/v3/income-statement/AAPL?period=annual&limit=5&apikey=...
+
+The responses are the JSON records of the API, the most recent period first, taken from:
+
+- recorded responses: the pickle files saved by the scripts from the real API (Fixtures.from_pickles), which are the
+  DataFrames of the responses, so an existing cache can be served again
+- synthetic responses: the data of synthetic_data.py for any number of symbols (Fixtures.from_synthetic)
+
+As the API does, the 'limit' parameter keeps the most recent records, 'period' chooses the annual or the quarterly
+statements, an unknown symbol gets an empty list and a request without an API key gets a 401. To measure the
+throughput of the fetchers and their recovery from failures, the server can add a latency to each response, answer
+a fraction of the requests with 429 (too many requests, with an optional Retry-After header) or 5xx errors, and
+throttle the requests over a number of calls per minute, like the plans of the API. The requests and the status codes
+sent are counted in server.stats.
+
+The fetchers are pointed to the server with their base_url, or with the FMP_BASE_URL environment variable
+(see fmp_fetcher.DEFAULT_BASE_URL, used by the scripts). The API key can be anything.
+
+Examples:
+    python fmp_server.py --synthetic 1000 --port 8765 --latency 0.05 --error-rate-429 0.02 --error-rate-5xx 0.01
+    FMP_BASE_URL=http://127.0.0.1:8765/api/v3/ python get_financial_data_from_fmp.py
+
+    with StandInServer(Fixtures.from_pickles('financial_data_pickle')) as server:
+        fetch_universe(symbols, 'key', base_url=server.base_url, pickle_dir='/tmp/fetched')
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from fmp_fetcher import MARKET_CAP_ENDPOINT, PROFILE_ENDPOINT, STATEMENT_TYPES, period_dir, pickle_filename
+from synthetic_data import (N_PERIODS, SCREENER_ENDPOINTS, business_days, generate_universe, market_cap_frame,
+                            split_by_symbol)
+
+# Define the path of the API on the server
+API_PATH = '/api/v3/'
+
+# Define the endpoints answered by the server, and the endpoints with annual and quarterly data
+ENDPOINTS = STATEMENT_TYPES + [PROFILE_ENDPOINT, MARKET_CAP_ENDPOINT] + SCREENER_ENDPOINTS
+PERIOD_ENDPOINTS = STATEMENT_TYPES + ['key-metrics', 'financial-growth']
+
+# Define the status codes of the injected server errors
+SERVER_ERROR_CODES = [500, 502, 503]
+
+
+class Fixtures:
+    # The responses of the server: the records of each endpoint, symbol and period, loaded on the first request and
+    # kept as JSON records
+
+    def __init__(self, loader):
+        # The loader returns the DataFrame of an endpoint, a symbol and a period, or None if there is no data
+        self.loader = loader
+        self.records = {}
+        self.lock = threading.Lock()
+
+    def get(self, endpoint, symbol, period='annual'):
+        # Get the records of an endpoint and a symbol (the records of the most recent period first)
+        key = (endpoint, symbol, period if endpoint in PERIOD_ENDPOINTS else None)
+        with self.lock:
+            if key in self.records:
+                return self.records[key]
+
+        df = self.loader(endpoint, symbol, key[2])
+        # Convert to JSON records, where the missing values are null as in the responses of the API
+        records = [] if df is None or df.empty else json.loads(df.to_json(orient='records', date_format='iso'))
+
+        with self.lock:
+            self.records[key] = records
+        return records
+
+    @classmethod
+    def from_pickles(cls, pickle_dir='financial_data_pickle', screener_dir=None):
+        # Serve the pickle files saved by the scripts (recorded from the API): the statements of the quarterly period
+        # are read from the quarterly directory (e.g. financial_data_pickle_quarter), and the data of the screener from
+        # screener_dir (by default the same directory, as in stock_screener_simplified.py)
+        screener_dir = screener_dir or pickle_dir
+
+        def load(endpoint, symbol, period):
+            if endpoint in STATEMENT_TYPES:
+                filenames = [pickle_filename(period_dir(pickle_dir, period), symbol, endpoint)]
+            elif endpoint == PROFILE_ENDPOINT:
+                filenames = [pickle_filename(pickle_dir, symbol, endpoint),
+                             pickle_filename(screener_dir, symbol, endpoint)]
+            elif endpoint == MARKET_CAP_ENDPOINT:
+                filenames = [pickle_filename(pickle_dir, symbol, endpoint)]
+            else:
+                filenames = [f'{screener_dir}/{symbol}_{endpoint}.pkl']
+
+            for filename in filenames:
+                if os.path.exists(filename):
+                    return pd.read_pickle(filename)
+            return None
+
+        return cls(load)
+
+    @classmethod
+    def from_synthetic(cls, n_symbols, n_periods=N_PERIODS, seed=0, **options):
+        # Serve the synthetic data of a universe (see synthetic_data.py): the symbols are AAAA, AAAB, ...
+        # The data of each period is generated on the first request, and the daily market cap symbol by symbol
+        universes = {}
+        lock = threading.Lock()
+
+        def universe(period):
+            with lock:
+                if period not in universes:
+                    universes[period] = {endpoint: split_by_symbol(df) for endpoint, df in
+                                         generate_universe(n_symbols, n_periods, period, seed, **options).items()}
+                return universes[period]
+
+        def load(endpoint, symbol, period):
+            if endpoint == MARKET_CAP_ENDPOINT:
+                profile = universe('annual')[PROFILE_ENDPOINT].get(symbol)
+                if profile is None:
+                    return None
+                dates = pd.to_datetime(universe('annual')['balance-sheet-statement'][symbol]['date'])
+                # Seed the market cap of each symbol with its position, so it's the same on every request
+                rng = np.random.default_rng([seed, list(universe('annual')[PROFILE_ENDPOINT]).index(symbol)])
+                days = business_days(dates.min() - pd.Timedelta(days=30), dates.max() + pd.Timedelta(days=90))
+                return market_cap_frame(symbol, profile['mktCap'].iloc[0], days, rng)
+            return universe(period or 'annual').get(endpoint, {}).get(symbol)
+
+        return cls(load)
+
+
+class StandInServer:
+    # Local HTTP server answering the requests of the fetchers with the fixtures, in a background thread
+
+    def __init__(self, fixtures, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate_429=0.0,
+                 error_rate_5xx=0.0, retry_after=None, calls_per_minute=None, seed=None):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate_429 = error_rate_429
+        self.error_rate_5xx = error_rate_5xx
+        self.retry_after = retry_after
+        self.calls_per_minute = calls_per_minute
+        self.random = random.Random(seed)
+
+        # Count the requests by endpoint and by status code, and keep the times of the last minute of requests
+        self.stats = {'requests': Counter(), 'status_codes': Counter()}
+        self.request_times = deque()
+        self.lock = threading.Lock()
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}{API_PATH}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def injected_error(self):
+        # Choose the status code of an injected error for a request (None to answer it normally)
+        with self.lock:
+            if self.calls_per_minute:
+                # Throttle the requests over the limit of the last minute, like the API
+                now = time.monotonic()
+                while self.request_times and now - self.request_times[0] > 60:
+                    self.request_times.popleft()
+                if len(self.request_times) >= self.calls_per_minute:
+                    return 429
+                self.request_times.append(now)
+
+            draw = self.random.random()
+            if draw < self.error_rate_429:
+                return 429
+            if draw < self.error_rate_429 + self.error_rate_5xx:
+                return self.random.choice(SERVER_ERROR_CODES)
+            return None
+
+    def respond(self, path, query):
+        # Get the status code, the body and the headers of the response to a request
+        if not path.startswith(API_PATH):
+            return 404, {'Error Message': f'Unknown path {path}'}, {}
+
+        parts = path[len(API_PATH):].strip('/').split('/')
+        endpoint, symbol = parts[0], '/'.join(parts[1:])
+        with self.lock:
+            self.stats['requests'][endpoint] += 1
+
+        if endpoint not in ENDPOINTS or not symbol:
+            return 404, {'Error Message': f'Unknown endpoint {endpoint}'}, {}
+        if not query.get('apikey', [''])[0]:
+            return 401, {'Error Message': 'Invalid API KEY. Please retry or visit our documentation.'}, {}
+
+        status_code = self.injected_error()
+        if status_code == 429:
+            headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+            return 429, {'Error Message': 'Limit Reach. Please upgrade your plan.'}, headers
+        if status_code is not None:
+            return status_code, {'Error Message': 'Internal server error'}, {}
+
+        records = self.fixtures.get(endpoint, symbol, query.get('period', ['annual'])[0])
+        limit = query.get('limit', [None])[0]
+        if limit is not None and limit.isdigit():
+            records = records[:int(limit)]
+        return 200, records, {}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                if server.latency or server.jitter:
+                    time.sleep(server.latency + server.random.uniform(0, server.jitter))
+
+                url = urlparse(self.path)
+                status_code, body, headers = server.respond(url.path, parse_qs(url.query))
+                with server.lock:
+                    server.stats['status_codes'][status_code] += 1
+
+                content = json.dumps(body).encode()
+                self.send_response(status_code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(content)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                # Don't print a line for every request
+                pass
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in server for the Financial Modeling Prep API')
+    parser.add_argument('--pickle-dir', default='financial_data_pickle', help='pickle files to serve (recorded data)')
+    parser.add_argument('--screener-dir', help='pickle files of the screener (default: the pickle directory)')
+    parser.add_argument('--synthetic', type=int, help='serve synthetic data for this number of symbols instead')
+    parser.add_argument('--periods', type=int, default=N_PERIODS, help='number of periods of the synthetic data')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random seconds added to the latency')
+    parser.add_argument('--error-rate-429', type=float, default=0.0, help='fraction of the requests answered with 429')
+    parser.add_argument('--error-rate-5xx', type=float, default=0.0, help='fraction of the requests answered with 5xx')
+    parser.add_argument('--retry-after', type=int, help='seconds sent in the Retry-After header of the 429 responses')
+    parser.add_argument('--calls-per-minute', type=int, help='answer 429 above this number of calls per minute')
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        fixtures = Fixtures.from_synthetic(args.synthetic, args.periods, args.seed)
+    else:
+        fixtures = Fixtures.from_pickles(args.pickle_dir, args.screener_dir)
+
+    server = StandInServer(fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate_429,
+                           args.error_rate_5xx, args.retry_after, args.calls_per_minute, args.seed)
+    print(f'Serving the FMP API on {server.base_url} (set FMP_BASE_URL={server.base_url} to use it)')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f'Requests: {dict(server.stats["requests"])}, status codes: {dict(server.stats["status_codes"])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,148 +12,55 @@ to avoid the code to be messy, ovrcomplicated, and difficult to maintain (simpli
 """
 
 from secret import api_key #Create a "secret.py" file with your API Key and import it
-import requests
-import pandas as pd
-import os
+from fmp_fetcher import DEFAULT_BASE_URL, fetch_universe, period_dir
+from fmp_request import USAGE_FILE, RateLimiter
+from run_report import RunReport
 
-# Define the base URL for Financial Modeling Prep API
-base_url = 'https://financialmodelingprep.com/api/v3/'
+# Define the base URL for Financial Modeling Prep API (set the FMP_BASE_URL environment variable to fetch from
+# another server, e.g. the local stand-in server of fmp_server.py)
+base_url = DEFAULT_BASE_URL
 
 # Define the symbol for the selected tickers
 symbols_str = 'AMKR,FORM,RMBS,LSCC,MTSI,ALGM,WOLF,QRVO,IPGP,POWI,SYNA'
 symbols = symbols_str.split(',')
 
-# Define the directory to store pickle files
-pickle_dir = 'financial_data_pickle'
-os.makedirs(pickle_dir, exist_ok=True)
-
-for symbol in symbols:
-    # Create empty DataFrames for each financial statement
-    balance_sheet_df = pd.DataFrame()
-    income_statement_df = pd.DataFrame()
-    cash_flow_statement_df = pd.DataFrame()
-    company_profile_df = pd.DataFrame()
-    historical_market_cap_df = pd.DataFrame()
-
-    # Define the pickle file name for profile data
-    profile_pickle_filename = f'{pickle_dir}/{symbol}_profile_data.pkl'
-
-    try:
-        # Try to load the DataFrame from the pickle file
-        company_profile_df = pd.read_pickle(profile_pickle_filename)
-        print(f'Loaded profile data for {symbol} from {profile_pickle_filename}')
-
-    except FileNotFoundError:
-        # If the pickle file is not found, make the API request and save the DataFrame to a pickle file
-        limit=0 #this states the limit for the request below
-        if limit > 0:
-            url_info = f'{base_url}profile/{symbol}?limit={limit}&apikey={api_key}'
-            response_info = requests.get(url_info)
-
-            # Check if the request was successful (status code 200)
-            if response_info.status_code == 200:
-                # Parse the JSON response
-                profile_data = response_info.json()
-
-                # Create a DataFrame from the response data
-                company_profile_df = pd.DataFrame(profile_data)
-
-                # Save the DataFrame to a pickle file
-                company_profile_df.to_pickle(profile_pickle_filename)
-                print(f'Saved profile data for {symbol} to {profile_pickle_filename}')
-
-            else:
-                # Print an error message if the request was not successful
-                print(f'Error fetching profile data for {symbol}. Status code: {response_info.status_code}')
-
-        elif limit == 0:
-            print(f'Your limit for the requests on the company profile data is set to {limit}')
-
-        else:
-            print(f'Your limit for the API request for the company profile data is not specified or invalid. Limit: {limit}')
-
-    # Loop through each financial statement type
-    for statement_type in ['balance-sheet-statement', 'income-statement', 'cash-flow-statement']:
-        # Define the pickle file name for statement data
-        statement_pickle_filename = f'{pickle_dir}/{symbol}_{statement_type}_data.pkl'
-
-        try:
-            # Try to load the DataFrame from the pickle file
-            df = pd.read_pickle(statement_pickle_filename)
-            print(f'Loaded {statement_type} data for {symbol} from {statement_pickle_filename}')
-
-        except FileNotFoundError:
-            # If the pickle file is not found, make the API request and save the DataFrame to a pickle file
-            period = 'annual' #choose between 'annual' and 'quarter'
-            url_statement = f'{base_url}{statement_type}/{symbol}?period={period}&apikey={api_key}'
-            response_statement = requests.get(url_statement)
-
-            # Check if the request was successful (status code 200)
-            if response_statement.status_code == 200:
-                # Parse the JSON response
-                statement_data = response_statement.json()
-
-                # Create a DataFrame from the response data
-                df = pd.DataFrame(statement_data)
-
-                # Save the DataFrame to a pickle file
-                df.to_pickle(statement_pickle_filename)
-                print(f'Saved {statement_type} data for {symbol} to {statement_pickle_filename}')
-
-            else:
-                # Print an error message if the request was not successful
-                print(f'Error fetching {statement_type} data for {symbol}. Status code: {response_statement.status_code}')
-
-        # Store the DataFrame in the appropriate variable based on statement type
-        if statement_type == 'balance-sheet-statement':
-            balance_sheet_df = df
-        elif statement_type == 'income-statement':
-            income_statement_df = df
-        elif statement_type == 'cash-flow-statement':
-            cash_flow_statement_df = df
-
-        # Print the response structure for analysis
-        print(f'Response structure for {symbol} - {statement_type}: {df}')
-
-        # Get relevant dates from financial statements
-        #relevant_dates = df['date'].tolist()  # Change 'df' to the appropriate DataFrame
-
-        # Historical market capitalization data
-        market_cap_pickle_filename = f'{pickle_dir}/{symbol}_historical_market_cap_data.pkl'
-
-        try:
-            # Try to load the DataFrame from the pickle file
-            historical_market_cap_df = pd.read_pickle(market_cap_pickle_filename)
-            print(f'Loaded historical market cap data for {symbol} from {market_cap_pickle_filename}')
-
-        except FileNotFoundError:
-            # If the pickle file is not found, make the API request and save the DataFrame to a pickle file
-            # Modify the endpoint URL to include the relevant dates dynamically
-            limit = 0 #this states the limit for the request below
-            url_market_cap = f'{base_url}historical-market-capitalization/{symbol}?limit={limit}&apikey={api_key}'
-            response_market_cap = requests.get(url_market_cap)
-
-            if limit > 0: #start the process of retrieving data only if the limit is greater than 0 to avoid unnecessary API requests
-
-                # Check if the request was successful (status code 200)
-                if response_market_cap.status_code == 200:
-                    # Parse the JSON response
-                    market_cap_data = response_market_cap.json()
-
-                    # Create a DataFrame from the response data
-                    historical_market_cap_df = pd.DataFrame(market_cap_data)
-
-                    # Save the DataFrame to a pickle file
-                    historical_market_cap_df.to_pickle(market_cap_pickle_filename)
-                    print(f'Saved historical market cap data for {symbol} to {market_cap_pickle_filename}')
-
-                else:
-                    # Print an error message if the request was not successful
-                    print(
-                        f'Error fetching historical market cap data for {symbol}. Status code: {response_market_cap.status_code}')
-
-            elif limit == 0:
-                print(f'Your limit for the requests on the historical market capitalization data is set to {limit}')
-
-            else:
-                print(f'Your limit for the API request for the historical market capitalization data is not specified or invalid. Limit: {limit}')
+# Define the period of the financial statements
+period = 'annual' #choose between 'annual' and 'quarter'
+
+# Define the directory to store pickle files (the quarterly data is saved in financial_data_pickle_quarter)
+pickle_dir = period_dir('financial_data_pickle', period)
+
+# Define the limits for the company profile and historical market capitalization requests
+# The data is requested only if the limit is greater than 0 to avoid unnecessary API requests
+profile_limit = 0 #this states the limit for the company profile request
+market_cap_limit = 0 #this states the limit for the historical market capitalization request
+
+# Define the refresh mode: if True, the cached statements are updated with the periods filed since the latest one,
+# and the symbols whose next filing is not due yet are skipped. If False, the cached data is used as it is
+refresh = False
+
+# Define the dry-run mode: if True, only print how many API calls the run would cost, without making them
+dry_run = False
+
+# Define the number of concurrent requests (the connections are kept alive and shared between them)
+max_workers = 8
+
+# Define the API plan, to run the requests at the maximum throughput allowed without being throttled
+plan = 'free' #choose between 'free', 'starter', 'premium' and 'ultimate'
+limiter = RateLimiter.from_plan(plan, usage_file=USAGE_FILE)  #the daily budget is shared by both periods
+
+# Fetch the profile, the financial statements and the historical market capitalization for every symbol,
+# and save them to the pickle files used by the scoring scripts
+# The report of the run (time, memory, API calls made and avoided thanks to the pickle files) is saved as JSON
+with RunReport('fetch') as report:
+    results = fetch_universe(symbols, api_key, base_url=base_url, pickle_dir=pickle_dir, period=period,
+                             profile_limit=profile_limit, market_cap_limit=market_cap_limit, max_workers=max_workers,
+                             limiter=limiter, refresh=refresh, dry_run=dry_run)
+counters = report.save(f'{pickle_dir}/fetch_report.json')['counters']
+print(f'Made {counters["api"]["calls"]} API calls, avoided {counters["api"]["avoided"]} thanks to the pickle files')
+
+# Print a summary of the requests
+failed = [key for key, status_code in results.items() if status_code != 200]
+print(f'Made {len(results)} requests, {len(failed)} failed')
+for symbol, endpoint in failed:
+    print(f'Missing {endpoint} data for {symbol}')
@@ -0,0 +1,82 @@
+"""
+Store of the macroeconomic series used by the scoring models.
+
+The Ohlson O-Score scales the total assets by the GNP price level, which depends on the country of the company and on
+the year of the financial statement. The series are read from a local CSV file with one row per country and year
+(columns country, year and the value), and kept as one sorted array of (country, year) keys, so the value of every
+row of the panel is looked up in one vectorized searchsorted call instead of a Python loop over the symbols.
+
+The country of each symbol is taken from the profile data (see countries_from_profiles). The series only cover a few
+countries and years, so a lookup can fall back to the nearest year available for the country, or for the default
+country if the series has no value at all for the country.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Define the CSV file with the GNP of each country and year (shipped with the scripts)
+GNP_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'macro_data', 'gnp.csv')
+
+# Define the country used for the symbols without a country in the profile data, or whose country is not in the series
+DEFAULT_COUNTRY = 'GB'
+
+# The keys combine the country code and the year as country_code * YEAR_BASE + year
+YEAR_BASE = 10000
+
+
+class MacroSeries:
+    # Values of a macroeconomic series per country and year, with vectorized lookups by statement date
+
+    def __init__(self, countries, years, values):
+        self.countries = pd.Index(sorted(set(countries)))
+        keys = self.countries.get_indexer(countries).astype(np.int64) * YEAR_BASE + np.asarray(years, dtype=np.int64)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.values = np.asarray(values, dtype=np.float64)[order]
+
+    @classmethod
+    def from_csv(cls, path=GNP_FILE, value_column='gnp'):
+        df = pd.read_csv(path, dtype={'country': str})
+        return cls(df['country'].to_numpy(), df['year'].to_numpy(), df[value_column].to_numpy())
+
+    def lookup(self, countries, dates, default_country=None):
+        # Get the value for the country and the year of each date, with NaN where the value is not available
+        # If the default country is specified, the missing values are taken from the nearest year of the country,
+        # or of the default country if the country is not in the series
+        country_codes = self.countries.get_indexer(pd.Index(np.asarray(countries, dtype=object)))
+        years = pd.DatetimeIndex(dates).year.to_numpy(dtype=np.int64)
+        keys = country_codes.astype(np.int64) * YEAR_BASE + years
+
+        positions = np.searchsorted(self.keys, keys)
+        found = (country_codes >= 0) & (positions < len(self.keys))
+        found[found] = self.keys[positions[found]] == keys[found]
+
+        values = np.full(len(keys), np.nan)
+        values[found] = self.values[positions[found]]
+
+        if default_country is not None and default_country in self.countries and not found.all():
+            missing = ~found
+            codes = np.where(country_codes[missing] >= 0, country_codes[missing],
+                             self.countries.get_loc(default_country)).astype(np.int64)
+            values[missing] = self.values[self._nearest(codes, years[missing])]
+        return values
+
+    def _nearest(self, country_codes, years):
+        # Get the position of the nearest year of each country (the countries must be in the series)
+        start = np.searchsorted(self.keys, country_codes * YEAR_BASE)
+        end = np.searchsorted(self.keys, (country_codes + 1) * YEAR_BASE) - 1
+        after = np.clip(np.searchsorted(self.keys, country_codes * YEAR_BASE + years), start, end)
+        before = np.clip(after - 1, start, end)
+        target = country_codes * YEAR_BASE + years
+        return np.where(np.abs(self.keys[before] - target) <= np.abs(self.keys[after] - target), before, after)
+
+
+def countries_from_profiles(profile_data):
+    # Get the country of each symbol from the profile data (a dictionary of DataFrames keyed by symbol)
+    countries = {}
+    for symbol, df in profile_data.items():
+        if 'country' in df.columns and not df.empty and pd.notna(df['country'].iloc[0]):
+            countries[symbol] = str(df['country'].iloc[0])
+    return countries
@@ -0,0 +1,67 @@
+"""
+Daily historical market capitalization, for the market-value variant of the Altman Z-Score.
+
+The daily series of all the symbols are kept as three compact arrays sorted by symbol and date: the int64 keys
+(symbol code and day number), the int64 dates and the float64 market caps. The market cap at each statement date is
+found with an as-of join: one searchsorted call over the keys gives, for every row of the panel at once, the latest
+trading day on or before the statement date of the same symbol, without any loop over the symbols.
+"""
+
+import numpy as np
+import pandas as pd
+
+# The keys combine the symbol code and the day number as symbol_code * KEY_BASE + DAY_OFFSET + day
+# (the offset keeps the dates before 1970 positive, the base leaves room for about 1400 years after 1970)
+KEY_BASE = 1 << 20
+DAY_OFFSET = 1 << 19
+
+# Define how many days the latest trading day can be before the statement date (weekends and holidays)
+MAX_LAG_DAYS = 7
+
+
+def _days(dates):
+    # Convert the dates to day numbers since 1970-01-01
+    return pd.DatetimeIndex(dates).to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+
+class MarketCapSeries:
+    # Daily market cap of many symbols as sorted int64/float64 arrays, with a vectorized as-of lookup
+
+    def __init__(self, symbols, dates, values):
+        codes, self.symbols = pd.factorize(pd.Index(np.asarray(symbols, dtype=object)))
+        days = _days(dates)
+        values = np.asarray(values, dtype=np.float64)
+
+        # Sort by symbol and date, and drop the days without a market cap
+        keys = codes.astype(np.int64) * KEY_BASE + DAY_OFFSET + days
+        valid = ~np.isnan(values)
+        order = np.argsort(keys[valid], kind='stable')
+        self.keys = keys[valid][order]
+        self.dates = days[valid][order]
+        self.values = values[valid][order]
+
+    @classmethod
+    def from_frames(cls, market_cap_data):
+        # Build the series from a dictionary of DataFrames keyed by symbol, with 'date' and 'marketCap' columns
+        frames = [df[['date', 'marketCap']].assign(symbol=symbol) for symbol, df in market_cap_data.items()
+                  if not df.empty]
+        if not frames:
+            return cls([], pd.to_datetime([]), [])
+        df = pd.concat(frames, ignore_index=True)
+        return cls(df['symbol'].to_numpy(), pd.to_datetime(df['date']), df['marketCap'].to_numpy())
+
+    def asof(self, symbols, dates, max_lag_days=MAX_LAG_DAYS):
+        # Get the market cap of each symbol on the latest trading day on or before each date, NaN if there is none
+        # within max_lag_days
+        codes = self.symbols.get_indexer(pd.Index(np.asarray(symbols, dtype=object)))
+        days = _days(dates)
+        keys = codes.astype(np.int64) * KEY_BASE + DAY_OFFSET + days
+
+        positions = np.searchsorted(self.keys, keys, side='right') - 1
+        found = (codes >= 0) & (positions >= 0)
+        found[found] = (self.keys[positions[found]] // KEY_BASE == codes[found]) & \
+                       (days[found] - self.dates[positions[found]] <= max_lag_days)
+
+        values = np.full(len(keys), np.nan)
+        values[found] = self.values[positions[found]]
+        return values
@@ -0,0 +1,20 @@
+"""
+Convert the pickle files saved by get_financial_data_from_fmp.py to the columnar Parquet store (see columnar_store.py).
+Once the store exists, the scoring scripts read through it instead of opening one pickle file per symbol.
+Run this script again after fetching new data, so the store stays up to date with the pickle files.
+"""
+
+from columnar_store import migrate_pickles
+from fmp_fetcher import period_dir
+
+# Define the period of the financial statements to migrate
+period = 'annual' #choose between 'annual' and 'quarter'
+
+# Define the directory of the pickle files and the directory of the Parquet store
+pickle_dir = period_dir('financial_data_pickle', period)
+store_dir = period_dir('financial_data_parquet', period)
+
+# Define if the datasets should also be partitioned by year (useful when reading only a few years of a large universe)
+partition_by_year = False
+
+migrate_pickles(pickle_dir, store_dir, partition_by_year)
@@ -0,0 +1,424 @@
+"""
+Plots of the results of the scoring models.
+
+The plotting code of the scripts lives here, so the scripts and the command line (see finanalysis.py) draw the same
+charts. Matplotlib and Seaborn are imported by this module only, and the modules that don't always plot import it
+only when a plot is requested, so a run that only writes CSV files never loads the plotting libraries.
+
+Each function takes the results of a model (as returned by scoring_engine, sorted by Date/Period), saves the chart
+in the deliverables directory with the name (e.g. the symbols joined by underscores) in the file name and returns
+the path of the file. The chart is shown only if show is True and the backend is interactive, so the scripts
+don't block on a headless machine (e.g. with MPLBACKEND=Agg). The rows of each symbol are grouped once per chart.
+For the per-symbol and per-sector charts of a large universe, see plot_pipeline.py.
+"""
+
+import math
+import os
+
+import matplotlib
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+
+# Define the backends that can't display the figures, so the figures are saved and closed without calling show
+NON_INTERACTIVE_BACKENDS = ['agg', 'pdf', 'ps', 'svg', 'cairo', 'template']
+
+# Set Seaborn style
+sns.set(style="whitegrid")
+
+
+def interactive(show=True):
+    # Show the figures only if requested and if the backend can display them (not e.g. with MPLBACKEND=Agg)
+    return show and matplotlib.get_backend().lower() not in NON_INTERACTIVE_BACKENDS
+
+
+def _finish(plot_filename, show):
+    # Save the current figure, then show it or close it
+    plt.savefig(plot_filename)
+    if interactive(show):
+        plt.show()
+    else:
+        plt.close('all')
+    return plot_filename
+
+
+def split_by_symbol(df, symbols):
+    # Group the rows of each symbol once, instead of filtering the whole DataFrame for each symbol (and component)
+    groups = dict(tuple(df.groupby('Symbol', sort=False)))
+    return [(symbol, groups.get(symbol, df.iloc[:0])) for symbol in symbols]
+
+
+def plot_altman_zscore(zscore_df, symbols, name, industry='non_manufacturer', deliverables_dir='deliverables',
+                       show=True):
+    # Plotting the Altman Z-Score
+    os.makedirs(deliverables_dir, exist_ok=True)
+    plt.figure(figsize=(10, 6))
+
+    for symbol, symbol_data in split_by_symbol(zscore_df, symbols):
+        plt.plot(symbol_data['Date/Period'], symbol_data['Altman Z-Score'], label=symbol, marker='o', linestyle='-')
+
+        # Specify values for z1 and z2 based on the industry
+        if industry == 'manufacturers':
+            z1 = 2.99
+            z2 = 1.81
+        else:
+            z1 = 2.6
+            z2 = 1.1
+
+        # Add lines for z1 and z2 values based on the industry
+        plt.axhline(z1, color='g', linestyle='--', linewidth=2, label='_nolegend_')
+        plt.axhline(z2, color='r', linestyle='--', linewidth=2, label='_nolegend_')
+
+    plt.xlabel('Date/Period')
+    plt.ylabel('Altman Z-Score')
+    plt.title('Altman Z-Score for Different Companies Over Time')
+    plt.xticks(rotation=45, ha='right')  # Rotate x-axis labels by 45 degrees
+    plt.legend()
+    plt.tight_layout()
+
+    # Customize grid appearance
+    plt.grid(color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+
+    # Set y-axis ticks starting from -0.5 and increasing by 0.5
+    plt.yticks(np.arange(-0.5, plt.ylim()[1] + 0.5, 0.5))
+
+    # Draw stronger horizontal lines for integer y-axis ticks
+    for y_tick in np.arange(-0.5, plt.ylim()[1] + 0.5, 1.0):
+        plt.axhline(y_tick, color='gray', linestyle='--', linewidth=1)
+
+    # Adjust legend position to avoid overlapping with lines
+    plt.legend(loc='upper left')
+
+    # Save plot in the "deliverables" folder with the name in the file name
+    return _finish(os.path.join(deliverables_dir, f'Altman_Z_Score_{name}.png'), show)
+
+
+def plot_beneish_mscore(mscore_df, symbols, name, deliverables_dir='deliverables', show=True):
+    # Plot the results
+    os.makedirs(deliverables_dir, exist_ok=True)
+
+    # Replace infinite values with a large finite value
+    mscore_df = mscore_df.replace([np.inf, -np.inf], np.nan)
+
+    plt.figure(figsize=(10, 6))
+
+    for symbol, symbol_data in split_by_symbol(mscore_df, symbols):
+        plt.plot(symbol_data['Date/Period'], symbol_data['Beneish M-Score'], label=symbol, marker='o', linestyle='-')
+
+    plt.xlabel('Date/Period')
+    plt.ylabel('Beneish M-Score')
+    plt.title('Beneish M-Score for Different Companies Over Time')
+    plt.xticks(rotation=45, ha='right')  # Rotate x-axis labels by 45 degrees
+    plt.legend()
+    plt.tight_layout()
+
+    # Customize grid appearance
+    plt.grid(color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+
+    # Set y-axis ticks starting from the minimum score to the maximum score with a step of 1
+    min_beneish_score = mscore_df['Beneish M-Score'].min()
+    max_beneish_score = mscore_df['Beneish M-Score'].max()
+
+    # Round the min and max values to limit decimal places
+    min_beneish_score_rounded = round(min_beneish_score, 2)
+    max_beneish_score_rounded = round(max_beneish_score, 2)
+
+    # Check for finite values before setting yticks
+    if np.isfinite(min_beneish_score) and np.isfinite(max_beneish_score):
+        plt.yticks(np.arange(min_beneish_score_rounded, max_beneish_score_rounded + 1, 1))
+
+    # Draw stronger horizontal lines for integer y-axis ticks
+    for y_tick in np.arange(min_beneish_score, max_beneish_score + 1, 1.0):
+        plt.axhline(y_tick, color='gray', linestyle='--', linewidth=1)
+
+    # Add a red line at Y = -1.78
+    plt.axhline(y=-1.78, color='red', linestyle='--', linewidth=2, label='-1.78')
+    plt.axhline(y=0, color='yellow', linestyle='--', linewidth=2, label='0')
+
+    # Adjust legend position to avoid overlapping with lines
+    plt.legend(loc='upper left')
+
+    # Save plot in the "deliverables" folder with the name in the file name
+    return _finish(os.path.join(deliverables_dir, f'Beneish_M_Score_{name}.png'), show)
+
+
+def plot_ohlson_oscore(ohlscore_df, symbols, name, deliverables_dir='deliverables', show=True):
+    # Plotting the Ohlson O-Score
+    os.makedirs(deliverables_dir, exist_ok=True)
+    plt.figure(figsize=(10, 6))
+
+    for symbol, symbol_data in split_by_symbol(ohlscore_df, symbols):
+        plt.plot(symbol_data['Date/Period'], symbol_data['Ohlson O-Score'], label=symbol, marker='o', linestyle='-')
+
+    plt.xlabel('Date/Period')
+    plt.ylabel('Ohlson O-Score')
+    plt.title('Ohlson O-Score for Different Companies Over Time')
+    plt.xticks(rotation=45, ha='right')  # Rotate x-axis labels by 45 degrees
+    plt.legend()
+    plt.tight_layout()
+
+    # Customize grid appearance
+    plt.grid(color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+
+    # Set y-axis ticks starting from the minimum score to the maximum score with a step of 1
+    min_ohlson_score = ohlscore_df['Ohlson O-Score'].min()
+    max_ohlson_score = ohlscore_df['Ohlson O-Score'].max()
+    plt.yticks(np.arange(min_ohlson_score, max_ohlson_score + 1, 1))
+
+    # Draw stronger horizontal lines for integer y-axis ticks
+    for y_tick in np.arange(min_ohlson_score, max_ohlson_score + 1, 1.0):
+        plt.axhline(y_tick, color='gray', linestyle='--', linewidth=1)
+
+    # Adjust legend position to avoid overlapping with lines
+    plt.legend(loc='upper left')
+
+    # Add a red line at Y = 0.5
+    plt.axhline(y=0.5, color='red', linestyle='--', linewidth=2, label='Threshold (0.5)')
+
+    # Save plot in the "deliverables" folder with the name in the file name
+    return _finish(os.path.join(deliverables_dir, f'Ohlson_O_Score_{name}.png'), show)
+
+
+def plot_piotroski_fscore(fscore_df, components_df, symbols, name, deliverables_dir='deliverables', show=True):
+    #PLOTTING THE F-SCORE
+    os.makedirs(deliverables_dir, exist_ok=True)
+    plt.figure(figsize=(10, 6))
+
+    for symbol, symbol_data in split_by_symbol(fscore_df, symbols):
+        plt.plot(symbol_data['Date/Period'], symbol_data['Piotroski F-Score'], label=symbol, marker='o', linestyle='-')
+
+    plt.xlabel('Date/Period')
+    plt.ylabel('Piotroski F-Score')
+    plt.title('Piotroski F-Score for Different Companies Over Time')
+    plt.xticks(rotation=45, ha='right')  # Rotate x-axis labels by 45 degrees
+    plt.legend()
+    plt.tight_layout()
+
+    # Customize grid appearance
+    plt.grid(color='gray', linestyle='--', linewidth=0.5, alpha=0.5)
+
+    # Save plot in the "deliverables" folder with the name in the file name
+    plot_filenames = [_finish(os.path.join(deliverables_dir, f'Piotroski_F_Score_{name}.png'), show)]
+
+    #PLOTTING THE COMPONENTS
+    # Create a list of component names
+    component_names = ['Profitability', 'Operating Cash Flow Positive', 'Change in ROA',
+                       'Accruals', 'Change in Leverage', 'Change in Liquidity',
+                       'Equity Issues', 'Change in Gross Margin', 'Change in Asset Turnover']
+
+    # Create a grid of line charts for each component
+    fig, axes = plt.subplots(nrows=3, ncols=3, figsize=(15, 4), sharey=True, sharex=True)  # Reduced height
+
+    # Group the rows of each symbol once for all the components
+    symbol_groups = split_by_symbol(components_df, symbols)
+
+    for i, component in enumerate(component_names, 0):  # Start the index from 0
+        row, col = divmod(i, 3)
+        ax = axes[row, col]
+
+        for symbol, symbol_data in symbol_groups:
+            ax.plot(symbol_data['Date/Period'], symbol_data[component], label=symbol, marker='o', linestyle='-')
+
+        ax.set_title(f'{component} Over Time')
+        ax.set_xlabel('Date/Period')
+        ax.set_ylabel('')
+        ax.legend().set_visible(False)  # Hide legend in individual subplots
+
+        # Rotate x-axis labels
+        ax.tick_params(axis='x', rotation=60)
+
+    # Create a common legend outside the subplots
+    fig.legend(labels=symbols, loc='upper left', fancybox=True, shadow=True, ncol=len(symbols))
+
+    # Adjust the space between subplots, leave space on top for the common legend, and start a bit lower
+    plt.subplots_adjust(wspace=0.1, hspace=0.5, top=0.85, bottom=0.15)  # Adjust the bottom value
+
+    # Adjust layout to make room for the common legend
+    plt.tight_layout()
+
+    # Save plot in the "deliverables" folder with the name in the file name
+    plot_filenames.append(_finish(os.path.join(deliverables_dir, f'Piotroski_F_Score_Components_{name}.png'), show))
+    return plot_filenames
+
+
+def pie_values(df, labels):
+    # Sum each ratio of the DataFrame for the pie chart, dropping the ratios that can't be a wedge (infinite or NaN
+    # after a division by zero, or negative)
+    values = [df[label].to_numpy(dtype=float).sum() for label in labels]
+    kept = [(value, label) for value, label in zip(values, labels) if np.isfinite(value) and value >= 0]
+    return [value for value, _ in kept], [label for _, label in kept]
+
+
+def plot_dupont(dupont_results, symbols, name, deliverables_dir='deliverables', show=True):
+    # Plot the DuPont ratios of each symbol (the results have a 'Date' column)
+    os.makedirs(deliverables_dir, exist_ok=True)
+
+    # Split the results by company for plotting
+    dupont_data = {symbol: symbol_df.reset_index(drop=True)
+                   for symbol, symbol_df in dupont_results.groupby('Symbol', sort=False)}
+
+    labels_pie = ['Operating Profit Margin', 'Tax Burden', 'Interest Burden', 'Asset Turnover',
+                  'Financial Leverage Ratio']
+
+    # Check if there's only one symbol
+    if len(symbols) == 1:
+        plot_filenames = []
+
+        # Loop through symbols and plot individually
+        for symbol in symbols:
+            dupont_df = dupont_data[symbol]
+
+            # Plot Dupont components
+            plt.figure(figsize=(12, 6))
+            plt.plot(dupont_df['Date'], dupont_df['Net Profit Margin'], label='Net Profit Margin', marker='o')
+            plt.plot(dupont_df['Date'], dupont_df['Asset Turnover'], label='Asset Turnover', marker='x')
+            plt.plot(dupont_df['Date'], dupont_df['Financial Leverage Ratio'], label='Financial Leverage Ratio',
+                     marker='x')
+
+            plt.title(f'High Level Dupont Analysis for {symbol}')
+            plt.xlabel('Date')
+            plt.ylabel('Ratio')
+            plt.legend()
+
+            # Save plot in the "deliverables" folder with the name in the file name
+            plot_filenames.append(_finish(
+                os.path.join(deliverables_dir, f'High_Level_Dupont_Analysis_of_{name}.png'), show))
+
+            # Plot Dupont granular components
+            plt.figure(figsize=(12, 6))
+            plt.plot(dupont_df['Date'], dupont_df['Tax Burden'], label='Tax Burden', marker='o')
+            plt.plot(dupont_df['Date'], dupont_df['Interest Burden'], label='Interest Burden', marker='o')
+            plt.plot(dupont_df['Date'], dupont_df['Operating Profit Margin'], label='Operating Profit Margin',
+                     marker='o')
+            plt.plot(dupont_df['Date'], dupont_df['Asset Turnover'], label='Asset Turnover', marker='x')
+            plt.plot(dupont_df['Date'], dupont_df['Financial Leverage Ratio'], label='Financial Leverage Ratio',
+                     marker='x')
+
+            plt.title(f'Granular Dupont Analysis for {symbol}')
+            plt.xlabel('Date')
+            plt.ylabel('Ratio')
+            plt.legend()
+
+            # Save plot in the "deliverables" folder with the name in the file name
+            plot_filenames.append(_finish(
+                os.path.join(deliverables_dir, f'Granular_Dupont_Analysis_of_{name}.png'), show))
+
+            # Filter the DataFrame for the most recent year
+            most_recent_year = dupont_df['Date'].dt.year.max()
+            dupont_df_recent_year = dupont_df[dupont_df['Date'].dt.year == most_recent_year]
+
+            # Create a pie chart (skipped if none of the ratios can be a wedge)
+            values_pie, symbol_labels_pie = pie_values(dupont_df_recent_year, labels_pie)
+            if sum(values_pie) <= 0:
+                print(f'Skipping the Dupont pie chart of {symbol}: no finite positive ratio in {most_recent_year}')
+                continue
+
+            plt.figure(figsize=(8, 8))
+            plt.pie(values_pie, labels=symbol_labels_pie, autopct='%1.1f%%', startangle=90)
+            plt.title(f'Dupont Analysis for {symbol} - for year {most_recent_year}')
+
+            # Save plot in the "deliverables" folder with the name in the file name
+            plot_filenames.append(_finish(os.path.join(
+                deliverables_dir, f'Pie_Chart_Dupont_Analysis_of_{name}_for_year_{most_recent_year}.png'), show))
+
+        return plot_filenames
+
+    # Create subplots for multiple symbols
+    num_rows = math.ceil(len(symbols) / 2)
+    num_cols = 2
+
+    # Create subplots
+    fig_components, axes_components = plt.subplots(num_rows, num_cols, figsize=(15, 5 * num_rows))
+    fig_granular, axes_granular = plt.subplots(num_rows, num_cols, figsize=(15, 5 * num_rows))
+    fig_pie, axes_pie = plt.subplots(num_rows, num_cols, figsize=(15, 5 * num_rows))
+
+    # Flatten the axes for ease of indexing
+    axes_components = axes_components.flatten()
+    axes_granular = axes_granular.flatten()
+    axes_pie = axes_pie.flatten()
+
+    # Initialize handles and labels variables outside the loop
+    components_handles, components_labels = None, None
+    granular_handles, granular_labels = None, None
+    pie_handles, pie_labels = None, None
+
+    # Loop through symbols and plot on subplots
+    for i, symbol in enumerate(symbols):
+        dupont_df = dupont_data[symbol]
+
+        # Plot Dupont components
+        axes_components[i].plot(dupont_df['Date'], dupont_df['Net Profit Margin'], label='Net Profit Margin',
+                                marker='o')
+        axes_components[i].plot(dupont_df['Date'], dupont_df['Asset Turnover'], label='Asset Turnover', marker='x')
+        axes_components[i].plot(dupont_df['Date'], dupont_df['Financial Leverage Ratio'],
+                                label='Financial Leverage Ratio', marker='x')
+
+        axes_components[i].set_title(f'High-level Dupont for {symbol}')
+        axes_components[i].set_xlabel('Date')
+        axes_components[i].set_ylabel('Ratio')
+
+        # Plot Dupont granular components
+        axes_granular[i].plot(dupont_df['Date'], dupont_df['Tax Burden'], label='Tax Burden', marker='o')
+        axes_granular[i].plot(dupont_df['Date'], dupont_df['Interest Burden'], label='Interest Burden', marker='o')
+        axes_granular[i].plot(dupont_df['Date'], dupont_df['Operating Profit Margin'], label='Operating Profit Margin',
+                              marker='o')
+        axes_granular[i].plot(dupont_df['Date'], dupont_df['Asset Turnover'], label='Asset Turnover', marker='x')
+        axes_granular[i].plot(dupont_df['Date'], dupont_df['Financial Leverage Ratio'],
+                              label='Financial Leverage Ratio', marker='x')
+
+        axes_granular[i].set_title(f'Granular Dupont for {symbol}')
+        axes_granular[i].set_xlabel('Date')
+        axes_granular[i].set_ylabel('Ratio')
+
+        # Filter the DataFrame for the most recent year
+        most_recent_year = dupont_df['Date'].dt.year.max()
+        dupont_df_recent_year = dupont_df[dupont_df['Date'].dt.year == most_recent_year]
+
+        # Create a pie chart (left empty if none of the ratios can be a wedge)
+        values_pie, symbol_labels_pie = pie_values(dupont_df_recent_year, labels_pie)
+        if sum(values_pie) > 0:
+            axes_pie[i].pie(values_pie, labels=symbol_labels_pie, autopct='%1.1f%%', startangle=90)
+        else:
+            print(f'Skipping the Dupont pie chart of {symbol}: no finite positive ratio in {most_recent_year}')
+        axes_pie[i].set_title(f'Dupont Analysis for {symbol} - for year {most_recent_year}')
+
+        # Update handles and labels for pie chart legend
+        if pie_handles is None:
+            pie_handles, pie_labels = axes_pie[i].get_legend_handles_labels()
+        else:
+            pie_handles += axes_pie[i].get_legend_handles_labels()[0]
+
+        # Update handles and labels for legends
+        if components_handles is None:
+            components_handles, components_labels = axes_components[i].get_legend_handles_labels()
+            granular_handles, granular_labels = axes_granular[i].get_legend_handles_labels()
+        else:
+            components_handles += axes_components[i].get_legend_handles_labels()[0]
+            granular_handles += axes_granular[i].get_legend_handles_labels()[0]
+
+    # Create common legends outside the loop
+    fig_pie.legend(pie_handles, pie_labels, loc='lower right', bbox_to_anchor=(1, 0),
+                   fancybox=True, shadow=True, ncol=5)
+    fig_components.legend(components_handles, components_labels, loc='upper left', bbox_to_anchor=(0, 1),
+                          fancybox=True, shadow=True, ncol=5)
+    fig_granular.legend(granular_handles, granular_labels, loc='upper left', bbox_to_anchor=(0, 1),
+                        fancybox=True, shadow=True, ncol=5)
+
+    # Adjust layout for better spacing
+    plt.tight_layout(pad=5)
+
+    # Save the figures
+    plot_filenames = [
+        os.path.join(deliverables_dir, f'High_Level_Dupont_Analysis_of_{name}.png'),
+        os.path.join(deliverables_dir, f'Granular_Dupont_Analysis_of_{name}.png'),
+        os.path.join(deliverables_dir, f'Pie_Chart_Dupont_Analysis_of_{name}_for_year_{most_recent_year}.png'),
+    ]
+    for fig, plot_filename in zip([fig_components, fig_granular, fig_pie], plot_filenames):
+        fig.savefig(plot_filename)
+
+    # Show the figures
+    if interactive(show):
+        plt.show()
+    else:
+        plt.close('all')
+    return plot_filenames
@@ -0,0 +1,161 @@
+"""
+Sector-relative normalization cube of the model scores and DuPont ratios.
+
+The results of the models are gathered into one table of members, with one row per symbol and period, the sector
+and industry of the symbol (from the profile data) and the year. The cube holds the statistics of every metric for
+each (sector, industry, year) group: count, mean, standard deviation, median and quartiles. The members also keep
+their position relative to their peers (z-score, percentile and difference from the median of the group), computed
+with grouped transforms over the whole universe at once.
+
+The cube and the members are saved as Parquet files, so a symbol can be reported relative to its peers without
+recomputing the group statistics. When new results arrive, update() recomputes only the groups they touch.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from scoring_engine import DUPONT_RATIOS
+
+# Define the metrics of the cube, i.e. the score of each model and the DuPont ratios
+CUBE_METRICS = ['Altman Z-Score', 'Piotroski F-Score', 'Beneish M-Score', 'Ohlson O-Score'] + DUPONT_RATIOS
+
+# Define the columns of the groups of peers
+GROUP_KEYS = ['sector', 'industry', 'year']
+
+# Define the columns identifying a member of the cube
+MEMBER_KEYS = ['Symbol', 'Date/Period']
+
+# Define the label of the symbols without a sector or an industry in the profile data
+UNKNOWN_GROUP = 'Unknown'
+
+
+def results_panel(results, profile_data):
+    # Gather the results of the models (a dictionary of DataFrames keyed by model) into one row per symbol and period,
+    # with the sector, industry and year of each row
+    frames = []
+    for df in results.values():
+        metrics = [column for column in CUBE_METRICS if column in df.columns]
+        if metrics:
+            frames.append(df.set_index(MEMBER_KEYS)[metrics])
+    panel = pd.concat(frames, axis=1).reset_index() if frames else pd.DataFrame(columns=MEMBER_KEYS)
+
+    profiles = {symbol: df.iloc[0] for symbol, df in profile_data.items() if not df.empty}
+    for column in ['sector', 'industry']:
+        values = {symbol: profile.get(column) for symbol, profile in profiles.items()}
+        panel[column] = panel['Symbol'].map(values).fillna(UNKNOWN_GROUP).replace('', UNKNOWN_GROUP)
+    panel['year'] = pd.to_datetime(panel['Date/Period']).dt.year
+    return panel
+
+
+def group_statistics(members, metrics):
+    # Calculate the statistics of each metric for each group of peers
+    grouped = members.groupby(GROUP_KEYS, sort=True)[metrics]
+    statistics = {
+        'count': grouped.count(),
+        'mean': grouped.mean(),
+        'std': grouped.std(),
+        'median': grouped.median(),
+        'p25': grouped.quantile(0.25),
+        'p75': grouped.quantile(0.75),
+    }
+    cube = pd.concat(statistics, axis=1).swaplevel(axis=1)
+    return cube[[(metric, statistic) for metric in metrics for statistic in statistics]]
+
+
+def relative_positions(members, metrics):
+    # Calculate the position of each member relative to its peers, with grouped transforms
+    grouped = members.groupby(GROUP_KEYS, sort=False)[metrics]
+    mean, std, median = grouped.transform('mean'), grouped.transform('std'), grouped.transform('median')
+    percentile = grouped.rank(pct=True)
+
+    positions = members.copy()
+    for metric in metrics:
+        positions[f'{metric} z-score'] = (members[metric] - mean[metric]) / std[metric].replace(0, np.nan)
+        positions[f'{metric} percentile'] = percentile[metric]
+        positions[f'{metric} vs median'] = members[metric] - median[metric]
+    return positions
+
+
+class PeerCube:
+    # The group statistics (cube) and the members with their positions relative to their peers
+
+    def __init__(self, cube, members, metrics):
+        self.cube = cube
+        self.members = members
+        self.metrics = metrics
+
+    @classmethod
+    def build(cls, panel, metrics=None):
+        # Build the cube from a results panel (see results_panel)
+        metrics = [metric for metric in (metrics or CUBE_METRICS) if metric in panel.columns]
+        members = panel[MEMBER_KEYS + GROUP_KEYS + metrics]
+        return cls(group_statistics(members, metrics), relative_positions(members, metrics), metrics)
+
+    def update(self, panel):
+        # Add or replace the members of the panel, and recompute only the groups of peers they touch
+        # (the groups of the new rows, and the groups of the rows they replace, e.g. after a change of sector)
+        # The metrics that are not in the panel (e.g. the models that were not scored) keep the values of the members
+        # they replace, and are missing for the new rows
+        # The metrics of a model scored after the cube was built are added to the cube, missing for the existing
+        # members, and the statistics of every group are recomputed
+        added = [metric for metric in CUBE_METRICS if metric in panel.columns and metric not in self.metrics]
+        if added:
+            self.metrics = self.metrics + added
+            self.members = self.members.assign(**{metric: np.nan for metric in added})
+
+        new_members = panel.reindex(columns=MEMBER_KEYS + GROUP_KEYS + self.metrics)
+        member_index = pd.MultiIndex.from_frame(self.members[MEMBER_KEYS])
+        new_index = pd.MultiIndex.from_frame(new_members[MEMBER_KEYS])
+        replaced = member_index.isin(new_index)
+
+        kept_metrics = [metric for metric in self.metrics if metric not in panel.columns]
+        if kept_metrics:
+            previous = self.members[kept_metrics].set_axis(member_index).reindex(new_index)
+            new_members[kept_metrics] = previous.to_numpy()
+
+        affected = pd.MultiIndex.from_frame(pd.concat([new_members[GROUP_KEYS],
+                                                       self.members.loc[replaced, GROUP_KEYS]])).unique()
+        kept = self.members[~replaced]
+        if added:
+            affected = affected.union(pd.MultiIndex.from_frame(kept[GROUP_KEYS]).unique())
+        in_affected = pd.MultiIndex.from_frame(kept[GROUP_KEYS]).isin(affected)
+
+        # Recompute the statistics and the relative positions of the affected groups only
+        group_members = pd.concat([kept.loc[in_affected, MEMBER_KEYS + GROUP_KEYS + self.metrics], new_members],
+                                  ignore_index=True)
+        group_cube = group_statistics(group_members, self.metrics)
+
+        self.cube = pd.concat([self.cube[~self.cube.index.isin(affected)], group_cube]).sort_index()
+        self.members = pd.concat([kept[~in_affected], relative_positions(group_members, self.metrics)],
+                                 ignore_index=True)
+        return affected
+
+    def relative(self, symbols=None, year=None):
+        # Get the positions of the symbols relative to their peers, looked up from the saved members
+        selected = np.ones(len(self.members), dtype=bool)
+        if symbols is not None:
+            selected &= self.members['Symbol'].isin(symbols).to_numpy()
+        if year is not None:
+            selected &= (self.members['year'] == year).to_numpy()
+        return self.members[selected].sort_values(MEMBER_KEYS, ignore_index=True)
+
+    def save(self, cube_dir):
+        os.makedirs(cube_dir, exist_ok=True)
+        cube = self.cube.copy()
+        cube.columns = [f'{metric}|{statistic}' for metric, statistic in cube.columns]
+        cube.reset_index().to_parquet(os.path.join(cube_dir, 'cube.parquet'), index=False)
+        self.members.to_parquet(os.path.join(cube_dir, 'members.parquet'), index=False)
+
+    @classmethod
+    def load(cls, cube_dir):
+        cube = pd.read_parquet(os.path.join(cube_dir, 'cube.parquet')).set_index(GROUP_KEYS)
+        cube.columns = pd.MultiIndex.from_tuples([tuple(column.split('|')) for column in cube.columns])
+        members = pd.read_parquet(os.path.join(cube_dir, 'members.parquet'))
+        metrics = list(dict.fromkeys(metric for metric, _ in cube.columns))
+        return cls(cube, members, metrics)
+
+    @classmethod
+    def exists(cls, cube_dir):
+        return os.path.isfile(os.path.join(cube_dir, 'cube.parquet'))
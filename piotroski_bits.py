@@ -0,0 +1,134 @@
+"""
+Bit-packed history of the Piotroski F-Score components, with a query API for screens.
+
+Each of the nine 0/1 components is a bit of a uint16 mask, so a (symbol, period) takes 2 bytes for the components
+(plus an int32 symbol code and an int64 date) instead of nine int64 columns. The F-Score is the number of bits set,
+found with a lookup table. The screens are evaluated with bitwise operations on the whole history at once, e.g.
+
+    history = PiotroskiHistory.from_results(piotroski_fscore(panel))
+    history.query(passed=['accruals', 'leverage'], year=2023, min_score=7)
+
+returns all the firms that passed the accruals and leverage components in 2023 with an F-Score of 7 or more.
+"""
+
+import numpy as np
+import pandas as pd
+
+from scoring_engine import PIOTROSKI_COMPONENTS
+
+# Define the bit of each component, in the order of PIOTROSKI_COMPONENTS
+COMPONENT_BITS = {name: np.uint16(1 << i) for i, name in enumerate(PIOTROSKI_COMPONENTS)}
+
+# Define short names for the components, to write the queries
+COMPONENT_ALIASES = {
+    'profitability': 'Profitability',
+    'cash_flow': 'Operating Cash Flow Positive',
+    'roa': 'Change in ROA',
+    'accruals': 'Accruals',
+    'leverage': 'Change in Leverage',
+    'liquidity': 'Change in Liquidity',
+    'equity': 'Equity Issues',
+    'gross_margin': 'Change in Gross Margin',
+    'asset_turnover': 'Change in Asset Turnover',
+}
+
+# Number of bits set in each possible mask, i.e. the F-Score of each mask
+SCORES = np.array([bin(mask).count('1') for mask in range(1 << len(PIOTROSKI_COMPONENTS))], dtype=np.uint8)
+
+
+def component_mask(names):
+    # Combine the bits of the components, given by their full or short names
+    mask = np.uint16(0)
+    for name in names:
+        name = COMPONENT_ALIASES.get(name, name)
+        if name not in COMPONENT_BITS:
+            raise KeyError(f'Unknown Piotroski component: {name}')
+        mask |= COMPONENT_BITS[name]
+    return mask
+
+
+def pack_components(components):
+    # Pack the 0/1 components (a DataFrame or a dictionary of arrays keyed by component name) into uint16 masks
+    masks = np.zeros(len(components[PIOTROSKI_COMPONENTS[0]]), dtype=np.uint16)
+    for name, bit in COMPONENT_BITS.items():
+        masks |= np.where(np.asarray(components[name]) > 0, bit, np.uint16(0)).astype(np.uint16)
+    return masks
+
+
+class PiotroskiHistory:
+    # The component masks of all the symbols and periods, as compact NumPy arrays
+
+    def __init__(self, symbols, symbol_codes, dates, masks):
+        self.symbols = pd.Index(symbols, dtype=object)
+        self.symbol_codes = np.asarray(symbol_codes, dtype=np.int32)
+        self.dates = np.asarray(dates, dtype='datetime64[ns]')
+        self.masks = np.asarray(masks, dtype=np.uint16)
+
+    @classmethod
+    def from_results(cls, fscore_results):
+        # Build the history from the results of piotroski_fscore (Symbol, Date/Period and the components)
+        symbol_codes, symbols = pd.factorize(fscore_results['Symbol'])
+        return cls(symbols, symbol_codes, pd.to_datetime(fscore_results['Date/Period']).values,
+                   pack_components(fscore_results))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data['symbols'].astype(object), data['symbol_codes'], data['dates'], data['masks'])
+
+    def save(self, path):
+        np.savez_compressed(path, symbols=self.symbols.to_numpy(dtype=str), symbol_codes=self.symbol_codes,
+                            dates=self.dates, masks=self.masks)
+
+    @property
+    def nbytes(self):
+        return self.symbol_codes.nbytes + self.dates.nbytes + self.masks.nbytes
+
+    @property
+    def scores(self):
+        return SCORES[self.masks]
+
+    def select(self, passed=(), failed=(), year=None, min_score=None, max_score=None, symbols=None):
+        # Flag the rows that passed all the components in passed, failed all the components in failed,
+        # and match the year, the F-Score range and the symbols, if specified
+        selected = np.ones(len(self.masks), dtype=bool)
+
+        passed_mask = component_mask(passed)
+        if passed_mask:
+            selected &= (self.masks & passed_mask) == passed_mask
+        failed_mask = component_mask(failed)
+        if failed_mask:
+            selected &= (self.masks & failed_mask) == 0
+
+        if year is not None:
+            selected &= self.dates.astype('datetime64[Y]').astype(np.int64) + 1970 == year
+        if min_score is not None or max_score is not None:
+            scores = self.scores
+            if min_score is not None:
+                selected &= scores >= min_score
+            if max_score is not None:
+                selected &= scores <= max_score
+        if symbols is not None:
+            selected &= np.isin(self.symbol_codes, self.symbols.get_indexer(list(symbols)))
+
+        return selected
+
+    def query(self, passed=(), failed=(), year=None, min_score=None, max_score=None, symbols=None):
+        # Get the symbols, periods and F-Scores of the rows selected by the conditions (see select)
+        selected = self.select(passed, failed, year, min_score, max_score, symbols)
+        return pd.DataFrame({
+            'Symbol': self.symbols.to_numpy()[self.symbol_codes[selected]],
+            'Date/Period': self.dates[selected],
+            'Piotroski F-Score': self.scores[selected],
+        })
+
+    def components(self, selected=None):
+        # Unpack the masks into one 0/1 column per component (for the selected rows, if specified)
+        masks = self.masks if selected is None else self.masks[selected]
+        symbol_codes = self.symbol_codes if selected is None else self.symbol_codes[selected]
+        dates = self.dates if selected is None else self.dates[selected]
+
+        df = pd.DataFrame({'Symbol': self.symbols.to_numpy()[symbol_codes], 'Date/Period': dates})
+        for name, bit in COMPONENT_BITS.items():
+            df[name] = ((masks & bit) != 0).astype(np.int8)
+        return df
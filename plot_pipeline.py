@@ -0,0 +1,237 @@
+"""
+Headless rendering of the per-symbol and per-sector charts of a large universe.
+
+The charts of the scripts (see model_plots.py) draw every symbol on one figure and show it, which doesn't scale to
+thousands of symbols. This pipeline renders instead:
+
+- one chart per symbol, with one panel per model (the score over time and the thresholds of the zones)
+- one chart per sector, with one panel per model (the median score of the sector over the years and the band
+  between the first and the third quartile)
+
+The results are grouped once: each model is sorted by symbol and date and cut into one slice of NumPy arrays per
+symbol, and the sector quartiles are computed with one grouped operation per model. The charts are drawn on figures
+of the Agg backend (no display, no pyplot state and no show), and each worker process creates its figure once and
+reuses it for every chart, updating only the data of its lines. The symbols are split into tasks of a few hundred
+symbols, rendered by a process pool, so each task sends only its arrays to the worker.
+
+Example:
+    render_charts(score_universe(statement_data, symbols), 'deliverables/charts', sectors, workers=8)
+"""
+
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib import style
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import FormatStrFormatter, MaxNLocator
+
+from result_store import UNKNOWN_SECTOR
+from run_report import stage
+from scoring_engine import ALTMAN_INDUSTRY_COEFFICIENTS, BENEISH_THRESHOLD, OHLSON_THRESHOLD
+
+# Define the columns drawn for each model (the sector charts draw only the first one)
+CHART_COLUMNS = {
+    'altman': ['Altman Z-Score'],
+    'piotroski': ['Piotroski F-Score'],
+    'beneish': ['Beneish M-Score'],
+    'ohlson': ['Ohlson O-Score'],
+    'dupont': ['Net Profit Margin', 'Asset Turnover', 'Financial Leverage Ratio'],
+}
+
+# Define the Matplotlib style of the charts (the Seaborn whitegrid style of the scripts, without importing Seaborn)
+CHART_STYLE = 'seaborn-v0_8-whitegrid'
+
+# Define the number of symbols rendered by each task of the process pool
+SYMBOLS_PER_TASK = 250
+
+# The figures of the worker process, created once per layout and reused for every chart
+_figures = {}
+
+
+def chart_thresholds(industry='non_manufacturer'):
+    # Get the thresholds of the zones drawn on the chart of each model
+    coefficients = ALTMAN_INDUSTRY_COEFFICIENTS.get(industry, ALTMAN_INDUSTRY_COEFFICIENTS.get('non_manufacturer'))
+    return {'altman': [coefficients['z1'], coefficients['z2']], 'beneish': [BENEISH_THRESHOLD],
+            'ohlson': [OHLSON_THRESHOLD]}
+
+
+def file_name(name):
+    # Replace the characters that are not allowed in file names (e.g. the / of BRK/B or the spaces of the sectors)
+    return re.sub(r'[^\w.-]+', '_', str(name))
+
+
+def symbol_series(results):
+    # Group the results once: get the dates and the values of each model for each symbol, as slices of NumPy arrays
+    series = {}
+    for model, df in results.items():
+        columns = [column for column in CHART_COLUMNS.get(model, []) if column in df.columns]
+        if not columns or df.empty:
+            continue
+
+        df = df.sort_values(['Symbol', 'Date/Period'], kind='stable')
+        symbols = df['Symbol'].to_numpy(dtype=object)
+        dates = df['Date/Period'].to_numpy(dtype='datetime64[D]')
+        values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        values = np.where(np.isinf(values), np.nan, values)  # A division by zero is not drawn
+
+        # The rows of each symbol are contiguous, so each symbol is a slice between two boundaries
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+        stops = np.r_[starts[1:], len(symbols)]
+        for start, stop in zip(starts, stops):
+            series.setdefault(symbols[start], {})[model] = (dates[start:stop], values[start:stop])
+    return series
+
+
+def sector_series(results, sectors):
+    # Calculate the quartiles of the first column of each model for each sector and year, with one grouped operation
+    series = {}
+    for model, df in results.items():
+        columns = [column for column in CHART_COLUMNS.get(model, []) if column in df.columns]
+        if not columns or df.empty:
+            continue
+
+        values = pd.DataFrame({
+            'sector': df['Symbol'].map(sectors).fillna(UNKNOWN_SECTOR).to_numpy(dtype=object),
+            'year': pd.to_datetime(df['Date/Period']).dt.year.to_numpy(),
+            'value': df[columns[0]].replace([np.inf, -np.inf], np.nan).to_numpy(dtype=np.float64, na_value=np.nan),
+        })
+        quartiles = values.groupby(['sector', 'year'], sort=True)['value'].quantile([0.25, 0.5, 0.75]).unstack()
+
+        for sector, sector_quartiles in quartiles.groupby(level='sector', sort=False):
+            series.setdefault(sector, {})[model] = (sector_quartiles.index.get_level_values('year').to_numpy(),
+                                                    sector_quartiles.to_numpy(dtype=np.float64))
+    return series
+
+
+def period_years(dates):
+    # Convert the period end dates to years drawn as numbers, which are faster than dates (no date locator and
+    # formatter): a period ending in December is drawn at its year, as in the sector charts, and the other quarters
+    # at the fraction of the year before
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    return 1970 + (months + 1) / 12 - 1
+
+
+class ChartFigure:
+    # A figure with one panel per model. The axes, the lines, the thresholds and the legends are created once, and each
+    # chart only updates the data of the lines in place, so the ticks and the text are not rebuilt for every chart
+
+    def __init__(self, models, thresholds, kind='symbol'):
+        with style.context(CHART_STYLE):
+            self.fig = Figure(figsize=(10, 2.6 * len(models)))
+            FigureCanvasAgg(self.fig)
+            self.axes = self.fig.subplots(len(models), 1, squeeze=False)[:, 0]
+            self.fig.subplots_adjust(left=0.08, right=0.97, top=1 - 0.35 / len(models), bottom=0.25 / len(models),
+                                     hspace=0.6)
+
+            self.lines = []
+            for ax, model in zip(self.axes, models):
+                labels = CHART_COLUMNS[model] if kind == 'symbol' else ['Median']
+                self.lines.append([ax.plot([], [], marker='o', linestyle='-', label=label)[0] for label in labels])
+                for threshold in thresholds.get(model, []):
+                    ax.axhline(threshold, color='r', linestyle='--', linewidth=1.5)
+                ax.set_title(CHART_COLUMNS[model][0] if kind == 'sector' or len(labels) == 1 else 'DuPont Analysis')
+                ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+                ax.xaxis.set_major_formatter(FormatStrFormatter('%d'))
+                if len(labels) > 1 or kind == 'sector':
+                    ax.legend(loc='upper left', fontsize='small')
+
+            self.bands = [None] * len(models)
+            self.title = self.fig.suptitle('')
+
+    def render(self, filename, title, panels):
+        # Draw the panels (for each model, the x values, the y values of each line and the band, or None if the model
+        # has no data) and save the chart
+        self.title.set_text(title)
+        for i, (ax, lines, panel) in enumerate(zip(self.axes, self.lines, panels)):
+            x, ys, band = panel if panel is not None else (np.empty(0), [np.empty(0)] * len(lines), None)
+            for line, y in zip(lines, ys):
+                line.set_data(x, y)
+
+            if self.bands[i] is not None:
+                self.bands[i].remove()
+                self.bands[i] = None
+            if band is not None:
+                self.bands[i] = ax.fill_between(x, band[0], band[1], alpha=0.3, color=lines[0].get_color())
+
+            ax.relim()
+            ax.autoscale_view()
+        self.fig.savefig(filename)
+
+
+def _figure(kind, models, thresholds):
+    # Get the figure of this worker process for the kind of chart and the models, created the first time only
+    key = (kind, tuple(models), tuple((model, tuple(values)) for model, values in sorted(thresholds.items())))
+    if key not in _figures:
+        _figures[key] = ChartFigure(models, thresholds, kind)
+    return _figures[key]
+
+
+def render_symbols(task, models, thresholds, output_dir):
+    # Render the chart of each symbol of a task (this runs in a worker process)
+    figure = _figure('symbol', models, thresholds)
+    for symbol, symbol_data in task:
+        panels = []
+        for model in models:
+            if model in symbol_data:
+                dates, values = symbol_data[model]
+                panels.append((period_years(dates), list(values.T), None))
+            else:
+                panels.append(None)
+        figure.render(os.path.join(output_dir, f'{file_name(symbol)}.png'), f'{symbol}', panels)
+    return len(task)
+
+
+def render_sectors(task, models, thresholds, output_dir):
+    # Render the chart of each sector of a task (this runs in a worker process): the median and the band between the
+    # first and the third quartile
+    figure = _figure('sector', models, thresholds)
+    for sector, sector_data in task:
+        panels = []
+        for model in models:
+            if model in sector_data:
+                years, quartiles = sector_data[model]
+                panels.append((years, [quartiles[:, 1]], (quartiles[:, 0], quartiles[:, 2])))
+            else:
+                panels.append(None)
+        figure.render(os.path.join(output_dir, f'{file_name(sector)}.png'), f'{sector}', panels)
+    return len(task)
+
+
+@stage('render')
+def render_charts(results, output_dir='deliverables/charts', sectors=None, workers=1,
+                  symbols_per_task=SYMBOLS_PER_TASK, industry='non_manufacturer'):
+    # Render the chart of each symbol in output_dir/symbols, and of each sector in output_dir/sectors
+    # (only if the sectors are specified, as a dictionary mapping each symbol to its sector)
+    models = [model for model in CHART_COLUMNS if model in results]
+    thresholds = chart_thresholds(industry)
+
+    tasks = []
+    series = list(symbol_series(results).items())
+    symbol_dir = os.path.join(output_dir, 'symbols')
+    os.makedirs(symbol_dir, exist_ok=True)
+    for start in range(0, len(series), symbols_per_task):
+        tasks.append((render_symbols, series[start:start + symbols_per_task], symbol_dir))
+
+    if sectors is not None:
+        sector_dir = os.path.join(output_dir, 'sectors')
+        os.makedirs(sector_dir, exist_ok=True)
+        sector_items = list(sector_series(results, sectors).items())
+        # There are few sectors, so each one is a task
+        tasks += [(render_sectors, [item], sector_dir) for item in sector_items]
+
+    counts = {render_symbols: 0, render_sectors: 0}
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [(function, executor.submit(function, task, models, thresholds, directory))
+                       for function, task, directory in tasks]
+            for function, future in futures:
+                counts[function] += future.result()
+    else:
+        for function, task, directory in tasks:
+            counts[function] += function(task, models, thresholds, directory)
+
+    return {'symbols': counts[render_symbols], 'sectors': counts[render_sectors]}
@@ -0,0 +1,200 @@
+"""
+Parquet store of the results of the models (the deliverables), keyed by run.
+
+Each run gets an ID (the start time and a random suffix, e.g. 20240131T020000-1a2b3c4d), and the results of each
+model are written as one Parquet file of a dataset partitioned by model and run date:
+
+    deliverables/results/model=altman/run_date=2024-01-31/20240131T020000-1a2b3c4d.parquet
+
+The rows have the run_id and the sector of the symbol, and they are sorted by sector and symbol, so a reader
+can load one model (one directory), one run date (one partition), one run (one file) or one sector (the row group
+statistics let the reader skip the other sectors) without reading the rest of the results. Each run also writes a
+JSON manifest in deliverables/results/manifests with the models, the files, the number of rows and the options of
+the run, so the files don't need the list of symbols in their names.
+
+CSV files are still available through write_csv, which writes a DataFrame (or the batches of a Parquet file, see
+export_csv) in chunks of rows, so a large result is never converted to text all at once. deliverable_name gives a
+file name for a list of symbols that stays short whatever the number of symbols.
+"""
+
+import hashlib
+import json
+import os
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from run_report import stage
+
+# Define the directory of the results
+RESULTS_DIR = os.path.join('deliverables', 'results')
+
+# Define the directory of the manifests of the runs, in the results directory
+MANIFEST_DIR = 'manifests'
+
+# Define the directory of the reports of the runs (timings, memory and counters), in the results directory
+REPORT_DIR = 'reports'
+
+# Define the label of the symbols without a sector in the profile data
+UNKNOWN_SECTOR = 'Unknown'
+
+# Define the number of rows of each row group of the Parquet files, and of each chunk written to the CSV files
+ROW_GROUP_SIZE = 100_000
+CSV_CHUNK_ROWS = 100_000
+
+# Define the maximum length of the symbols in a file name, longer lists are replaced by their number and a hash
+MAX_NAME_LENGTH = 100
+
+
+def sectors_from_profiles(profile_data):
+    # Get the sector of each symbol from the profile data (a dictionary of DataFrames keyed by symbol)
+    sectors = {}
+    for symbol, df in profile_data.items():
+        if 'sector' in df.columns and not df.empty and pd.notna(df['sector'].iloc[0]) and df['sector'].iloc[0]:
+            sectors[symbol] = str(df['sector'].iloc[0])
+    return sectors
+
+
+def deliverable_name(symbols, separator='_'):
+    # Name a deliverable after its symbols, e.g. CRM_ORCL_GOOGL_MSFT, or 2500_symbols_1a2b3c4d for a long list
+    name = separator.join(symbols)
+    if len(name) <= MAX_NAME_LENGTH:
+        return name
+    return f'{len(symbols)}_symbols_{symbols_hash(symbols)}'
+
+
+def symbols_hash(symbols):
+    # Hash the list of symbols, to identify a universe without listing it
+    return hashlib.sha1(','.join(sorted(symbols)).encode()).hexdigest()[:8]
+
+
+def new_run_id(now=None):
+    # Create the ID of a run from its start time, with a random suffix so two runs started together are distinct
+    now = now or datetime.now()
+    return f'{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}'
+
+
+def run_date(run_id):
+    # Get the date of a run (YYYY-MM-DD) from its ID
+    return f'{run_id[:4]}-{run_id[4:6]}-{run_id[6:8]}'
+
+
+def model_path(model, run_id, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, f'model={model}', f'run_date={run_date(run_id)}', f'{run_id}.parquet')
+
+
+def manifest_path(run_id, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, MANIFEST_DIR, f'{run_id}.json')
+
+
+def report_path(run_id, results_dir=RESULTS_DIR):
+    return os.path.join(results_dir, REPORT_DIR, f'{run_id}.json')
+
+
+@stage('export')
+def write_results(results, results_dir=RESULTS_DIR, run_id=None, sectors=None, metadata=None):
+    # Write the results of a run (a dictionary of DataFrames keyed by model) and its manifest, and return the manifest
+    # The sectors map each symbol to its sector (see sectors_from_profiles), the metadata are saved in the manifest
+    run_id = run_id or new_run_id()
+    manifest = {
+        'run_id': run_id,
+        'run_date': run_date(run_id),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'metadata': metadata or {},
+        'models': {},
+    }
+
+    for model, df in results.items():
+        df = df.assign(
+            Sector=df['Symbol'].map(sectors or {}).fillna(UNKNOWN_SECTOR).astype(str),
+            run_id=run_id,
+        )
+        df = df.sort_values(['Sector', 'Symbol', 'Date/Period'], kind='stable', ignore_index=True)
+
+        path = model_path(model, run_id, results_dir)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        df.to_parquet(path, engine='pyarrow', index=False, row_group_size=ROW_GROUP_SIZE)
+
+        manifest['models'][model] = {
+            'path': os.path.relpath(path, results_dir),
+            'rows': len(df),
+            'symbols': int(df['Symbol'].nunique()),
+            'columns': list(df.columns),
+        }
+
+    path = manifest_path(run_id, results_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    return manifest
+
+
+def list_runs(results_dir=RESULTS_DIR):
+    # Get the IDs of the runs with a manifest, from the oldest to the most recent
+    directory = os.path.join(results_dir, MANIFEST_DIR)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(filename[:-len('.json')] for filename in os.listdir(directory) if filename.endswith('.json'))
+
+
+def read_manifest(run_id=None, results_dir=RESULTS_DIR):
+    # Read the manifest of a run (the most recent run if the ID is not specified)
+    if run_id is None:
+        runs = list_runs(results_dir)
+        if not runs:
+            raise FileNotFoundError(f'No runs found in {results_dir}')
+        run_id = runs[-1]
+    with open(manifest_path(run_id, results_dir)) as f:
+        return json.load(f)
+
+
+def read_results(model, run_id=None, results_dir=RESULTS_DIR, sectors=None, symbols=None, columns=None,
+                 all_runs=False):
+    # Read the results of a model for one run (the most recent run if the ID is not specified), or for all the runs
+    # Only the requested sectors, symbols and columns are read
+    filters = []
+    if sectors is not None:
+        filters.append(('Sector', 'in', list(sectors)))
+    if symbols is not None:
+        filters.append(('Symbol', 'in', list(symbols)))
+
+    if all_runs:
+        path = os.path.join(results_dir, f'model={model}')
+    else:
+        manifest = read_manifest(run_id, results_dir)
+        if model not in manifest['models']:
+            raise KeyError(f'No {model} results in run {manifest["run_id"]}')
+        path = os.path.join(results_dir, manifest['models'][model]['path'])
+
+    df = pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters or None)
+    return df.drop(columns='run_date', errors='ignore') if columns is None or 'run_date' not in columns else df
+
+
+@stage('export')
+def write_csv(data, filename, index=False, chunk_rows=CSV_CHUNK_ROWS):
+    # Write a DataFrame, or an iterable of DataFrames, to a CSV file in chunks of rows (the header is written once)
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+
+    header = True
+    with open(filename, 'w', newline='') as f:
+        for df in frames:
+            for start in range(0, len(df), chunk_rows):
+                df.iloc[start:start + chunk_rows].to_csv(f, index=index, header=header)
+                header = False
+            if header and df.columns.size:
+                # Write the header of an empty DataFrame
+                df.to_csv(f, index=index, header=True)
+                header = False
+    return filename
+
+
+def export_csv(model, filename, run_id=None, results_dir=RESULTS_DIR, columns=None, chunk_rows=CSV_CHUNK_ROWS):
+    # Export the results of a model for one run to a CSV file, streaming the Parquet file by batches of rows
+    manifest = read_manifest(run_id, results_dir)
+    parquet_file = pq.ParquetFile(os.path.join(results_dir, manifest['models'][model]['path']))
+    batches = (batch.to_pandas() for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns))
+    return write_csv(batches, filename, chunk_rows=chunk_rows)
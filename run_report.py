@@ -0,0 +1,239 @@
+"""
+Instrumentation of the runs: timed stages, peak memory, row counts, counters and a JSON report.
+
+A run (e.g. finanalysis.py score or batch_scoring.py) opens a RunReport, and the code of each stage records a span into
+the report of the current run:
+
+    with RunReport('score', run_id) as report:
+        statement_data = load_statements(...)      # the loader records a 'load' span
+        with span('export'):
+            ...
+    report.save('deliverables/results/reports/<run_id>.json')
+
+The stages are the fetch from the API, the load of the statements, their alignment into a panel, the scoring of each
+model, the export of the results and the rendering of the charts. The functions of these stages record their spans
+themselves (see the @stage decorator), so the scripts and the tools get the same timings without changing their code,
+and the spans do nothing when no report is open. The report adds up the time and the number of calls of each stage,
+keeps the peak resident memory (RSS) at the end of each span and the number of rows of each model, and the change
+of the counters of the modules during the run: the hits and misses of the cache of the statements (statement_loader),
+the API calls made and avoided thanks to the pickle files (fmp_fetcher), and the HTTP requests and retries (fmp_request).
+
+One stage can be profiled with cProfile (profile_stage='score'): its spans run under the profiler, the statistics are
+saved to a .prof file next to the report (open it with python -m pstats or snakeviz), and the report lists the
+functions with the longest cumulative time.
+
+The worker processes of the batch runs open their own report and send its stages and counters back, which are added
+to the report of the run as the worker stages (their times add up the time of all the workers).
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # The resource module is not available on Windows, where the peak memory is not reported
+    resource = None
+
+# Define the stages of a run, in the order they usually run
+STAGES = ['fetch', 'load', 'align', 'score', 'export', 'render']
+
+# Define the number of functions of a profiled stage listed in the report
+PROFILE_TOP_FUNCTIONS = 20
+
+# The counters of the modules, keyed by name (see register_counters)
+_counters = {}
+
+# The report of the current run, which the spans are recorded into (None outside a run)
+_active = None
+
+
+def register_counters(name, counters):
+    # Register a dictionary of counters of a module (e.g. the hits and misses of a cache), whose change during a run
+    # is saved in the report
+    _counters[name] = counters
+
+
+def peak_rss():
+    # Get the peak resident memory of the process and of its terminated child processes, in bytes
+    if resource is None:
+        return None, None
+    # The maximum RSS is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale)
+
+
+def counter_values():
+    return {name: dict(counters) for name, counters in _counters.items()}
+
+
+class RunReport:
+    # The timings, the memory, the row counts and the counters of a run
+
+    def __init__(self, command, run_id=None, profile_stage=None, profile_dir='.'):
+        self.command = command
+        self.run_id = run_id
+        self.profile_stage = profile_stage
+        self.profile_dir = profile_dir
+        self.profiler = None
+
+        self.stages = {}
+        self.worker_stages = {}
+        self.spans = []
+        self.rows = {}
+        self.worker_counters = {}
+        self.details = {}
+
+        self.started_at = datetime.now()
+        self.start = time.perf_counter()
+        self.counters_start = counter_values()
+        self.previous = None
+
+    def __enter__(self):
+        # Make this report the report of the current run
+        global _active
+        self.previous, _active = _active, self
+        return self
+
+    def __exit__(self, *exc_info):
+        global _active
+        _active = self.previous
+
+    @contextlib.contextmanager
+    def span(self, stage, **details):
+        # Time a span of a stage (run it under the profiler if the stage is profiled)
+        profiler = None
+        if stage == self.profile_stage:
+            self.profiler = self.profiler or cProfile.Profile()
+            profiler = self.profiler
+
+        offset = time.perf_counter() - self.start
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            seconds = time.perf_counter() - self.start - offset
+
+            totals = self.stages.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+            totals['calls'] += 1
+            totals['seconds'] += seconds
+
+            self.spans.append({'stage': stage, 'start': round(offset, 6), 'seconds': round(seconds, 6),
+                               'peak_rss_bytes': peak_rss()[0], **details})
+
+    def add_rows(self, model, rows):
+        self.rows[model] = self.rows.get(model, 0) + int(rows)
+
+    def merge_worker(self, worker_report):
+        # Add the stages, the row counts and the counters of the report of a worker process (see to_dict)
+        for stage, totals in worker_report['stages'].items():
+            worker_totals = self.worker_stages.setdefault(stage, {'calls': 0, 'seconds': 0.0})
+            worker_totals['calls'] += totals['calls']
+            worker_totals['seconds'] += totals['seconds']
+        for model, rows in worker_report['rows'].items():
+            self.add_rows(model, rows)
+        for name, counters in worker_report['counters'].items():
+            worker_counters = self.worker_counters.setdefault(name, {})
+            for key, value in counters.items():
+                worker_counters[key] = worker_counters.get(key, 0) + value
+
+    def counters(self):
+        # Get the change of the counters of the modules since the start of the run, plus the counters of the workers
+        changes = {}
+        for name, counters in counter_values().items():
+            start = self.counters_start.get(name, {})
+            changes[name] = {key: value - start.get(key, 0) for key, value in counters.items()}
+        for name, counters in self.worker_counters.items():
+            for key, value in counters.items():
+                changes.setdefault(name, {})[key] = changes.get(name, {}).get(key, 0) + value
+        return changes
+
+    def profile_path(self):
+        return os.path.join(self.profile_dir, f'{self.run_id or self.command}_{self.profile_stage}.prof')
+
+    def profile_summary(self):
+        # Save the statistics of the profiled stage, and list the functions with the longest cumulative time
+        path = self.profile_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.profiler.dump_stats(path)
+
+        stats = pstats.Stats(self.profiler).stats
+        top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_FUNCTIONS]
+        return {'stage': self.profile_stage, 'path': path, 'top_functions': [
+            {'function': f'{filename}:{line}({function})', 'calls': calls, 'total_seconds': round(total, 6),
+             'cumulative_seconds': round(cumulative, 6)}
+            for (filename, line, function), (_, calls, total, cumulative, _) in top]}
+
+    def to_dict(self):
+        rss, children_rss = peak_rss()
+        report = {
+            'command': self.command,
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self.start, 6),
+            'stages': {stage: {'calls': totals['calls'], 'seconds': round(totals['seconds'], 6)}
+                       for stage, totals in sorted(self.stages.items(), key=lambda item: _stage_order(item[0]))},
+            'worker_stages': {stage: {'calls': totals['calls'], 'seconds': round(totals['seconds'], 6)}
+                              for stage, totals in self.worker_stages.items()},
+            'peak_rss_bytes': rss,
+            'peak_children_rss_bytes': children_rss,
+            'rows': self.rows,
+            'counters': self.counters(),
+            'spans': self.spans,
+            'details': self.details,
+        }
+        if self.profiler is not None:
+            report['profile'] = self.profile_summary()
+        return report
+
+    def save(self, filename):
+        # Save the report to a JSON file, and return the report
+        report = self.to_dict()
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        return report
+
+
+def _stage_order(stage):
+    return STAGES.index(stage) if stage in STAGES else len(STAGES)
+
+
+def active():
+    # Get the report of the current run (None outside a run)
+    return _active
+
+
+def span(stage, **details):
+    # Time a span of a stage in the report of the current run (nothing is recorded outside a run)
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.span(stage, **details)
+
+
+def stage(name):
+    # Decorator recording each call of a function as a span of a stage
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_rows(model, rows):
+    # Count the rows of the results of a model in the report of the current run
+    if _active is not None:
+        _active.add_rows(model, rows)
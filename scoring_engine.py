@@ -0,0 +1,373 @@
+"""
+Universe-wide scoring engine for the Altman Z-Score, Piotroski F-Score, Beneish M-Score, Ohlson O-Score and DuPont
+analysis.
+
+Instead of calling each model once per symbol in a Python loop, all the symbols are aligned into one panel indexed
+by (symbol, date) and sorted in ascending order (see statement_alignment.py), and each model is computed in a single
+vectorized pass over the panel. The values that depend on the prior period of the same symbol (shift/diff) are
+computed with grouped operations, so they never cross from one symbol to the next. Each model returns a tidy
+DataFrame with one row per symbol and period, ready to be saved.
+
+On a quarterly panel (period='quarter'), the flows are trailing-twelve-month values and each period is compared with
+the same quarter of the previous year, so the same formulas apply to both periods.
+
+The derived quantities shared by the models (working capital, previous total assets, FFO, ...) are requested by
+name from a FeatureSet (see feature_registry.py), so they are computed once per run when the models run together.
+
+The formulas are the same used by the scripts, see the docstrings of the scripts for the theory behind the models.
+"""
+
+import numpy as np
+import pandas as pd
+
+from beneish_kernel import BENEISH_OUTPUTS, beneish_kernel
+from feature_registry import FeatureSet
+from macro_series import DEFAULT_COUNTRY, GNP_FILE, MacroSeries
+from run_report import add_rows, span
+from statement_alignment import (align_statements, consecutive, from_matrix, has_statements, matrix_positions,
+                                 to_matrix)
+
+# Coefficients for different industries
+ALTMAN_INDUSTRY_COEFFICIENTS = {
+    'non_manufacturer': {'y1': 6.56, 'y2': 3.26, 'y3': 6.72, 'y4': 1.05, 'y5': 0, 'a': 0, 'z1': 2.6, 'z2': 1.1},
+    'manufacturers': {'y1': 1.2, 'y2': 1.4, 'y3': 3.3, 'y4': 0.6, 'y5': 1, 'a': 0,  'z1': 2.99, 'z2': 1.81},
+    'emerging_market': {'y1': 6.56, 'y2': 3.26, 'y3': 6.72, 'y4': 1.05, 'y5': 0, 'a': 3.25,  'z1': 2.6, 'z2': 1.1}
+}
+
+# Define the ratios of the Altman Z-Score and their coefficients in ALTMAN_INDUSTRY_COEFFICIENTS
+ALTMAN_TERMS = ['working_capital_to_assets', 'retained_earnings_to_assets', 'ebit_to_assets', 'equity_to_liabilities',
+                'sales_to_assets']
+ALTMAN_COEFFICIENTS = ['y1', 'y2', 'y3', 'y4', 'y5']
+
+# Define the industries whose coefficients are calibrated on the market value of equity (the Z''-Score coefficients of
+# the other industries are calibrated on the book value, so the market value is not used for them)
+ALTMAN_MARKET_VALUE_INDUSTRIES = ['manufacturers']
+
+# Define the thresholds of the M-Score and of the O-Score (see the docstrings of the scripts)
+BENEISH_THRESHOLD = -1.78
+OHLSON_THRESHOLD = 0.5
+
+# Define the intercept of the Ohlson O-Score and the coefficient of each of its variables
+# (size is the log of the total assets over the GNP, oeneg is 1 if the liabilities exceed the assets,
+# intwo is 1 if the net income was negative in the last two periods, chin is the change in net income)
+OHLSON_INTERCEPT = -1.32
+OHLSON_COEFFICIENTS = {'size': -0.407, 'tlta': 6.03, 'wcta': -1.43, 'clca': 0.0757, 'oeneg': -1.72, 'nita': -2.37,
+                       'futl': -1.83, 'intwo': 0.285, 'chin': -0.521}
+
+# Define the names of the Piotroski F-Score components
+PIOTROSKI_COMPONENTS = ['Profitability', 'Operating Cash Flow Positive', 'Change in ROA',
+                        'Accruals', 'Change in Leverage', 'Change in Liquidity',
+                        'Equity Issues', 'Change in Gross Margin', 'Change in Asset Turnover']
+
+# Define the names of the Beneish M-Score components
+BENEISH_COMPONENTS = ['dsri', 'gmi', 'aqi', 'sgi', 'depi', 'sgai', 'lvgi', 'tata']
+
+# Define the names of the DuPont ratios
+DUPONT_RATIOS = ['Net Profit Margin', 'Asset Turnover', 'Equity Turnover', 'Tax Burden', 'Interest Burden',
+                 'Operating Profit Margin', 'Financial Leverage Ratio']
+
+
+# Define the columns used by each model, so only these fields are loaded
+MODEL_COLUMNS = {
+    'altman': {
+        'balance-sheet-statement': ['totalCurrentAssets', 'totalCurrentLiabilities', 'retainedEarnings', 'totalAssets',
+                                    'totalLiabilities'],
+        'income-statement': ['operatingIncome', 'revenue'],
+    },
+    'piotroski': {
+        'balance-sheet-statement': ['totalAssets', 'preferredStock', 'commonStock', 'longTermDebt'],
+        'income-statement': ['netIncome'],
+        'cash-flow-statement': ['operatingCashFlow'],
+    },
+    'beneish': {
+        'balance-sheet-statement': ['totalAssets', 'netReceivables', 'totalCurrentAssets', 'totalCurrentLiabilities',
+                                    'totalLiabilities', 'propertyPlantEquipmentNet', 'shortTermInvestments',
+                                    'longTermInvestments'],
+        'income-statement': ['netIncome', 'revenue', 'costOfRevenue', 'depreciationAndAmortization',
+                             'sellingGeneralAndAdministrativeExpenses'],
+        'cash-flow-statement': ['operatingCashFlow'],
+    },
+    'ohlson': {
+        'balance-sheet-statement': ['totalAssets', 'totalCurrentAssets', 'totalCurrentLiabilities', 'totalLiabilities'],
+        'income-statement': ['netIncome', 'depreciationAndAmortization', 'totalOtherIncomeExpensesNet'],
+    },
+    'dupont': {
+        'balance-sheet-statement': ['totalAssets', 'totalEquity'],
+        'income-statement': ['netIncome', 'revenue', 'incomeBeforeTax', 'interestExpense'],
+    },
+}
+
+
+def columns_for_models(models):
+    # Get the columns of each statement type needed by all the specified models
+    columns = {}
+    for model in models:
+        for statement_type, statement_columns in MODEL_COLUMNS[model].items():
+            columns[statement_type] = list(dict.fromkeys(columns.get(statement_type, []) + statement_columns))
+    return columns
+
+
+def tidy(panel, values, mask=None):
+    # Build the result DataFrame, with one row per symbol and period (only the rows in the mask, if specified)
+    if mask is not None:
+        panel = panel[mask]
+        values = {name: value[mask] for name, value in values.items()}
+
+    result = pd.DataFrame({
+        'Symbol': panel.index.get_level_values('symbol'),
+        'Date/Period': panel.index.get_level_values('date'),
+    })
+    for name, value in values.items():
+        result[name] = np.asarray(value)
+    return result
+
+
+def altman_terms(panel, market_cap=None, features=None, industry='non_manufacturer'):
+    # Calculate the ratios of the Altman Z-Score (the terms of the coefficients y1 to y5, see ALTMAN_TERMS)
+    # If the daily market cap is specified (a MarketCapSeries) and the coefficients of the industry are calibrated on
+    # the market value (see ALTMAN_MARKET_VALUE_INDUSTRIES), the market value of equity is used instead of the book
+    # value, taken on the latest trading day on or before each statement date
+    f = FeatureSet(panel) if features is None else features
+    mask = has_statements(panel, ['balance-sheet-statement', 'income-statement'])
+
+    # Get values from the financial statements and define the financial ratios used in the Altman Z-Score
+    total_assets = f['totalAssets']
+    total_liabilities = f['totalLiabilities']
+    equity_value = f['book_equity']
+
+    if market_cap is not None and industry not in ALTMAN_MARKET_VALUE_INDUSTRIES:
+        print(f"Warning: the coefficients of the '{industry}' industry are calibrated on the book value of equity, "
+              f"the market cap is not used.")
+    elif market_cap is not None:
+        market_value = pd.Series(market_cap.asof(panel.index.get_level_values('symbol'),
+                                                 panel.index.get_level_values('date')), index=panel.index)
+        missing = mask & market_value.isna()
+        if missing.any():
+            print(f'Warning: market cap not available for {missing.sum()} periods, using the book value of equity.')
+        equity_value = market_value.fillna(equity_value)
+
+    terms = {
+        'working_capital_to_assets': f['working_capital'] / total_assets,
+        'retained_earnings_to_assets': f['retainedEarnings'] / total_assets,
+        'ebit_to_assets': f['ebit'] / total_assets,
+        'equity_to_liabilities': equity_value / total_liabilities,
+        'sales_to_assets': f['revenue'] / total_assets,
+    }
+    return terms, mask
+
+
+def altman_zscore(panel, industry='non_manufacturer', market_cap=None, features=None):
+    # Calculate the Altman Z-Score for the symbols with balance sheet and income statement data
+    # If the daily market cap is specified (a MarketCapSeries), the market value of equity is used instead of the
+    # book value for the industries calibrated on it (see altman_terms)
+    terms, mask = altman_terms(panel, market_cap, features, industry)
+
+    # Get coefficients for the specified industry
+    #If the specified industry is not found, use the coefficients for 'non_manufacturer'
+    coefficients = ALTMAN_INDUSTRY_COEFFICIENTS.get(industry, ALTMAN_INDUSTRY_COEFFICIENTS.get('non_manufacturer'))
+
+    # Calculate the Altman Z-Score components
+    z_score = 0
+    for coefficient, term in zip(ALTMAN_COEFFICIENTS, ALTMAN_TERMS):
+        z_score = z_score + coefficients[coefficient] * terms[term]
+    if industry != 'manufacturing':
+        z_score = z_score + coefficients['a']
+
+    return tidy(panel, {'Altman Z-Score': z_score}, mask)
+
+
+def piotroski_fscore(panel, features=None):
+    # Calculate the Piotroski F-Score and its components for the symbols with all three statements
+    f = FeatureSet(panel) if features is None else features
+    mask = has_statements(panel, ['balance-sheet-statement', 'income-statement', 'cash-flow-statement'])
+
+    # Define the financial ratios used in the Piotroski F-Score
+    net_income = f['netIncome']
+    operating_cash_flow = f['operatingCashFlow']
+
+    # Calculate individual components of Piotroski F-Score first, so I can save and analyse them separately
+    components = {
+        'Profitability': (net_income > 0).astype(np.int8),
+        'Operating Cash Flow Positive': (operating_cash_flow > 0).astype(np.int8),
+        'Change in ROA': (f['diff:roa'] > 0).astype(np.int8),
+        'Accruals': (operating_cash_flow > net_income).astype(np.int8),
+        'Change in Leverage': (f['diff:longTermDebt'] < 0).astype(np.int8),
+        'Change in Liquidity': (f['diff:roa'] > 0).astype(np.int8),
+        'Equity Issues': (f['diff:total_share_outstanding'] <= 0).astype(np.int8),
+        'Change in Gross Margin': (f['diff:operatingCashFlow'] > 0).astype(np.int8),
+        'Change in Asset Turnover': (net_income > 0).astype(np.int8),
+    }
+
+    # Calculate the Piotroski F-Score
+    fscore = sum(components.values())
+
+    return tidy(panel, {'Piotroski F-Score': fscore, **components}, mask)
+
+
+def beneish_mscore(panel, features=None):
+    # Calculate the Beneish M-Score and its components for the symbols with all three statements
+    f = FeatureSet(panel) if features is None else features
+    mask = has_statements(panel, ['balance-sheet-statement', 'income-statement', 'cash-flow-statement'])
+
+    # Get values from the financial statements (with the missing values replaced by 0) as matrices (symbols x periods)
+    names = {
+        'net_income': 'filled:netIncome', 'total_assets': 'filled:totalAssets',
+        'cash_flow_from_operating_activities': 'filled:operatingCashFlow', 'receivables': 'filled:netReceivables',
+        'current_assets': 'filled:totalCurrentAssets', 'current_liabilities': 'filled:totalCurrentLiabilities',
+        'revenue': 'filled:revenue', 'cost_of_goods_sold': 'filled:costOfRevenue',
+        'depreciation': 'filled:depreciationAndAmortization',
+        'sga_expenses': 'filled:sellingGeneralAndAdministrativeExpenses',
+        'total_liabilities': 'filled:totalLiabilities', 'pp_and_e': 'filled:propertyPlantEquipmentNet',
+        'securities': 'securities',
+    }
+    positions = matrix_positions(panel)
+    out = beneish_kernel({name: to_matrix(f[feature_name], positions) for name, feature_name in names.items()},
+                         lag=f.lag)
+
+    # The values are not rounded here, they are rounded when they are presented
+    components = {name: from_matrix(out[BENEISH_OUTPUTS.index(name)], positions) for name in BENEISH_COMPONENTS}
+    m_score = from_matrix(out[BENEISH_OUTPUTS.index('mscore')], positions)
+
+    # The kernel takes the prior period lag columns before, so the indices of the periods whose prior period is
+    # missing (a gap in the dates) compare periods that are not adjacent: they are NaN, like for the first periods
+    has_previous = consecutive(panel, f.lag, f.period)
+    for name in BENEISH_COMPONENTS:
+        if name != 'tata':
+            components[name] = np.where(has_previous, components[name], np.nan)
+    m_score = np.where(has_previous, m_score, np.nan)
+
+    return tidy(panel, {'Beneish M-Score': m_score, **components}, mask)
+
+
+def ohlson_terms(panel, countries=None, macro_series=None, features=None):
+    # Calculate the variables of the Ohlson O-Score (the terms of OHLSON_COEFFICIENTS)
+    # The countries map each symbol to its country (see countries_from_profiles), to look up its GNP
+    f = FeatureSet(panel) if features is None else features
+    mask = has_statements(panel, ['balance-sheet-statement', 'income-statement'])
+    if macro_series is None:
+        macro_series = MacroSeries.from_csv(GNP_FILE)
+
+    # Get the GNP value for the country of each symbol and the year of each financial statement
+    symbol_countries = pd.Series(panel.index.get_level_values('symbol')).map(countries or {}).fillna(DEFAULT_COUNTRY)
+    dates = panel.index.get_level_values('date')
+    gnp = pd.Series(macro_series.lookup(symbol_countries, dates), index=panel.index)
+
+    missing = (mask & gnp.isna()).to_numpy()
+    if missing.any():
+        # Handle the case where GNP for the year is not available: use the nearest year of the country, or of the
+        # default country if the series has no value for the country
+        for country, year in pd.DataFrame({'country': symbol_countries.to_numpy()[missing],
+                                           'year': dates.year[missing]}).drop_duplicates().itertuples(index=False):
+            fallback = country if country in macro_series.countries else DEFAULT_COUNTRY
+            print(f"Warning: GNP value not available for {country} for the year {year}, "
+                  f"using the nearest year of {fallback}.")
+        gnp = pd.Series(macro_series.lookup(symbol_countries, dates, DEFAULT_COUNTRY), index=panel.index)
+
+    # Get values from the financial statements and define the financial ratios used in the Ohlson O-Score
+    net_income = f['netIncome']
+    total_assets = f['totalAssets']
+    current_liabilities = f['totalCurrentLiabilities']
+    current_assets = f['totalCurrentAssets']
+    total_liabilities = f['totalLiabilities']
+    last_year_net_income = f['previous:netIncome']
+
+    # X is 1 if the total liabilities exceed the total assets
+    X = (total_liabilities > total_assets).astype(int)
+
+    # Y is 1 if the net income was negative in the last two periods, i.e. in a rolling window of two periods
+    Y = ((net_income < 0) & (last_year_net_income < 0)).astype(int)
+
+    terms = {
+        'size': np.log(total_assets / gnp),
+        'tlta': total_liabilities / total_assets,
+        'wcta': f['working_capital'] / total_assets,
+        'clca': current_liabilities / current_assets,
+        'oeneg': X,
+        'nita': net_income / total_assets,
+        'futl': f['funds_from_operations'] / total_liabilities,
+        'intwo': Y,
+        'chin': (net_income - last_year_net_income) / (np.abs(net_income) + np.abs(last_year_net_income)),
+    }
+    return terms, mask
+
+
+def ohlson_oscore(panel, countries=None, macro_series=None, features=None):
+    # Calculate the Ohlson O-Score for the symbols with balance sheet and income statement data
+    # The countries map each symbol to its country (see countries_from_profiles), to look up its GNP
+    terms, mask = ohlson_terms(panel, countries, macro_series, features)
+
+    # Calculate the Ohlson O-Score from its components
+    ohlson_score = OHLSON_INTERCEPT
+    for name, coefficient in OHLSON_COEFFICIENTS.items():
+        ohlson_score = ohlson_score + coefficient * terms[name]
+
+    return tidy(panel, {'Ohlson O-Score': ohlson_score}, mask)
+
+
+def dupont(panel, features=None):
+    # Calculate the DuPont ratios for the symbols with balance sheet and income statement data
+    f = FeatureSet(panel) if features is None else features
+    mask = has_statements(panel, ['balance-sheet-statement', 'income-statement'])
+
+    net_income = f['filled:netIncome']
+    revenue = f['filled:revenue']
+    ebt = f['filled:incomeBeforeTax']
+    ebit = f['ebit_from_ebt']
+    # The balance sheet items are averaged over the year, to match the flows of the year (TTM on a quarterly panel)
+    total_assets = f['average:filled:totalAssets']
+    total_equity = f['average:filled:totalEquity']
+
+    # Calculate Dupont components
+    tax_burden = net_income / ebt  # Tax Burden
+    interest_burden = ebt / ebit  # Interest Burden
+    operating_profit_margin = ebit / revenue  # Operating Profit Margin
+    asset_turnover = revenue / total_assets  # Asset Turnover
+    financial_leverage_ratio = total_assets / total_equity  # Financial Leverage Ratio
+
+    # Calculate more granular components
+    net_profit_margin = tax_burden * interest_burden * operating_profit_margin
+    equity_turnover = asset_turnover * financial_leverage_ratio
+
+    return tidy(panel, {
+        'Net Profit Margin': net_profit_margin,
+        'Asset Turnover': asset_turnover,
+        'Equity Turnover': equity_turnover,
+        'Tax Burden': tax_burden,
+        'Interest Burden': interest_burden,
+        'Operating Profit Margin': operating_profit_margin,
+        'Financial Leverage Ratio': financial_leverage_ratio
+    }, mask)
+
+
+# Define the function of each model, keyed by the name used to request it
+MODELS = {
+    'altman': altman_zscore,
+    'piotroski': piotroski_fscore,
+    'beneish': beneish_mscore,
+    'ohlson': ohlson_oscore,
+    'dupont': dupont,
+}
+
+
+def score_universe(statement_data, symbols, models=tuple(MODELS), period='annual', **model_options):
+    # Build the panel once and run all the requested models on it, sharing the derived features between them
+    # With period='quarter', the models run on the quarterly panel with the TTM flows
+    # The options are passed to the models that accept them, e.g. industry='manufacturers' for the Altman Z-Score,
+    # market_cap=MarketCapSeries(...) for the market value variant of the Altman Z-Score,
+    # or countries={'MSFT': 'US', ...} for the GNP of the Ohlson O-Score
+    panel = align_statements(statement_data, symbols, period)
+    features = FeatureSet(panel)
+    results = {}
+
+    for model in models:
+        with span('score', model=model):
+            if model == 'altman':
+                results[model] = altman_zscore(panel, model_options.get('industry', 'non_manufacturer'),
+                                               model_options.get('market_cap'), features=features)
+            elif model == 'ohlson':
+                results[model] = ohlson_oscore(panel, model_options.get('countries'), features=features)
+            else:
+                results[model] = MODELS[model](panel, features=features)
+        add_rows(model, len(results[model]))
+
+    return results
@@ -0,0 +1,287 @@
+"""
+Screener engine: a wide table keyed by (symbol, fiscal year) and filter expressions compiled to boolean masks.
+
+Each data source (DCF, rating, key metrics, financial growth) is stacked once into a DataFrame indexed by
+(symbol, fiscal_year), and the sources are joined on that key, one join per source. A column that is in more than
+one source (e.g. 'date') keeps the value of the first source that has it. The missing values stay missing, so a
+filter on a missing value is False instead of comparing a made-up 0.
+
+The filters are written as Python expressions on the columns of the table, e.g.
+
+    screen(table, 'peRatio < 15 and revenueGrowth > 0.1')
+
+The expression is parsed once and compiled to a function computing a vectorized boolean mask over the whole table.
+Only comparisons, arithmetic, and/or/not, column names and constants are allowed; the column names that are not
+valid identifiers can be written between backticks, e.g. `Stock Price` > dcf.
+
+The ranking takes the latest values of each symbol and combines weighted factors (also expressions, e.g. the DCF
+upside dcf / `Stock Price` - 1) into one score, then keeps the top k symbols overall or per group (e.g. per sector)
+with a partial selection (argpartition), so only the k selected rows are sorted.
+"""
+
+import ast
+import operator
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Define the data sources of the screener, in order of priority for the columns they share
+SCREENER_SOURCES = ['discounted-cash-flow', 'rating', 'key-metrics', 'financial-growth']
+
+# Define the columns of the key of the wide table
+KEY_COLUMNS = ['symbol', 'fiscal_year']
+
+# Define the factors of the ranking (expressions on the columns) and their weights
+# A negative weight means that a lower value is better
+RANKING_FACTORS = {
+    'peRatio': -1.0,
+    'roe': 1.0,
+    'revenueGrowth': 1.0,
+    'epsgrowth': 0.5,
+    'dcf / `Stock Price` - 1': 1.0,
+    'ratingScore': 0.5,
+}
+
+_COMPARISONS = {
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_ARITHMETIC = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv,
+    ast.Pow: operator.pow, ast.Mod: operator.mod,
+}
+
+
+def keyed_frame(frames):
+    # Stack the DataFrames of a source (keyed by symbol) into one DataFrame indexed by (symbol, fiscal_year)
+    frames = [df for df in frames.values() if not df.empty]
+    if not frames:
+        return None
+
+    df = pd.concat(frames, ignore_index=True)
+
+    # The fiscal year is the calendarYear reported by the API, or the year of the date if it's not available
+    fiscal_year = pd.to_datetime(df['date']).dt.year
+    if 'calendarYear' in df.columns:
+        fiscal_year = pd.to_numeric(df['calendarYear'], errors='coerce').fillna(fiscal_year)
+    df['fiscal_year'] = fiscal_year.astype(int)
+
+    # Keep one row per symbol and year (the API returns the most recent data first)
+    df = df.set_index(KEY_COLUMNS)
+    return df[~df.index.duplicated(keep='first')]
+
+
+def build_wide_table(source_data, sources=SCREENER_SOURCES):
+    # Join the sources into one table indexed by (symbol, fiscal_year), one join per source
+    table = None
+
+    for source in sources:
+        df = keyed_frame(source_data.get(source, {}))
+        if df is None:
+            continue
+
+        if table is None:
+            table = df
+            continue
+
+        new_columns = df.columns.difference(table.columns, sort=False)
+        shared_columns = df.columns.intersection(table.columns, sort=False)
+        table = table.join(df[new_columns], how='outer')
+
+        # The shared columns keep the value of the first source, filled with this source where it's missing
+        for column in shared_columns:
+            table[column] = table[column].combine_first(df[column])
+
+    if table is None:
+        return pd.DataFrame(index=pd.MultiIndex.from_arrays([[], []], names=KEY_COLUMNS))
+
+    return table.sort_index()
+
+
+class _Compiler:
+    # Compile the AST of a filter expression to a function of the table
+
+    def __init__(self, names):
+        self.names = names
+
+    def compile(self, node):
+        method = getattr(self, f'_{type(node).__name__}', None)
+        if method is None:
+            raise ValueError(f'Unsupported syntax in filter expression: {ast.dump(node)}')
+        return method(node)
+
+    def _Expression(self, node):
+        return self.compile(node.body)
+
+    def _BoolOp(self, node):
+        values = [self.compile(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda table: combine.reduce([_as_mask(value(table)) for value in values])
+
+    def _UnaryOp(self, node):
+        operand = self.compile(node.operand)
+        if isinstance(node.op, ast.Not):
+            return lambda table: ~_as_mask(operand(table))
+        if isinstance(node.op, ast.USub):
+            return lambda table: -operand(table)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        raise ValueError(f'Unsupported operator in filter expression: {type(node.op).__name__}')
+
+    def _Compare(self, node):
+        # Chained comparisons (a < b < c) are the and of the single comparisons
+        operands = [self.compile(node.left)] + [self.compile(comparator) for comparator in node.comparators]
+        functions = []
+        for op in node.ops:
+            if type(op) not in _COMPARISONS:
+                raise ValueError(f'Unsupported comparison in filter expression: {type(op).__name__}')
+            functions.append(_COMPARISONS[type(op)])
+
+        def compare(table):
+            values = [operand(table) for operand in operands]
+            return np.logical_and.reduce([_as_mask(function(values[i], values[i + 1]))
+                                          for i, function in enumerate(functions)])
+        return compare
+
+    def _BinOp(self, node):
+        if type(node.op) not in _ARITHMETIC:
+            raise ValueError(f'Unsupported operator in filter expression: {type(node.op).__name__}')
+        function = _ARITHMETIC[type(node.op)]
+        left, right = self.compile(node.left), self.compile(node.right)
+        return lambda table: function(left(table), right(table))
+
+    def _Name(self, node):
+        column = self.names.get(node.id, node.id)
+        return lambda table: _column(table, column)
+
+    def _Constant(self, node):
+        if not isinstance(node.value, (int, float, str, bool)):
+            raise ValueError(f'Unsupported constant in filter expression: {node.value!r}')
+        value = node.value
+        return lambda table: value
+
+
+def _column(table, column):
+    # Get a column (or a level of the index, e.g. fiscal_year) as a NumPy array
+    if column in table.columns:
+        values = table[column]
+        return values.to_numpy(dtype=np.float64, na_value=np.nan) if pd.api.types.is_numeric_dtype(values) \
+            else values.to_numpy(dtype=object)
+    if column in table.index.names:
+        return table.index.get_level_values(column).to_numpy()
+    raise KeyError(f'Unknown column in filter expression: {column}')
+
+
+def _as_mask(values):
+    # The comparisons with a missing value are False
+    return np.asarray(values, dtype=bool)
+
+
+@lru_cache(maxsize=256)
+def compile_expression(expression):
+    # Compile an expression on the columns of the table to a function returning an array of values
+    # The column names between backticks are replaced by placeholders, so they can contain spaces
+    names = {}
+
+    def placeholder(match):
+        name = f'__column_{len(names)}'
+        names[name] = match.group(1)
+        return name
+
+    source = re.sub(r'`([^`]+)`', placeholder, expression)
+    tree = ast.parse(source.strip(), mode='eval')
+    function = _Compiler(names).compile(tree)
+    return lambda table: np.broadcast_to(function(table), (len(table),))
+
+
+@lru_cache(maxsize=256)
+def compile_filter(expression):
+    # Compile a filter expression to a function returning a boolean mask over the rows of the table
+    function = compile_expression(expression)
+    return lambda table: _as_mask(function(table))
+
+
+def screen(table, expression, columns=None):
+    # Get the rows of the table that pass the filter expression (only the specified columns, if any)
+    mask = compile_filter(expression)(table)
+    result = table[mask]
+    return result if columns is None else result[columns]
+
+
+def latest_values(table):
+    # Get one row per symbol with the most recent value available of each column
+    # (e.g. the DCF and rating of today with the key metrics and growth of the last fiscal year)
+    return table.groupby(level='symbol', sort=False).last()
+
+
+def _factor_values(table, expression):
+    # Calculate the values of a factor, with NaN if the table doesn't have its columns
+    try:
+        values = np.asarray(compile_expression(expression)(table), dtype=np.float64)
+    except KeyError as e:
+        print(f'Warning: factor {expression} skipped. {e.args[0]}')
+        return np.full(len(table), np.nan)
+    return np.where(np.isfinite(values), values, np.nan)
+
+
+def factor_scores(table, factors=RANKING_FACTORS, factor_values=None):
+    # Calculate the weighted multi-factor score of each row: each factor is standardized to a z-score over the rows,
+    # multiplied by its weight and summed, and the missing factors count as average (a z-score of 0)
+    # The values of the factors can be passed if they are already calculated
+    score = np.zeros(len(table))
+    for expression, weight in factors.items():
+        values = _factor_values(table, expression) if factor_values is None else factor_values[expression]
+        if np.isnan(values).all():
+            continue
+        std = np.nanstd(values)
+        z_score = (values - np.nanmean(values)) / std if std > 0 else np.zeros(len(values))
+        score += weight * np.nan_to_num(z_score)
+    return score
+
+
+def top_k(scores, k):
+    # Get the positions of the k highest scores, from the highest, with a partial selection instead of a full sort
+    scores = np.asarray(scores, dtype=np.float64)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+def rank(table, factors=RANKING_FACTORS, k=10, groups=None):
+    # Rank the symbols by their multi-factor score on their latest values, and keep the top k overall,
+    # or the top k of each group if the groups are specified (a dictionary mapping each symbol to e.g. its sector)
+    latest = latest_values(table)
+    values = {expression: _factor_values(latest, expression) for expression in factors}
+    scores = factor_scores(latest, factors, values)
+    symbols = latest.index.to_numpy()
+
+    if groups is None:
+        selected = [top_k(scores, k)]
+        group_labels = None
+    else:
+        group_labels = pd.Series(symbols).map(groups).fillna('Unknown').to_numpy(dtype=object)
+        codes, _ = pd.factorize(group_labels)
+
+        # Sort the symbols by group once and split them at the group boundaries (the groups keep their order)
+        order = np.argsort(codes, kind='stable')
+        boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+        selected = [positions[top_k(scores[positions], k)] for positions in np.split(order, boundaries)]
+
+    frames = []
+    for positions in selected:
+        ranked = pd.DataFrame({'Symbol': symbols[positions]})
+        if group_labels is not None:
+            ranked['Group'] = group_labels[positions]
+        ranked['Rank'] = np.arange(1, len(positions) + 1)
+        ranked['Score'] = scores[positions]
+        for expression in factors:
+            ranked[expression] = values[expression][positions]
+        frames.append(ranked)
+
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,187 @@
+"""
+Date-keyed alignment of the financial statements.
+
+The scoring models combine the balance sheet, the income statement and the cash flow statement of each company.
+Matching the statements by row position silently breaks when one statement has an extra or a missing period, so
+instead every statement is indexed by (symbol, fiscal period end) and the statements are merged once on that key.
+
+The result is a panel sorted by symbol and by date in ascending order, so within each symbol shift(1) means the
+prior period, unless a period is missing (consecutive() flags the rows whose prior periods are all there). Each
+statement adds a 'has_...' flag column, which tells whether the statement has data for that period, and only the
+columns that are not already in the panel (e.g. the netIncome of the cash flow statement is the same as the one of
+the income statement).
+
+The array kernels work on 2-D matrices (symbols x periods) instead of the panel: matrix_positions gives the row and
+column of each panel row, to_matrix scatters a column of the panel into a matrix (padded with NaN for the symbols
+with fewer periods), and from_matrix gathers the values back in the order of the panel.
+
+In quarterly mode (period='quarter'), the income and cash flow statements report the flows of a single quarter, so
+they are replaced by their trailing-twelve-month (TTM) values: the sum of the last four quarters of the same symbol.
+The rolling windows are computed on the whole panel at once, by adding the shifted column arrays, and a window is
+valid only if its quarters belong to the same symbol, are consecutive and have no missing values, and the flow
+statements are flagged as missing for the periods without a full year of data. The balance sheet items are kept at
+the end of each quarter. The panel remembers its period in panel.attrs['period'], so the models
+compare each period with the same period of the previous year (four rows back) instead of the previous row.
+"""
+
+import numpy as np
+import pandas as pd
+
+from run_report import stage
+
+# Define the number of periods in a year for each period type
+PERIODS_PER_YEAR = {'annual': 1, 'quarter': 4}
+
+# Define the statements that report the flows of the period, which are summed over the year in quarterly mode
+FLOW_STATEMENTS = ['income-statement', 'cash-flow-statement']
+
+# Define the columns of the flow statements that are ratios or averages, which are averaged instead of summed
+AVERAGED_COLUMNS = ['grossProfitRatio', 'ebitdaratio', 'operatingIncomeRatio', 'incomeBeforeTaxRatio',
+                    'netIncomeRatio', 'weightedAverageShsOut', 'weightedAverageShsOutDil']
+
+# Define the maximum number of days between two consecutive periods of a rolling window
+MAX_PERIOD_GAP_DAYS = {'annual': 380, 'quarter': 100}
+
+# Define the flag column telling whether each financial statement has data for a period
+STATEMENT_FLAGS = {
+    'balance-sheet-statement': 'has_balance_sheet',
+    'income-statement': 'has_income_statement',
+    'cash-flow-statement': 'has_cash_flow_statement',
+}
+
+
+def index_statement(frames, symbols):
+    # Stack the DataFrames of a statement type into one DataFrame indexed by (symbol, date)
+    frames = {symbol: frames[symbol] for symbol in symbols if symbol in frames and not frames[symbol].empty}
+    if not frames:
+        return None
+
+    df = pd.concat(frames, names=['symbol', 'row']).droplevel('row')
+    df = df.drop(columns='symbol', errors='ignore')
+    df = df.set_index(pd.to_datetime(df.pop('date')), append=True)
+    df.index.names = ['symbol', 'date']
+
+    # Keep one row per period (the API returns the most recent data first)
+    return df[~df.index.duplicated(keep='first')]
+
+
+@stage('align')
+def align_statements(statement_data, symbols, period='annual'):
+    # Merge the statements of all the symbols into one panel indexed by (symbol, date), sorted in ascending order
+    # In quarterly mode, the flows of the income and cash flow statements are replaced by their TTM values
+    panel = None
+    flow_columns = []
+
+    for statement_type, frames in statement_data.items():
+        df = index_statement(frames, symbols)
+        if df is None:
+            continue
+
+        df[STATEMENT_FLAGS[statement_type]] = True
+        new_columns = df.columns if panel is None else df.columns.difference(panel.columns, sort=False)
+
+        if statement_type in FLOW_STATEMENTS:
+            flow_columns += [column for column in new_columns
+                             if pd.api.types.is_numeric_dtype(df[column]) and not pd.api.types.is_bool_dtype(df[column])]
+
+        if panel is None:
+            panel = df
+        else:
+            panel = panel.join(df[new_columns], how='outer')
+
+    if panel is None:
+        panel = pd.DataFrame(index=pd.MultiIndex.from_arrays([[], pd.to_datetime([])], names=['symbol', 'date']))
+        panel.attrs['period'] = period
+        return panel
+
+    # The statements that have no data for a period of the other statements are flagged as missing
+    for flag in STATEMENT_FLAGS.values():
+        if flag in panel.columns:
+            panel[flag] = panel[flag].fillna(False).astype(bool)
+
+    panel = panel.sort_index()
+
+    if PERIODS_PER_YEAR[period] > 1:
+        window = PERIODS_PER_YEAR[period]
+        for column in flow_columns:
+            statistic = 'mean' if column in AVERAGED_COLUMNS else 'sum'
+            panel[column] = rolling(panel, panel[column], window, statistic, period)
+
+        # A flow statement has data for a period only if it has the data of the whole year
+        for statement_type in FLOW_STATEMENTS:
+            flag = STATEMENT_FLAGS[statement_type]
+            if flag in panel.columns:
+                panel[flag] = rolling(panel, panel[flag], window, 'sum', period) == window
+
+    panel.attrs['period'] = period
+    return panel
+
+
+def rolling(panel, values, window, statistic='sum', period='annual'):
+    # Calculate the rolling sum (or mean) of the values over the last window periods of the same symbol
+    # The windows that cross into another symbol, skip a period or have missing values are NaN
+    values = np.asarray(values, dtype=np.float64)
+    if window == 1:
+        return values
+
+    n = len(values)
+
+    # Add the shifted arrays, so each row gets the sum of its window without any loop over the symbols
+    total = values.copy()
+    for shift in range(1, window):
+        total[shift:] += values[:n - shift]
+    total[:window - 1] = np.nan
+
+    # The window is valid if it has window periods of the same symbol, with no gap longer than a period
+    result = np.where(consecutive(panel, window - 1, period), total, np.nan)
+    return result / window if statistic == 'mean' else result
+
+
+def consecutive(panel, steps, period='annual'):
+    # Flag the rows preceded by the given number of periods of the same symbol, with no gap longer than a period
+    # between any two of them (a missing period in between makes the row invalid)
+    n = len(panel)
+    positions = panel.groupby(level='symbol', sort=False).cumcount().to_numpy()
+    days = panel.index.get_level_values('date').to_numpy(dtype='datetime64[D]').astype(np.int64)
+
+    # Check the gap between each row and the previous row, then each step back within the window
+    short_gap = np.ones(n, dtype=bool)
+    short_gap[1:] = np.diff(days) <= MAX_PERIOD_GAP_DAYS[period]
+
+    valid = positions >= steps
+    for shift in range(steps):
+        valid[shift:] &= short_gap[:n - shift]
+    return valid
+
+
+def has_statements(panel, statement_types):
+    # Flag the periods that have data for all the specified statements
+    mask = pd.Series(True, index=panel.index)
+    for statement_type in statement_types:
+        flag = STATEMENT_FLAGS[statement_type]
+        if flag not in panel.columns:
+            return pd.Series(False, index=panel.index)
+        mask &= panel[flag]
+    return mask
+
+
+def matrix_positions(panel):
+    # Get the row (symbol) and column (period number within the symbol) of each row of the panel, and the matrix shape
+    symbol_rows = pd.factorize(panel.index.get_level_values('symbol'))[0]
+    period_columns = panel.groupby(level='symbol', sort=False).cumcount().to_numpy()
+    shape = (symbol_rows.max() + 1 if len(symbol_rows) else 0, period_columns.max() + 1 if len(period_columns) else 0)
+    return symbol_rows, period_columns, shape
+
+
+def to_matrix(values, positions):
+    # Scatter the values of the panel rows into a float64 matrix (symbols x periods), with NaN for the missing periods
+    symbol_rows, period_columns, shape = positions
+    matrix = np.full(shape, np.nan)
+    matrix[symbol_rows, period_columns] = np.asarray(values, dtype=np.float64)
+    return matrix
+
+
+def from_matrix(matrix, positions):
+    # Gather the values of a matrix (symbols x periods) back in the order of the rows of the panel
+    symbol_rows, period_columns, _ = positions
+    return matrix[symbol_rows, period_columns]
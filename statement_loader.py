@@ -0,0 +1,172 @@
+"""
+Shared loader for the financial statements used by the scoring scripts.
+
+load_statements(symbols, statement_types, columns=...) reads the data through the Parquet store if it exists
+(see columnar_store.py), or from the pickle files otherwise, and returns a dictionary of DataFrames keyed by
+statement type and symbol, the same layout the scripts used to build with their own loops.
+
+Only the requested columns are kept (the 'symbol' and 'date' columns are always kept), and the repeated text columns
+are stored as categories to save memory. The amounts keep their 64-bit type: downcast to 32-bit integers, the sums of
+the large amounts of the statements would overflow silently. The loaded data is kept in a size-bounded LRU cache keyed by
+the path and the modification time of the file, so running several models in the same process parses each file
+only once, and a file that changes on disk is read again.
+"""
+
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+from columnar_store import STORE_DIR, dataset_path, read_statements, store_exists
+from fmp_fetcher import pickle_filename
+from run_report import register_counters, stage
+
+# Define the maximum size of the cache in bytes
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+
+# Define the text columns with few distinct values, which are stored as categories
+CATEGORY_COLUMNS = ['reportedCurrency', 'period']
+
+# Define the columns that are always kept, since they identify the symbol and the period of each row
+KEY_COLUMNS = ['symbol', 'date']
+
+# The cache maps each path to its modification time, the symbols and columns loaded so far, the data and its size
+_cache = OrderedDict()
+_cache_bytes = 0
+
+# Count how many reads were served by the cache and how many had to parse the file
+cache_stats = {'hits': 0, 'misses': 0}
+register_counters('statement_cache', cache_stats)
+
+
+def clear_cache():
+    global _cache_bytes
+    _cache.clear()
+    _cache_bytes = 0
+
+
+def _modification_time(path):
+    # The modification time of a dataset is the latest modification time of its files
+    if os.path.isdir(path):
+        return max((os.stat(os.path.join(root, name)).st_mtime_ns
+                    for root, _, names in os.walk(path) for name in names), default=0)
+    return os.stat(path).st_mtime_ns
+
+
+def downcast(df):
+    # Downcast the repeated text columns to categories (the amounts are left as they are, see the module docstring)
+    df = df.copy()
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS and pd.api.types.is_string_dtype(df[column]):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def _project(df, columns):
+    # Keep only the requested columns that are available, plus the key columns
+    if columns is None:
+        return df
+    return df[[column for column in dict.fromkeys(KEY_COLUMNS + list(columns)) if column in df.columns]]
+
+
+def _store(path, entry):
+    # Save an entry in the cache, evicting the least recently used entries if the cache is full
+    global _cache_bytes
+    if path in _cache:
+        _cache_bytes -= _cache.pop(path)['bytes']
+
+    entry['bytes'] = int(entry['df'].memory_usage(deep=True).sum())
+    _cache[path] = entry
+    _cache_bytes += entry['bytes']
+
+    while _cache_bytes > MAX_CACHE_BYTES and len(_cache) > 1:
+        _, evicted = _cache.popitem(last=False)
+        _cache_bytes -= evicted['bytes']
+
+
+def _cached_read(path, reader, columns=None, symbols=None):
+    # Read a file (or a dataset) through the cache
+    # The reader is called with the columns and symbols to load (None means all of them)
+    mtime = _modification_time(path)
+    entry = _cache.get(path)
+
+    if entry is not None and entry['mtime'] == mtime:
+        has_columns = entry['columns'] is None or (columns is not None and set(columns) <= entry['columns'])
+        has_symbols = entry['symbols'] is None or (symbols is not None and set(symbols) <= entry['symbols'])
+
+        if has_columns and has_symbols:
+            cache_stats['hits'] += 1
+            _cache.move_to_end(path)
+            return entry['df']
+
+        # Load what is already cached plus what is requested now, so the file is read again at most once
+        if columns is not None and entry['columns'] is not None:
+            columns = entry['columns'] | set(columns)
+        else:
+            columns = None
+        if symbols is not None and entry['symbols'] is not None:
+            symbols = entry['symbols'] | set(symbols)
+        else:
+            symbols = None
+
+    cache_stats['misses'] += 1
+    df = downcast(reader(None if columns is None else sorted(columns), None if symbols is None else sorted(symbols)))
+    _store(path, {'mtime': mtime, 'columns': None if columns is None else set(columns),
+                  'symbols': None if symbols is None else set(symbols), 'df': df})
+    return df
+
+
+def _columns_for(columns, statement_type):
+    # The columns can be a list used for every statement type, or a dictionary keyed by statement type
+    if isinstance(columns, dict):
+        return columns.get(statement_type)
+    return columns
+
+
+@stage('load')
+def load_statements(symbols, statement_types, columns=None, store_dir=STORE_DIR, pickle_dir='financial_data_pickle'):
+    # Load the data of each statement type as a dictionary of DataFrames keyed by symbol,
+    # reading through the Parquet store if it exists, or from the pickle files otherwise
+    data = {}
+
+    for statement_type in statement_types:
+        data[statement_type] = {}
+        statement_columns = _columns_for(columns, statement_type)
+
+        if store_exists(statement_type, store_dir):
+            path = dataset_path(statement_type, store_dir)
+
+            # Read only the columns that exist in the dataset, since a list of columns can be shared by the statements
+            def read_dataset(read_columns, read_symbols, statement_type=statement_type):
+                if read_columns is not None:
+                    import pyarrow.dataset as ds
+                    names = ds.dataset(dataset_path(statement_type, store_dir), partitioning='hive').schema.names
+                    read_columns = [column for column in read_columns if column in names]
+                return read_statements(statement_type, read_symbols, read_columns, store_dir=store_dir)
+
+            read_columns = None if statement_columns is None else KEY_COLUMNS + list(statement_columns)
+            df = _cached_read(path, read_dataset, read_columns, symbols)
+            df = _project(df[df['symbol'].isin(symbols)], statement_columns)
+
+            for symbol, symbol_df in df.groupby('symbol', sort=False, observed=True):
+                data[statement_type][symbol] = symbol_df.reset_index(drop=True)
+            print(f'Loaded {statement_type} data for {len(data[statement_type])} symbols from {path}')
+
+            for symbol in symbols:
+                if symbol not in data[statement_type]:
+                    print(f'{statement_type} data not found in the store for {symbol}')
+
+        else:
+            for symbol in symbols:
+                filename = pickle_filename(pickle_dir, symbol, statement_type)
+                try:
+                    # Load the DataFrame from the pickle file (the whole file is parsed, then projected)
+                    df = _cached_read(filename, lambda read_columns, read_symbols, filename=filename:
+                                      _project(pd.read_pickle(filename), read_columns), statement_columns)
+                    data[statement_type][symbol] = _project(df, statement_columns)
+                    print(f'Loaded {statement_type} data for {symbol} from {filename}')
+
+                except FileNotFoundError:
+                    print(f'Pickle file not found: {filename}')
+
+    return data
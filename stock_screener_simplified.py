@@ -1,10 +1,14 @@
 from secret import api_key  # Create a "secret.py" file with your API Key and import it
 import pandas as pd
-import requests
 import os
+from fmp_fetcher import DEFAULT_BASE_URL, PROFILE_ENDPOINT, create_session, pickle_filename
+from fmp_request import USAGE_FILE, RateLimiter, request_with_retry
+from screener_engine import RANKING_FACTORS, build_wide_table, rank, screen
+from result_store import deliverable_name, write_csv
 
-# Define the base URL for Financial Modeling Prep API
-base_url = 'https://financialmodelingprep.com/api/v3/'
+# Define the base URL for Financial Modeling Prep API (set the FMP_BASE_URL environment variable to fetch from
+# another server, e.g. the local stand-in server of fmp_server.py)
+base_url = DEFAULT_BASE_URL
 
 # Define the symbols for the selected tickers
 symbols_str = 'AMKR,FORM,RMBS,LSCC,MTSI,ALGM,WOLF,QRVO,IPGP,POWI,SYNA'
@@ -14,11 +18,17 @@ symbols = symbols_str.split(',')
 pickle_dir = 'financial_data_pickle'
 os.makedirs(pickle_dir, exist_ok=True)
 
+# Define the API plan, so the requests go through the shared rate limiter and are retried on 429/5xx responses
+plan = 'free' #choose between 'free', 'starter', 'premium' and 'ultimate'
+limiter = RateLimiter.from_plan(plan, usage_file=USAGE_FILE)
+session = create_session()
+
 # Create dictionaries to hold data for each financial statement, symbol, and profile
 dcf = {}
 rating = {}
 key_metrics = {}
 growth = {}
+profile = {}
 
 # Loop through each symbol
 for symbol in symbols:
@@ -30,26 +40,33 @@ for symbol in symbols:
     growth_df = pd.DataFrame()
 
     # Define the other company data we want to import
-    data1 = ['discounted-cash-flow', 'rating']
+    data1 = ['discounted-cash-flow', 'rating', PROFILE_ENDPOINT]
     data2 = ['key-metrics', 'financial-growth']
 
     # Loop through each company data type
     for data_type in data1:
-        pickle_filename = f'{pickle_dir}/{symbol}_{data_type}.pkl'
+        # The profile is shared with get_financial_data_from_fmp.py and the scoring scripts, so it has their file name
+        filename = (pickle_filename(pickle_dir, symbol, data_type) if data_type == PROFILE_ENDPOINT
+                    else f'{pickle_dir}/{symbol}_{data_type}.pkl')
 
         try:
             # Load the DataFrame from the pickle file
-            df = pd.read_pickle(pickle_filename)
+            df = pd.read_pickle(filename)
 
         except FileNotFoundError:
             # If the pickle file is not found, make the API request and save the DataFrame to a pickle file
             url_data = f'{base_url}{data_type}/{symbol}?apikey={api_key}'
-            response_statement = requests.get(url_data)
+            response_statement = request_with_retry(session, url_data, limiter)
 
             if response_statement.status_code == 200:
                 data = response_statement.json()
                 df = pd.DataFrame(data)
-                df.to_pickle(pickle_filename)
+                df.to_pickle(filename)
+
+            else:
+                # Print an error message and skip the data, it will be fetched again in the next run
+                print(f'Error fetching {data_type} data for {symbol}. Status code: {response_statement.status_code}')
+                df = pd.DataFrame()
 
         # Transpose the DataFrame
         #df = df.transpose()
@@ -59,24 +76,31 @@ for symbol in symbols:
             dcf[symbol] = df
         elif data_type == 'rating':
             rating[symbol] = df
+        elif data_type == PROFILE_ENDPOINT:
+            profile[symbol] = df
 
     for data_type in data2:
-        pickle_filename = f'{pickle_dir}/{symbol}_{data_type}.pkl'
+        filename = f'{pickle_dir}/{symbol}_{data_type}.pkl'
 
         try:
             # Load the DataFrame from the pickle file
-            df = pd.read_pickle(pickle_filename)
+            df = pd.read_pickle(filename)
 
         except FileNotFoundError:
             # If the pickle file is not found, make the API request and save the DataFrame to a pickle file
             period = 'annual'  # Select between annual and quarter
             url_data = f'{base_url}{data_type}/{symbol}?period={period}&apikey={api_key}'
-            response_statement = requests.get(url_data)
+            response_statement = request_with_retry(session, url_data, limiter)
 
             if response_statement.status_code == 200:
                 data = response_statement.json()
                 df = pd.DataFrame(data)
-                df.to_pickle(pickle_filename)
+                df.to_pickle(filename)
+
+            else:
+                # Print an error message and skip the data, it will be fetched again in the next run
+                print(f'Error fetching {data_type} data for {symbol}. Status code: {response_statement.status_code}')
+                df = pd.DataFrame()
 
         # Transpose the DataFrame
         #df = df.transpose()
@@ -87,53 +111,43 @@ for symbol in symbols:
         elif data_type == 'financial-growth':
             growth[symbol] = df
 
-# Merge the DataFrames on the 'symbol' column
-stock_screener_dfs = []  # Use a list to store individual DataFrames
-
+# Check which symbols have missing data
 for symbol in symbols:
-    # Load data for each type
-    dcf_filename = f'{pickle_dir}/{symbol}_discounted-cash-flow.pkl'
-    rating_filename = f'{pickle_dir}/{symbol}_rating.pkl'
-    key_metrics_filename = f'{pickle_dir}/{symbol}_key-metrics.pkl'
-    growth_filename = f'{pickle_dir}/{symbol}_financial-growth.pkl'
-
-    # Load DataFrames from pickle files
-    dcf_df = pd.read_pickle(dcf_filename)
-    rating_df = pd.read_pickle(rating_filename)
-    key_metrics_df = pd.read_pickle(key_metrics_filename)
-    growth_df = pd.read_pickle(growth_filename)
-
-    # Append individual DataFrames to the list
-    stock_screener_dfs.append(dcf_df)
-    stock_screener_dfs.append(rating_df)
-    stock_screener_dfs.append(key_metrics_df)
-    stock_screener_dfs.append(growth_df)
-
-
-
-
-# Concatenate the list of DataFrames into the final DataFrame
-stock_screener_df = pd.concat(stock_screener_dfs, ignore_index=True)
-
-# Reset the index
-stock_screener_df.reset_index(drop=True, inplace=True)
-
-# Print the merged DataFrame
+    if dcf[symbol].empty or rating[symbol].empty or key_metrics[symbol].empty or growth[symbol].empty:
+        print(f'Some data is missing for {symbol}, run the script again to fetch it')
+
+# Join the data sources into one wide table with one row per symbol and fiscal year
+# The missing values are kept as missing, so they don't pass the filters
+stock_screener_df = build_wide_table({
+    'discounted-cash-flow': dcf,
+    'rating': rating,
+    'key-metrics': key_metrics,
+    'financial-growth': growth,
+})
+
+# Print the wide DataFrame
 print(stock_screener_df)
 
-# Save the merged DataFrame to CSV
-stock_screener_df.to_csv(f'deliverables/stock_screener_with_dates_for_{symbols_str}.csv', index=False)
-
-# Convert 'date' to datetime format
-stock_screener_df['date'] = pd.to_datetime(stock_screener_df['date'])
-
-# Group by 'symbol' and 'date', then keep the first non-null value for each group
-grouped_df = stock_screener_df.groupby(['symbol', stock_screener_df['date'].dt.year], as_index=False).first()
-# Replace blank cells with 0
-grouped_df = grouped_df.fillna(0)
-
-# Print the grouped DataFrame
-print(grouped_df)
-
-# Save the grouped DataFrame to CSV
-grouped_df.to_csv(f'deliverables/stock_screener_grouped_for_{symbols_str}.csv', index=False)
+# Save the wide DataFrame to CSV, named after the symbols (or after their number and a hash for a long list)
+name = deliverable_name(symbols, ',')
+write_csv(stock_screener_df, f'deliverables/stock_screener_grouped_for_{name}.csv', index=True)
+
+# Screen the table with a filter expression on its columns (use backticks for the names with spaces)
+screen_expression = 'peRatio < 15 and revenueGrowth > 0.1'
+screened_df = screen(stock_screener_df, screen_expression)
+
+# Print and save the companies that pass the screen
+print(f'Companies passing the screen {screen_expression}:')
+print(screened_df)
+write_csv(screened_df, f'deliverables/stock_screener_screened_for_{name}.csv', index=True)
+
+# Rank the companies by a weighted multi-factor score on their latest data, and keep the top k of each sector
+# Change the weights in RANKING_FACTORS (or pass your own factors) to change the ranking
+top_k = 5
+sectors = {symbol: df['sector'].iloc[0] for symbol, df in profile.items() if 'sector' in df.columns and not df.empty}
+ranking_df = rank(stock_screener_df, RANKING_FACTORS, k=top_k, groups=sectors)
+
+# Print and save the ranked table
+print(f'Top {top_k} companies of each sector:')
+print(ranking_df.to_string(index=False))
+write_csv(ranking_df, f'deliverables/stock_screener_ranking_for_{name}.csv')
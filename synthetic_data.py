@@ -0,0 +1,409 @@
+"""
+Generator of synthetic data with the schema of the Financial Modeling Prep API, for tests and benchmarks.
+
+The scripts read the data of real companies from the pickle files saved by get_financial_data_from_fmp.py and
+stock_screener_simplified.py, which need an API key. This module generates instead the same endpoints for any number
+of made-up symbols (AAAA, AAAB, ...) and periods, with the fields, the units and the order of the rows (the most
+recent period first) of the API, and saves them with the same file names:
+
+- the balance sheet, the income statement and the cash flow statement ({symbol}_{statement_type}_data.pkl)
+- the company profile ({symbol}_profile_data.pkl, also read by the screener)
+- the daily historical market capitalization ({symbol}_historical_market_cap_data.pkl)
+- the DCF, the rating, the key metrics and the financial growth of the screener ({symbol}_{data_type}.pkl)
+
+The statements of each company follow its own random walk, with consistent totals (e.g. the total liabilities and
+the total equity add up to the total assets, and the net income is the income before tax minus the tax), so the
+scores have realistic distributions. A few values are missing and a few denominators are zero (e.g. a company without
+revenue or without current liabilities), as in the real data, so the models are benchmarked on their edge cases too.
+
+The statements of all the symbols are generated at once as (symbols x periods) arrays, then split by symbol, so
+generating 10,000 symbols takes seconds (writing one pickle file per symbol and endpoint takes longer).
+
+Example:
+    python synthetic_data.py --symbols 1000 --periods 10 --pickle-dir /tmp/synthetic/financial_data_pickle
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from fmp_fetcher import MARKET_CAP_ENDPOINT, PROFILE_ENDPOINT, STATEMENT_TYPES, period_dir, pickle_filename
+
+# Define the endpoints of the screener, saved as {symbol}_{data_type}.pkl by stock_screener_simplified.py (the screener
+# reads the profile from the {symbol}_profile_data.pkl files of the fetcher)
+SCREENER_ENDPOINTS = ['discounted-cash-flow', 'rating', 'key-metrics', 'financial-growth']
+
+# Define the fraction of the values that are missing, and of the periods with a zero denominator
+MISSING_RATE = 0.02
+ZERO_RATE = 0.01
+
+# Define the fields that are set to zero in the periods with a zero denominator
+ZERO_DENOMINATORS = {
+    'balance-sheet-statement': ['totalCurrentLiabilities', 'totalLiabilities', 'netReceivables', 'totalEquity'],
+    'income-statement': ['revenue', 'costOfRevenue', 'incomeBeforeTax', 'sellingGeneralAndAdministrativeExpenses'],
+}
+
+# Define the number of periods of each symbol, and the year of the most recent period
+N_PERIODS = 10
+END_YEAR = 2023
+
+# Define the sectors and industries of the profiles, and the countries with their weights
+SECTORS = {
+    'Technology': ['Software—Application', 'Semiconductors', 'Information Technology Services'],
+    'Healthcare': ['Biotechnology', 'Medical Devices', 'Drug Manufacturers—General'],
+    'Industrials': ['Aerospace & Defense', 'Specialty Industrial Machinery', 'Railroads'],
+    'Consumer Cyclical': ['Auto Manufacturers', 'Specialty Retail', 'Restaurants'],
+    'Consumer Defensive': ['Packaged Foods', 'Beverages—Non-Alcoholic', 'Discount Stores'],
+    'Financial Services': ['Asset Management', 'Insurance—Diversified', 'Capital Markets'],
+    'Energy': ['Oil & Gas E&P', 'Oil & Gas Midstream'],
+    'Utilities': ['Utilities—Regulated Electric', 'Utilities—Renewable'],
+    'Basic Materials': ['Chemicals', 'Specialty Chemicals', 'Gold'],
+    'Real Estate': ['REIT—Industrial', 'REIT—Residential'],
+    'Communication Services': ['Internet Content & Information', 'Telecom Services'],
+}
+# (only the countries of the GNP series of macro_series.py, the other countries fall back to the default country)
+COUNTRIES = {'US': 0.85, 'GB': 0.15}
+
+# Define the months of the fiscal year ends, with their weights (most companies end their fiscal year in December)
+FISCAL_YEAR_END_MONTHS = {12: 0.75, 6: 0.1, 9: 0.1, 3: 0.05}
+
+
+def synthetic_symbols(n_symbols):
+    # Name the symbols with four letters or more, in order: AAAA, AAAB, ..., AAAZ, AABA, ...
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    length = max(4, int(np.ceil(np.log(max(n_symbols, 2)) / np.log(26))))
+    digits = (np.arange(n_symbols)[:, None] // 26 ** np.arange(length - 1, -1, -1)) % 26
+    return [''.join(row) for row in letters[digits]]
+
+
+def period_dates(fiscal_year_end_months, n_periods, period='annual', end_year=END_YEAR):
+    # Get the end date of each period (symbols x periods, from the oldest to the most recent), at the month end
+    if period == 'annual':
+        months = np.arange(n_periods - 1, -1, -1) * -12
+    else:
+        months = np.arange(n_periods - 1, -1, -1) * -3
+    end_months = (end_year - 1970) * 12 + fiscal_year_end_months[:, None] - 1 + months[None, :]
+    return (end_months + 1).astype('datetime64[M]').astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+
+def random_walk(rng, n_symbols, n_periods, start, drift, volatility):
+    # Multiply a starting value by a random growth rate in each period
+    growth = rng.normal(drift, volatility, (n_symbols, n_periods))
+    growth[:, 0] = 0
+    return start[:, None] * np.cumprod(np.clip(1 + growth, 0.2, None), axis=1)
+
+
+def ratio(rng, low, high, n_symbols, n_periods, volatility=0.05):
+    # A ratio specific to each company, which varies a little from one period to the next
+    level = rng.uniform(low, high, n_symbols)[:, None]
+    return np.clip(level * (1 + rng.normal(0, volatility, (n_symbols, n_periods))), 0, None)
+
+
+def generate_statements(n_symbols, n_periods, period='annual', rng=None):
+    # Generate the values of the financial statements of all the symbols, as (symbols x periods) arrays
+    rng = rng if rng is not None else np.random.default_rng()
+    # The flows of a quarter are a quarter of the flows of a year, and the growth of a quarter is smaller
+    scale = 1.0 if period == 'annual' else 0.25
+    shape = (n_symbols, n_periods)
+
+    total_assets = random_walk(rng, n_symbols, n_periods, np.exp(rng.normal(np.log(5e9), 1.5, n_symbols)),
+                               0.06 * scale, 0.15 * np.sqrt(scale))
+    current_assets = total_assets * ratio(rng, 0.15, 0.6, *shape)
+    # A few distressed companies have more liabilities than assets (a negative equity)
+    total_liabilities = total_assets * ratio(rng, 0.2, 0.9, *shape) * np.where(
+        rng.random((n_symbols, 1)) < 0.05, 1.25, 1.0)
+    current_liabilities = np.minimum(total_assets * ratio(rng, 0.08, 0.4, *shape), total_liabilities)
+    long_term_debt = (total_liabilities - current_liabilities) * ratio(rng, 0.2, 0.7, *shape)
+    common_stock = total_assets[:, :1] * rng.uniform(0.001, 0.1, (n_symbols, 1)) * np.cumprod(
+        1 + (rng.random(shape) < 0.1) * rng.uniform(0, 0.2, shape), axis=1)
+    preferred_stock = np.where(rng.random((n_symbols, 1)) < 0.05, total_assets * 0.02, 0.0)
+    ppe = total_assets * ratio(rng, 0.03, 0.5, *shape)
+    receivables = current_assets * ratio(rng, 0.1, 0.5, *shape)
+    cash = current_assets * ratio(rng, 0.1, 0.5, *shape)
+    inventory = np.maximum(current_assets - receivables - cash, 0) * rng.uniform(0, 1, (n_symbols, 1))
+
+    revenue = total_assets * ratio(rng, 0.2, 1.5, *shape, volatility=0.1) * scale
+    cost_of_revenue = revenue * ratio(rng, 0.3, 0.85, *shape)
+    sga = revenue * ratio(rng, 0.05, 0.3, *shape, volatility=0.1)
+    depreciation = ppe * ratio(rng, 0.05, 0.15, *shape) * scale
+    operating_income = revenue - cost_of_revenue - sga - depreciation
+    interest_expense = long_term_debt * ratio(rng, 0.02, 0.07, *shape) * scale
+    other_income = -interest_expense + revenue * rng.normal(0, 0.01, shape)
+    income_before_tax = operating_income + other_income
+    income_tax = np.maximum(income_before_tax, 0) * 0.21
+    net_income = income_before_tax - income_tax
+    operating_cash_flow = net_income + depreciation + revenue * rng.normal(0, 0.03, shape)
+    capital_expenditure = -ppe * ratio(rng, 0.05, 0.2, *shape) * scale
+    shares = common_stock / rng.uniform(0.01, 1, (n_symbols, 1))
+
+    total_equity = total_assets - total_liabilities
+    retained_earnings = total_equity - common_stock - preferred_stock + total_assets * rng.normal(0, 0.05, shape)
+
+    return {
+        'balance-sheet-statement': {
+            'cashAndCashEquivalents': cash, 'shortTermInvestments': current_assets * ratio(rng, 0, 0.15, *shape),
+            'netReceivables': receivables, 'inventory': inventory, 'totalCurrentAssets': current_assets,
+            'propertyPlantEquipmentNet': ppe, 'longTermInvestments': total_assets * ratio(rng, 0, 0.15, *shape),
+            'totalAssets': total_assets, 'totalCurrentLiabilities': current_liabilities,
+            'longTermDebt': long_term_debt, 'totalLiabilities': total_liabilities, 'preferredStock': preferred_stock,
+            'commonStock': common_stock, 'retainedEarnings': retained_earnings,
+            'totalStockholdersEquity': total_equity, 'totalEquity': total_equity,
+        },
+        'income-statement': {
+            'revenue': revenue, 'costOfRevenue': cost_of_revenue, 'grossProfit': revenue - cost_of_revenue,
+            'sellingGeneralAndAdministrativeExpenses': sga, 'depreciationAndAmortization': depreciation,
+            'ebitda': operating_income + depreciation, 'operatingIncome': operating_income,
+            'interestExpense': interest_expense, 'totalOtherIncomeExpensesNet': other_income,
+            'incomeBeforeTax': income_before_tax, 'incomeTaxExpense': income_tax, 'netIncome': net_income,
+            'eps': net_income / shares, 'weightedAverageShsOut': shares,
+        },
+        'cash-flow-statement': {
+            'netIncome': net_income, 'depreciationAndAmortization': depreciation,
+            'operatingCashFlow': operating_cash_flow, 'capitalExpenditure': capital_expenditure,
+            'freeCashFlow': operating_cash_flow + capital_expenditure,
+        },
+    }
+
+
+def add_edge_cases(values, rng, missing_rate=MISSING_RATE, zero_rate=ZERO_RATE):
+    # Remove a few values, and set a denominator to zero in a few periods (in place)
+    for statement_type, fields in values.items():
+        zero_fields = ZERO_DENOMINATORS.get(statement_type, [])
+        shape = next(iter(fields.values())).shape
+        zero_periods = rng.random(shape) < zero_rate
+        zero_choice = rng.integers(0, max(len(zero_fields), 1), shape)
+
+        for field, array in fields.items():
+            if field in zero_fields:
+                array[zero_periods & (zero_choice == zero_fields.index(field))] = 0
+            array[rng.random(shape) < missing_rate] = np.nan
+
+
+def statement_frame(symbols, dates, fields, period='annual', filing_lag_days=60):
+    # Convert the (symbols x periods) arrays of a statement to one DataFrame with the columns of the API,
+    # with the rows of each symbol from the most recent period to the oldest
+    n_symbols, n_periods = dates.shape
+    order = np.arange(n_periods - 1, -1, -1)
+    dates = dates[:, order].ravel()
+    filling_dates = dates + np.timedelta64(filing_lag_days, 'D')
+
+    if period == 'annual':
+        period_labels = np.full(dates.shape, 'FY', dtype=object)
+    else:
+        # Number the quarters from the end of the fiscal year of each symbol
+        quarters = 4 - np.arange(n_periods)[None, :].repeat(n_symbols, axis=0) % 4
+        period_labels = np.char.add('Q', quarters.astype(str)).ravel().astype(object)
+
+    df = pd.DataFrame({
+        'date': np.datetime_as_string(dates, unit='D').astype(object),
+        'symbol': np.repeat(np.asarray(symbols, dtype=object), n_periods),
+        'reportedCurrency': 'USD',
+        'cik': np.repeat(np.char.zfill(np.arange(1, n_symbols + 1).astype(str), 10).astype(object), n_periods),
+        'fillingDate': np.datetime_as_string(filling_dates, unit='D').astype(object),
+        'acceptedDate': np.char.add(np.datetime_as_string(filling_dates, unit='D'), ' 16:05:00').astype(object),
+        'calendarYear': (dates.astype('datetime64[Y]').astype(np.int64) + 1970).astype(str).astype(object),
+        'period': period_labels,
+    })
+    for field, array in fields.items():
+        df[field] = array[:, order].ravel()
+    return df
+
+
+def generate_universe(n_symbols, n_periods=N_PERIODS, period='annual', seed=0, missing_rate=MISSING_RATE,
+                      zero_rate=ZERO_RATE, end_year=END_YEAR):
+    # Generate the statements, the profiles and the screener data of a universe of synthetic symbols
+    # Return a dictionary of DataFrames keyed by endpoint, each with the rows of all the symbols
+    # (the market cap is generated symbol by symbol when it is saved, see market_cap_frame)
+    rng = np.random.default_rng(seed)
+    symbols = synthetic_symbols(n_symbols)
+
+    months = list(FISCAL_YEAR_END_MONTHS)
+    fiscal_year_end_months = rng.choice(months, n_symbols, p=list(FISCAL_YEAR_END_MONTHS.values()))
+    dates = period_dates(fiscal_year_end_months, n_periods, period, end_year)
+
+    values = generate_statements(n_symbols, n_periods, period, rng)
+    # Keep the values without edge cases for the profiles and the screener data
+    income = {field: array.copy() for field, array in values['income-statement'].items()}
+    balance_sheet = {field: array.copy() for field, array in values['balance-sheet-statement'].items()}
+    add_edge_cases(values, rng, missing_rate, zero_rate)
+
+    universe = {statement_type: statement_frame(symbols, dates, fields, period)
+                for statement_type, fields in values.items()}
+
+    # The profile has one row per symbol, with the latest market cap and price
+    sectors = list(SECTORS)
+    sector = rng.choice(sectors, n_symbols)
+    industry = [SECTORS[s][i % len(SECTORS[s])] for s, i in zip(sector, rng.integers(0, 3, n_symbols))]
+    # The market cap is a multiple of the revenue of the latest year
+    shares = income['weightedAverageShsOut'][:, -1]
+    annual_revenue = income['revenue'][:, -1] * (1 if period == 'annual' else 4)
+    market_cap = annual_revenue * np.exp(rng.normal(np.log(2), 0.7, n_symbols)) + 1e6
+    price = market_cap / shares
+    profile = pd.DataFrame({
+        'symbol': symbols,
+        'price': price.round(2),
+        'beta': rng.normal(1, 0.4, n_symbols).round(3),
+        'volAvg': rng.integers(10_000, 50_000_000, n_symbols),
+        'mktCap': market_cap.round(0),
+        'companyName': [f'{symbol} Synthetic Inc.' for symbol in symbols],
+        'currency': 'USD',
+        'exchange': rng.choice(['NASDAQ Global Select', 'New York Stock Exchange'], n_symbols),
+        'exchangeShortName': 'NASDAQ',
+        'industry': industry,
+        'sector': sector.astype(object),
+        'country': rng.choice(list(COUNTRIES), n_symbols, p=list(COUNTRIES.values())).astype(object),
+        'fullTimeEmployees': rng.integers(10, 200_000, n_symbols).astype(str),
+        'ipoDate': np.datetime_as_string(dates[:, 0] - rng.integers(0, 8000, n_symbols).astype('timedelta64[D]'),
+                                         unit='D'),
+        'isEtf': False,
+        'isActivelyTrading': True,
+    })
+    # A few profiles have no sector or no country
+    profile.loc[rng.random(n_symbols) < missing_rate, 'sector'] = ''
+    profile.loc[rng.random(n_symbols) < missing_rate, 'country'] = None
+    universe[PROFILE_ENDPOINT] = profile
+
+    # The screener data: the latest DCF and rating of each symbol, and the key metrics and growth of each period
+    latest_date = np.datetime_as_string(dates[:, -1], unit='D')
+    universe['discounted-cash-flow'] = pd.DataFrame({
+        'symbol': symbols,
+        'date': latest_date,
+        'dcf': (price * np.exp(rng.normal(0.05, 0.35, n_symbols))).round(4),
+        'Stock Price': price.round(2),
+    })
+    rating_score = rng.integers(1, 6, n_symbols)
+    universe['rating'] = pd.DataFrame({
+        'symbol': symbols,
+        'date': latest_date,
+        'rating': np.array(['D', 'C', 'B', 'A', 'S'])[rating_score - 1],
+        'ratingScore': rating_score,
+        'ratingRecommendation': np.array(['Strong Sell', 'Sell', 'Neutral', 'Buy', 'Strong Buy'])[rating_score - 1],
+    })
+
+    # The market cap of each period scales the latest one by the growth of the revenue
+    period_market_cap = market_cap[:, None] * income['revenue'] / np.maximum(income['revenue'][:, -1:], 1)
+    universe['key-metrics'] = statement_frame(symbols, dates, {
+        'revenuePerShare': income['revenue'] / shares[:, None],
+        'netIncomePerShare': income['netIncome'] / shares[:, None],
+        'marketCap': period_market_cap,
+        'peRatio': _safe_divide(period_market_cap, income['netIncome']),
+        'pbRatio': _safe_divide(period_market_cap, balance_sheet['totalEquity']),
+        'debtToEquity': _safe_divide(balance_sheet['totalLiabilities'], balance_sheet['totalEquity']),
+        'currentRatio': _safe_divide(balance_sheet['totalCurrentAssets'], balance_sheet['totalCurrentLiabilities']),
+        'roe': _safe_divide(income['netIncome'], balance_sheet['totalEquity']),
+        'dividendYield': rng.uniform(0, 0.05, (n_symbols, n_periods)),
+    }, period)[['symbol', 'date', 'calendarYear', 'period', 'revenuePerShare', 'netIncomePerShare', 'marketCap',
+                'peRatio', 'pbRatio', 'debtToEquity', 'currentRatio', 'roe', 'dividendYield']]
+    universe['financial-growth'] = statement_frame(symbols, dates, {
+        'revenueGrowth': _growth(income['revenue']),
+        'netIncomeGrowth': _growth(income['netIncome']),
+        'epsgrowth': _growth(income['eps']),
+        'assetGrowth': _growth(balance_sheet['totalAssets']),
+    }, period)[['symbol', 'date', 'calendarYear', 'period', 'revenueGrowth', 'netIncomeGrowth', 'epsgrowth',
+                'assetGrowth']]
+
+    return universe
+
+
+def _safe_divide(numerator, denominator):
+    # The API reports 0 for the ratios with a zero denominator
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def _growth(values):
+    # Growth over the previous period, 0 for the first period (as the API does)
+    growth = np.zeros_like(values)
+    growth[:, 1:] = _safe_divide(values[:, 1:] - values[:, :-1], np.abs(values[:, :-1]))
+    return growth
+
+
+def business_days(start, end):
+    # Get the business days between two dates as strings, from the most recent day (as the API returns them)
+    return pd.bdate_range(start, end)[::-1].strftime('%Y-%m-%d').to_numpy(dtype=object)
+
+
+def market_cap_frame(symbol, market_cap, days, rng):
+    # Generate the daily market cap of a symbol on the business days (see business_days), ending at its latest
+    # market cap
+    returns = rng.normal(0.0003, 0.02, len(days))
+    returns[0] = 0
+    return pd.DataFrame({
+        'symbol': symbol,
+        'date': days,
+        'marketCap': (market_cap * np.exp(-np.cumsum(returns))).round(0),
+    })
+
+
+def split_by_symbol(df):
+    # Split a DataFrame with the rows of all the symbols into one DataFrame per symbol
+    # (the rows of each symbol are contiguous, so each symbol is a slice between two boundaries)
+    symbols = df['symbol'].to_numpy(dtype=object)
+    starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+    stops = np.r_[starts[1:], len(symbols)]
+    return {symbols[start]: df.iloc[start:stop].reset_index(drop=True) for start, stop in zip(starts, stops)}
+
+
+def write_universe(n_symbols, pickle_dir='financial_data_pickle', n_periods=N_PERIODS, period='annual', seed=0,
+                   missing_rate=MISSING_RATE, zero_rate=ZERO_RATE, market_cap=True, screener=True,
+                   screener_dir=None, end_year=END_YEAR):
+    # Generate a universe of synthetic symbols and save it to the pickle files read by the scripts
+    # The screener data is saved to screener_dir (by default the same directory, as in stock_screener_simplified.py)
+    universe = generate_universe(n_symbols, n_periods, period, seed, missing_rate, zero_rate, end_year)
+    screener_dir = screener_dir or pickle_dir
+    os.makedirs(pickle_dir, exist_ok=True)
+    os.makedirs(screener_dir, exist_ok=True)
+
+    for endpoint in STATEMENT_TYPES + [PROFILE_ENDPOINT]:
+        for symbol, df in split_by_symbol(universe[endpoint]).items():
+            df.to_pickle(pickle_filename(pickle_dir, symbol, endpoint))
+
+    if screener:
+        for data_type in SCREENER_ENDPOINTS:
+            for symbol, df in split_by_symbol(universe[data_type]).items():
+                df.to_pickle(os.path.join(screener_dir, f'{symbol}_{data_type}.pkl'))
+        if screener_dir != pickle_dir:
+            for symbol, df in split_by_symbol(universe[PROFILE_ENDPOINT]).items():
+                df.to_pickle(pickle_filename(screener_dir, symbol, PROFILE_ENDPOINT))
+
+    if market_cap:
+        # The daily market cap covers the periods of the statements, until the filing of the latest one
+        rng = np.random.default_rng(seed + 1)
+        dates = pd.to_datetime(universe['balance-sheet-statement']['date'])
+        days = business_days(dates.min() - pd.Timedelta(days=30), dates.max() + pd.Timedelta(days=90))
+        for symbol, mkt_cap in zip(universe[PROFILE_ENDPOINT]['symbol'], universe[PROFILE_ENDPOINT]['mktCap']):
+            market_cap_frame(symbol, mkt_cap, days, rng).to_pickle(
+                pickle_filename(pickle_dir, symbol, MARKET_CAP_ENDPOINT))
+
+    return synthetic_symbols(n_symbols)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic FMP data for a universe of symbols')
+    parser.add_argument('--symbols', type=int, default=100, help='number of symbols')
+    parser.add_argument('--periods', type=int, default=N_PERIODS, help='number of periods of each symbol')
+    parser.add_argument('--period', default='annual', choices=['annual', 'quarter'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--missing-rate', type=float, default=MISSING_RATE, help='fraction of missing values')
+    parser.add_argument('--zero-rate', type=float, default=ZERO_RATE,
+                        help='fraction of the periods with a zero denominator')
+    parser.add_argument('--pickle-dir', help='default: financial_data_pickle (financial_data_pickle_quarter)')
+    parser.add_argument('--no-market-cap', dest='market_cap', action='store_false',
+                        help="don't generate the daily market cap")
+    parser.add_argument('--no-screener', dest='screener', action='store_false',
+                        help="don't generate the data of the screener")
+    parser.add_argument('--symbols-file', help='file where the list of symbols is written, one per line')
+    args = parser.parse_args(argv)
+
+    pickle_dir = args.pickle_dir or period_dir('financial_data_pickle', args.period)
+    symbols = write_universe(args.symbols, pickle_dir, args.periods, args.period, args.seed, args.missing_rate,
+                             args.zero_rate, args.market_cap, args.screener)
+    if args.symbols_file:
+        with open(args.symbols_file, 'w') as f:
+            f.write('\n'.join(symbols) + '\n')
+    print(f'Saved the synthetic data of {len(symbols)} symbols and {args.periods} periods to {pickle_dir}')
+
+
+if __name__ == '__main__':
+    main()
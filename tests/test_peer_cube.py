@@ -0,0 +1,46 @@
+import pandas as pd
+
+from peer_cube import PeerCube
+
+
+def members_panel(altman, piotroski=None):
+    panel = pd.DataFrame({
+        'Symbol': ['AAA', 'BBB', 'CCC', 'AAA', 'BBB', 'CCC'],
+        'Date/Period': pd.to_datetime(['2022-12-31'] * 3 + ['2023-12-31'] * 3),
+        'sector': ['Technology'] * 6,
+        'industry': ['Software'] * 6,
+        'year': [2022] * 3 + [2023] * 3,
+        'Altman Z-Score': altman,
+    })
+    if piotroski is not None:
+        panel['Piotroski F-Score'] = piotroski
+    return panel
+
+
+def test_update_with_some_models_keeps_the_other_metrics():
+    cube = PeerCube.build(members_panel([1.0, 2.0, 3.0, 4.0, 5.0, 6.0], [5, 6, 7, 8, 9, 4]))
+
+    # Only the Altman Z-Score was scored again, for the year 2023
+    cube.update(members_panel([4.5, 5.5, 6.5, 7.5, 8.5, 9.5]).iloc[3:])
+
+    members = cube.relative().set_index(['Symbol', 'year'])
+    assert members.loc[('AAA', 2023), 'Altman Z-Score'] == 7.5
+    assert members['Piotroski F-Score'].tolist() == [5, 8, 6, 9, 7, 4]
+    assert cube.cube.loc[('Technology', 'Software', 2023), ('Piotroski F-Score', 'count')] == 3
+    assert cube.cube.loc[('Technology', 'Software', 2023), ('Altman Z-Score', 'mean')] == 8.5
+
+
+def test_update_with_a_new_model_adds_its_metric():
+    cube = PeerCube.build(members_panel([1.0, 2.0, 3.0, 4.0, 5.0, 6.0]))
+
+    # The Piotroski F-Score is scored after the cube was built, for the year 2023 only
+    cube.update(members_panel([4.5, 5.5, 6.5, 7.5, 8.5, 9.5], [5, 6, 7, 8, 9, 4]).iloc[3:])
+
+    assert cube.metrics == ['Altman Z-Score', 'Piotroski F-Score']
+    members = cube.relative().set_index(['Symbol', 'year'])
+    assert members.loc[('BBB', 2023), 'Piotroski F-Score'] == 9
+    assert pd.isna(members.loc[('BBB', 2022), 'Piotroski F-Score'])
+    assert members.loc[('AAA', 2022), 'Altman Z-Score'] == 1.0
+    assert 'Piotroski F-Score percentile' in members.columns
+    assert cube.cube.loc[('Technology', 'Software', 2022), ('Piotroski F-Score', 'count')] == 0
+    assert cube.cube.loc[('Technology', 'Software', 2023), ('Piotroski F-Score', 'mean')] == 7
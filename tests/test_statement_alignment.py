@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+
+from feature_registry import FeatureSet
+from statement_alignment import rolling
+
+
+def panel(dates, period='annual'):
+    index = pd.MultiIndex.from_arrays([['AAA'] * len(dates), pd.to_datetime(dates)], names=['symbol', 'date'])
+    df = pd.DataFrame({'totalAssets': np.arange(1.0, len(dates) + 1)}, index=index)
+    df.attrs['period'] = period
+    return df
+
+
+def test_previous_is_missing_after_a_missing_fiscal_year():
+    # The fiscal year 2021 is missing, so 2022 has no previous period
+    features = FeatureSet(panel(['2019-12-31', '2020-12-31', '2022-12-31', '2023-12-31']))
+    np.testing.assert_array_equal(features['previous:totalAssets'], [np.nan, 1.0, np.nan, 3.0])
+    np.testing.assert_array_equal(features['diff:totalAssets'], [np.nan, 1.0, np.nan, 1.0])
+
+
+def test_rolling_window_with_a_gap_inside_is_missing():
+    # A gap longer than a quarter in the middle of the windows of the 4th and 5th rows, whose total span is short
+    quarters = panel(['2022-03-31', '2022-04-15', '2022-09-30', '2022-10-15', '2022-12-31', '2023-03-31'], 'quarter')
+    result = rolling(quarters, quarters['totalAssets'], 4, 'sum', 'quarter')
+    np.testing.assert_array_equal(result, [np.nan, np.nan, np.nan, np.nan, np.nan, 3.0 + 4.0 + 5.0 + 6.0])
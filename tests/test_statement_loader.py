@@ -0,0 +1,21 @@
+import pandas as pd
+
+from feature_registry import FeatureSet
+from statement_loader import downcast
+
+
+def test_downcast_keeps_the_sums_of_large_amounts():
+    # Amounts near 2**31, whose sums overflow 32-bit integers
+    df = downcast(pd.DataFrame({
+        'symbol': ['AAA', 'AAA'],
+        'date': pd.to_datetime(['2022-12-31', '2023-12-31']),
+        'netIncome': [1_500_000_000, 2_000_000_000],
+        'depreciationAndAmortization': [1_000_000_000, 2_100_000_000],
+        'totalOtherIncomeExpensesNet': [-100_000_000, -2_000_000_000],
+        'reportedCurrency': ['USD', 'USD'],
+    }))
+    assert df['netIncome'].dtype == 'int64'
+    assert df['reportedCurrency'].dtype == 'category'
+
+    features = FeatureSet(df.set_index(['symbol', 'date']))
+    assert features['funds_from_operations'].tolist() == [2_600_000_000, 6_100_000_000]